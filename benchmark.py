@@ -0,0 +1,294 @@
+# benchmark.py
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+import config
+from chinook_aggregates import CustomerAggregates
+from chinook_backends import compare_backends, print_comparison
+from chinook_python_centric import ChinookAnalyzer
+from chinook_simple_sql import SIMPLE_SQL_QUERY
+from config import DatabaseConfig
+from instrumentation import Instrumentation, current_rss
+
+
+# Row counts of the stock Chinook database
+STOCK_CUSTOMERS = 59
+STOCK_INVOICES = 412
+STOCK_INVOICE_LINES = 2240
+STOCK_TRACKS = 3503
+STOCK_ALBUMS = 347
+STOCK_ARTISTS = 275
+
+DEFAULT_SCALES = [1, 10, 100, 1000]
+DATA_DIR = 'benchmark_data'
+INSERT_BATCH = 100000
+
+# Zipf exponents for popularity skew: a few tracks and customers dominate
+TRACK_SKEW = 1.1
+CUSTOMER_SKEW = 0.8
+
+FIRST_NAMES = ['Luís', 'Leonie', 'François', 'Bjørn', 'František', 'Helena', 'Astrid', 'Daan',
+               'Kara', 'Eduardo', 'Alexandre', 'Fernanda', 'Mark', 'Jennifer', 'Frank', 'Jack',
+               'Michelle', 'Tim', 'Dan', 'Kathy', 'Heather', 'John', 'Robert', 'Edward']
+LAST_NAMES = ['Gonçalves', 'Köhler', 'Tremblay', 'Hansen', 'Wichterlová', 'Holý', 'Gruber',
+              'Peeters', 'Nielsen', 'Martins', 'Rocha', 'Ramos', 'Philips', 'Peterson', 'Harris',
+              'Smith', 'Brooks', 'Goyer', 'Miller', 'Chase', 'Gordon', 'Ralston', 'Stevens']
+WORDS = ['Love', 'Night', 'Rock', 'Blues', 'Heart', 'Fire', 'Road', 'Dream', 'Rain', 'Gold',
+         'Summer', 'Light', 'Time', 'World', 'Song', 'Angel', 'Wild', 'River', 'Moon', 'Star']
+
+SCHEMA = """
+CREATE TABLE Artist (ArtistId INTEGER PRIMARY KEY, Name NVARCHAR(120));
+CREATE TABLE Album (AlbumId INTEGER PRIMARY KEY, Title NVARCHAR(160) NOT NULL, ArtistId INTEGER NOT NULL);
+CREATE TABLE Genre (GenreId INTEGER PRIMARY KEY, Name NVARCHAR(120));
+CREATE TABLE MediaType (MediaTypeId INTEGER PRIMARY KEY, Name NVARCHAR(120));
+CREATE TABLE Employee (EmployeeId INTEGER PRIMARY KEY, LastName NVARCHAR(20) NOT NULL,
+    FirstName NVARCHAR(20) NOT NULL, Title NVARCHAR(30), ReportsTo INTEGER);
+CREATE TABLE Track (TrackId INTEGER PRIMARY KEY, Name NVARCHAR(200) NOT NULL, AlbumId INTEGER,
+    MediaTypeId INTEGER NOT NULL, GenreId INTEGER, Composer NVARCHAR(220),
+    Milliseconds INTEGER NOT NULL, Bytes INTEGER, UnitPrice NUMERIC(10,2) NOT NULL);
+CREATE TABLE Customer (CustomerId INTEGER PRIMARY KEY, FirstName NVARCHAR(40) NOT NULL,
+    LastName NVARCHAR(20) NOT NULL, Company NVARCHAR(80), Address NVARCHAR(70), City NVARCHAR(40),
+    State NVARCHAR(40), Country NVARCHAR(40), PostalCode NVARCHAR(10), Phone NVARCHAR(24),
+    Fax NVARCHAR(24), Email NVARCHAR(60) NOT NULL, SupportRepId INTEGER);
+CREATE TABLE Invoice (InvoiceId INTEGER PRIMARY KEY, CustomerId INTEGER NOT NULL,
+    InvoiceDate DATETIME NOT NULL, BillingAddress NVARCHAR(70), BillingCity NVARCHAR(40),
+    BillingState NVARCHAR(40), BillingCountry NVARCHAR(40), BillingPostalCode NVARCHAR(10),
+    Total NUMERIC(10,2) NOT NULL);
+CREATE TABLE InvoiceLine (InvoiceLineId INTEGER PRIMARY KEY, InvoiceId INTEGER NOT NULL,
+    TrackId INTEGER NOT NULL, UnitPrice NUMERIC(10,2) NOT NULL, Quantity INTEGER NOT NULL);
+CREATE INDEX IFK_AlbumArtistId ON Album (ArtistId);
+CREATE INDEX IFK_TrackAlbumId ON Track (AlbumId);
+CREATE INDEX IFK_InvoiceCustomerId ON Invoice (CustomerId);
+CREATE INDEX IFK_InvoiceLineInvoiceId ON InvoiceLine (InvoiceId);
+CREATE INDEX IFK_InvoiceLineTrackId ON InvoiceLine (TrackId);
+"""
+
+
+def zipf_weights(count, exponent):
+    """Normalized 1/rank^exponent weights"""
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _insert(conn, table, rows):
+    """Insert an iterable of tuples in batches"""
+    rows = iter(rows)
+    while True:
+        batch = [row for _, row in zip(range(INSERT_BATCH), rows)]
+        if not batch:
+            break
+        placeholders = ', '.join('?' * len(batch[0]))
+        conn.executemany(f'INSERT INTO {table} VALUES ({placeholders})', batch)
+
+
+def generate_chinook_database(path, scale=1, seed=42):
+    """
+    Write a Chinook-schema SQLite database with scale x the stock InvoiceLine count
+    Customers and invoices grow with the scale, the track catalog stays stock-sized.
+    Track purchases and customer activity follow Zipf distributions.
+    """
+    rng = np.random.default_rng(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    n_customers = STOCK_CUSTOMERS * scale
+    n_invoices = STOCK_INVOICES * scale
+    n_lines = STOCK_INVOICE_LINES * scale
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.executescript(SCHEMA)
+
+        _insert(conn, 'Artist', ((i, f'Artist {i}') for i in range(1, STOCK_ARTISTS + 1)))
+        _insert(conn, 'Genre', ((i, f'Genre {i}') for i in range(1, 26)))
+        _insert(conn, 'MediaType', ((i, f'Media {i}') for i in range(1, 6)))
+        _insert(conn, 'Employee', [(1, 'Adams', 'Andrew', 'General Manager', None),
+                                   (2, 'Edwards', 'Nancy', 'Sales Manager', 1),
+                                   (3, 'Peacock', 'Jane', 'Sales Support Agent', 2)])
+
+        album_artists = rng.integers(1, STOCK_ARTISTS + 1, STOCK_ALBUMS)
+        _insert(conn, 'Album', ((i + 1, f'{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} Vol. {i + 1}',
+                                 int(album_artists[i])) for i in range(STOCK_ALBUMS)))
+
+        # Track names repeat across albums, as covers and live versions do in Chinook
+        track_albums = np.sort(rng.integers(1, STOCK_ALBUMS + 1, STOCK_TRACKS))
+        word_a = rng.integers(0, len(WORDS), STOCK_TRACKS)
+        word_b = rng.integers(0, len(WORDS), STOCK_TRACKS)
+        _insert(conn, 'Track', ((i + 1, f'{WORDS[word_a[i]]} {WORDS[word_b[i]]}', int(track_albums[i]), 1,
+                                 int(i % 25) + 1, None, 200000 + i, 6000000 + i, 0.99)
+                                for i in range(STOCK_TRACKS)))
+
+        first = rng.integers(0, len(FIRST_NAMES), n_customers)
+        last = rng.integers(0, len(LAST_NAMES), n_customers)
+        _insert(conn, 'Customer', ((i + 1, FIRST_NAMES[first[i]], LAST_NAMES[last[i]], None,
+                                    f'{i} Main Street', 'City', None, 'Country', None, None, None,
+                                    f'customer{i + 1}@example.com', 3) for i in range(n_customers)))
+
+        # Active customers get more invoices
+        invoice_customers = rng.permutation(n_customers)[
+            rng.choice(n_customers, n_invoices, p=zipf_weights(n_customers, CUSTOMER_SKEW))
+        ] + 1
+        _insert(conn, 'Invoice', ((i + 1, int(invoice_customers[i]), '2013-01-01 00:00:00', 'Address',
+                                   'City', None, 'Country', None, 1.98) for i in range(n_invoices)))
+
+        # Lines are grouped by invoice like the stock data; hit tracks follow a Zipf curve
+        line_invoices = np.sort(rng.integers(1, n_invoices + 1, n_lines))
+        line_tracks = rng.permutation(STOCK_TRACKS)[
+            rng.choice(STOCK_TRACKS, n_lines, p=zipf_weights(STOCK_TRACKS, TRACK_SKEW))
+        ] + 1
+        _insert(conn, 'InvoiceLine', ((i + 1, int(line_invoices[i]), int(line_tracks[i]), 0.99, 1)
+                                      for i in range(n_lines)))
+
+        conn.commit()
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+class PeakRssSampler:
+    """Instrumentation hooks that sample RSS in a background thread to find each stage's peak"""
+
+    def __init__(self, instrumentation, interval=0.005):
+        self.interval = interval
+        self.done = None
+        self.thread = None
+        self.peak = 0
+        instrumentation.add_pre_hook(self.start)
+        instrumentation.add_post_hook(self.stop)
+
+    def _sample(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def start(self, record):
+        self.peak = current_rss()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+
+    def stop(self, record):
+        self.done.set()
+        self.thread.join()
+        record['peak_rss_bytes'] = max(self.peak, current_rss())
+
+
+def _stage_results(instrumentation):
+    """Keep the benchmark-relevant fields of each stage record"""
+    fields = ('stage', 'wall_seconds', 'cpu_seconds', 'peak_rss_bytes', 'memory_delta_bytes',
+              'rows_in', 'rows_out')
+    return [{field: record.get(field) for field in fields} for record in instrumentation.events]
+
+
+def run_python_pipeline(database_path, output_dir):
+    """Benchmark the pandas-merge pipeline stage by stage"""
+    instrumentation = Instrumentation()
+    PeakRssSampler(instrumentation)
+    analyzer = ChinookAnalyzer(database_path)
+    analyzer.instrumentation = instrumentation
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.connect_to_database()
+        try:
+            with instrumentation.stage('load'):
+                analyzer.load_all_tables()
+            merged = analyzer.merge_data_python()
+            with instrumentation.stage('sort', rows_in=len(merged)):
+                final_df = analyzer.clean_and_format_data(merged)
+            # The integer-key aggregates run_complete_analysis uses; final_df has
+            # only the name columns, which would time the group-by-name fallback
+            with instrumentation.stage('groupby_stats', rows_in=len(merged)):
+                aggregates = CustomerAggregates.from_frame(merged)
+                analyzer.analyze_customer_behavior(final_df, aggregates=aggregates)
+            with instrumentation.stage('csv_export', rows_in=len(final_df)):
+                final_df.to_csv(os.path.join(output_dir, 'bench_python.csv'), index=False)
+        finally:
+            analyzer.close_connection()
+
+    return {'rows': len(final_df), 'stages': _stage_results(instrumentation)}
+
+
+def run_sql_pipeline(database_path, output_dir):
+    """Benchmark the single SQL join pipeline"""
+    instrumentation = Instrumentation()
+    PeakRssSampler(instrumentation)
+    with instrumentation.stage('query') as record:
+        with DatabaseConfig(database_path).connect() as connection:
+            df = pd.read_sql(text(SIMPLE_SQL_QUERY), connection)
+        record['rows_out'] = len(df)
+    with instrumentation.stage('csv_export', rows_in=len(df)):
+        df.to_csv(os.path.join(output_dir, 'bench_sql.csv'), index=False)
+    return {'rows': len(df), 'stages': _stage_results(instrumentation)}
+
+
+def run_benchmarks(scales=None, data_dir=DATA_DIR, regenerate=False):
+    """
+    Run both pipelines and compare the report backends at each scale, then
+    write a JSON report to OUTPUT_DIR/benchmarks
+    """
+    scales = scales or DEFAULT_SCALES
+    os.makedirs(data_dir, exist_ok=True)
+    report_dir = os.path.join(config.OUTPUT_DIR, 'benchmarks')
+    os.makedirs(report_dir, exist_ok=True)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'results': [],
+        'backends': [],
+    }
+
+    for scale in scales:
+        path = os.path.join(data_dir, f'chinook_x{scale}.sqlite')
+        if regenerate or not os.path.exists(path):
+            print(f"Generating {scale}x database at {path}...")
+            generate_chinook_database(path, scale)
+
+        for pipeline, runner in (('python', run_python_pipeline), ('sql', run_sql_pipeline)):
+            print(f"Running {pipeline} pipeline at {scale}x...")
+            result = runner(path, data_dir)
+            total = sum(stage['wall_seconds'] for stage in result['stages'])
+            print(f"  {result['rows']} rows in {total:.3f} s")
+            report['results'].append({'scale': scale, 'pipeline': pipeline, **result})
+
+        # Estimated next to measured seconds per report backend, to check the auto pick
+        print(f"Comparing report backends at {scale}x...")
+        comparison = compare_backends(path)
+        print_comparison(comparison)
+        report['backends'].append({'scale': scale, **comparison})
+
+    report_path = os.path.join(report_dir, f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark report saved to '{report_path}'")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the pandas-merge and SQL-join pipelines')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='InvoiceLine multiples of the stock database to test')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='where generated databases are kept')
+    parser.add_argument('--regenerate', action='store_true', help='rebuild generated databases')
+    args = parser.parse_args()
+    run_benchmarks(args.scales, args.data_dir, args.regenerate)
@@ -0,0 +1,95 @@
+# chinook_aggregates.py
+import numpy as np
+import pandas as pd
+
+
+def _first_positions(codes, count):
+    """Row position of the first occurrence of each code"""
+    first = np.full(count, len(codes), dtype='int64')
+    np.minimum.at(first, codes, np.arange(len(codes)))
+    return first
+
+
+def _top(counts, ids, n):
+    """Indices of the n largest counts; ties go to the lower id like the SQL reports"""
+    order = np.lexsort((np.asarray(ids), -counts))
+    return order[:n]
+
+
+class CustomerAggregates:
+    """
+    All customer, track and album statistics from one pass over integer keys
+    Keys are factorized to dense codes and counted with np.bincount. Names and
+    titles are looked up only for the rows a report actually shows.
+    """
+
+    def __init__(self, df):
+        self.source = df
+        self.rows = len(df)
+
+        customer_codes, self.customer_ids = pd.factorize(df['CustomerId'], sort=False)
+        track_codes, self.track_ids = pd.factorize(df['TrackId'], sort=False)
+        album_codes, self.album_ids = pd.factorize(df['AlbumId'], sort=False)
+        n_customers = len(self.customer_ids)
+        n_albums = len(self.album_ids)
+
+        self.customer_track_counts = np.bincount(customer_codes, minlength=n_customers)
+        self.track_counts = np.bincount(track_codes, minlength=len(self.track_ids))
+        self.album_counts = np.bincount(album_codes, minlength=n_albums)
+
+        # Distinct (customer, album) pairs, counted per customer
+        pairs = np.unique(customer_codes.astype('int64') * max(n_albums, 1) + album_codes)
+        self.customer_album_counts = np.bincount(pairs // max(n_albums, 1), minlength=n_customers)
+
+        # First row of each key, used to attach labels later
+        self._customer_rows = _first_positions(customer_codes, n_customers)
+        self._track_rows = _first_positions(track_codes, len(self.track_ids))
+        self._album_rows = _first_positions(album_codes, n_albums)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build aggregates if the frame still has its key columns, else return None"""
+        if not {'CustomerId', 'TrackId', 'AlbumId'}.issubset(df.columns):
+            return None
+        return cls(df)
+
+    def _labels(self, rows, columns):
+        """Look up label columns for the given source rows"""
+        return self.source[columns].take(rows)
+
+    def customer_stats(self, codes=None):
+        """TotalTracks and UniqueAlbums per customer in CustomerId order, indexed by (LastName, FirstName)"""
+        if codes is None:
+            codes = np.argsort(np.asarray(self.customer_ids), kind='stable')
+        labels = self._labels(self._customer_rows[codes], ['LastName', 'FirstName'])
+        return pd.DataFrame(
+            {
+                'TotalTracks': self.customer_track_counts[codes],
+                'UniqueAlbums': self.customer_album_counts[codes],
+            },
+            index=pd.MultiIndex.from_frame(labels.astype(object)),
+        )
+
+    def top_customer_codes(self, n=10):
+        """Codes of the n customers with the most purchased tracks"""
+        return _top(self.customer_track_counts, self.customer_ids, n)
+
+    def top_customers(self, n=10):
+        """The n customers with the most purchased tracks"""
+        return self.customer_stats(self.top_customer_codes(n))
+
+    def top_tracks(self, n=10):
+        """Purchase counts of the n most purchased tracks, indexed by track name"""
+        codes = _top(self.track_counts, self.track_ids, n)
+        names = self._labels(self._track_rows[codes], 'Name').astype(object)
+        return pd.Series(self.track_counts[codes], index=pd.Index(names, name='Name'), name='count')
+
+    def top_albums(self, n=10):
+        """Purchase counts of the n most purchased albums, indexed by album title"""
+        codes = _top(self.album_counts, self.album_ids, n)
+        titles = self._labels(self._album_rows[codes], 'Title').astype(object)
+        return pd.Series(self.album_counts[codes], index=pd.Index(titles, name='Title'), name='count')
+
+    def tracks_per_customer(self):
+        """Number of purchased tracks for every customer"""
+        return self.customer_track_counts
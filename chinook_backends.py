@@ -0,0 +1,343 @@
+# chinook_backends.py
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+import pandas as pd
+from chinook_topk import top_series
+from config import DatabaseConfig
+from summary_tables import PURCHASES
+
+
+REPORTS = ['customer_stats', 'top_tracks', 'top_albums']
+DEFAULT_TOP_N = 10
+
+# Rough costs in microseconds, fitted against cold runs on the x1 to x100
+# synthetic benchmark databases (python chinook_backends.py DB --compare and
+# benchmark.py print the estimates next to the timings). Pushdown wins up to
+# about x10, hybrid from about x30, where the two are close.
+COST_PANDAS_SETUP = 100000    # engine, connection and per-table overhead of a pandas load
+COST_PANDAS_LOAD_ROW = 3.5    # InvoiceLine or Invoice row read into pandas and joined
+COST_PANDAS_AGG_ROW = 0.03    # merged row through one pandas group-by
+COST_FRAME_REPORT = 6000      # fixed part of one group-by and top-n selection in pandas
+COST_SQL_QUERY = 2000         # per pushed-down query
+COST_SQL_JOIN_ROW = 1.4       # InvoiceLine row through the four-table join and GROUP BY in SQLite
+COST_HYBRID_SETUP = 20000     # pair query plus the dimension tables
+COST_HYBRID_PAIRS_ROW = 2.6   # InvoiceLine row grouped by (CustomerId, TrackId) and fetched
+COST_HYBRID_AGG_ROW = 0.11    # (customer, track) pair through one pandas group-by
+CUSTOMER_AGG_FACTOR = 2       # customer stats also count distinct albums
+
+COST_MODEL = {
+    'COST_PANDAS_SETUP': COST_PANDAS_SETUP, 'COST_PANDAS_LOAD_ROW': COST_PANDAS_LOAD_ROW,
+    'COST_PANDAS_AGG_ROW': COST_PANDAS_AGG_ROW, 'COST_FRAME_REPORT': COST_FRAME_REPORT,
+    'COST_SQL_QUERY': COST_SQL_QUERY, 'COST_SQL_JOIN_ROW': COST_SQL_JOIN_ROW,
+    'COST_HYBRID_SETUP': COST_HYBRID_SETUP, 'COST_HYBRID_PAIRS_ROW': COST_HYBRID_PAIRS_ROW,
+    'COST_HYBRID_AGG_ROW': COST_HYBRID_AGG_ROW, 'CUSTOMER_AGG_FACTOR': CUSTOMER_AGG_FACTOR,
+}
+
+
+def row_estimates(conn):
+    """
+    Rows per table from sqlite_stat1 when ANALYZE has run, else MAX(rowid)
+    Neither needs a table scan.
+    """
+    estimates = {}
+    has_stats = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'"
+    ).fetchone()[0]
+    if has_stats:
+        for table, stat in conn.execute('SELECT tbl, stat FROM sqlite_stat1'):
+            estimates[table] = max(int(stat.split()[0]), estimates.get(table, 0))
+    for table in ('Customer', 'Invoice', 'InvoiceLine', 'Track', 'Album'):
+        if table not in estimates:
+            estimates[table] = conn.execute(f'SELECT MAX(rowid) FROM {table}').fetchone()[0] or 0
+    return estimates
+
+
+def _customer_frame(customer_ids, last_names, first_names, total_tracks, unique_albums):
+    """Customer stats in CustomerId order, indexed by (LastName, FirstName)"""
+    frame = pd.DataFrame({
+        'CustomerId': np.asarray(customer_ids, dtype='int64'),
+        'LastName': np.asarray(last_names, dtype=object),
+        'FirstName': np.asarray(first_names, dtype=object),
+        'TotalTracks': np.asarray(total_tracks, dtype='int64'),
+        'UniqueAlbums': np.asarray(unique_albums, dtype='int64'),
+    }).sort_values('CustomerId', kind='stable')
+    return frame.set_index(['LastName', 'FirstName'])[['TotalTracks', 'UniqueAlbums']]
+
+
+class PandasBackend:
+    """
+    Join everything in pandas (ChinookAnalyzer.merge_data_python), then group
+    The merged frame is built once and shared by every report.
+    """
+
+    name = 'pandas'
+
+    def __init__(self, database_path, merged=None):
+        self.database_path = database_path
+        self.merged = merged
+
+    @property
+    def prepared(self):
+        return self.merged is not None
+
+    def prepare_cost(self, estimates):
+        if self.prepared:
+            return 0.0
+        rows = estimates['InvoiceLine'] + estimates['Invoice']
+        return (COST_PANDAS_SETUP + rows * COST_PANDAS_LOAD_ROW) / 1e6
+
+    def report_cost(self, report, estimates, top_n=DEFAULT_TOP_N):
+        factor = CUSTOMER_AGG_FACTOR if report == 'customer_stats' else 1
+        return (COST_FRAME_REPORT + estimates['InvoiceLine'] * COST_PANDAS_AGG_ROW) * factor / 1e6
+
+    def prepare(self):
+        if self.merged is None:
+            from chinook_python_centric import ChinookAnalyzer
+            analyzer = ChinookAnalyzer(self.database_path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                if not analyzer.connect_to_database():
+                    raise FileNotFoundError(self.database_path)
+                try:
+                    if not analyzer.load_all_tables(optimized=True):
+                        raise RuntimeError(f"Could not load tables from {self.database_path}")
+                    self.merged = analyzer.merge_data_python()
+                finally:
+                    analyzer.close_connection()
+        return self.merged
+
+    def run(self, report, top_n=DEFAULT_TOP_N):
+        merged = self.prepare()
+        if report == 'customer_stats':
+            stats = merged.groupby('CustomerId', observed=True).agg(
+                LastName=('LastName', 'first'), FirstName=('FirstName', 'first'),
+                TotalTracks=('TrackId', 'size'), UniqueAlbums=('AlbumId', 'nunique'))
+            return _customer_frame(stats.index, stats['LastName'], stats['FirstName'],
+                                   stats['TotalTracks'], stats['UniqueAlbums'])
+
+        key, label, name = ('TrackId', 'Name', 'Name') if report == 'top_tracks' else ('AlbumId', 'Title', 'Title')
+        counts = merged.groupby(key, observed=True).agg(label=(label, 'first'), count=(key, 'size'))
+        return top_series(counts.rename_axis('id').reset_index(), top_n, name)
+
+
+class PushdownBackend:
+    """
+    Each report is one GROUP BY/LIMIT query; only the aggregates leave SQLite
+    """
+
+    name = 'sqlite-pushdown'
+    prepared = True
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+
+    def prepare_cost(self, estimates):
+        return 0.0
+
+    def report_cost(self, report, estimates, top_n=DEFAULT_TOP_N):
+        return (COST_SQL_QUERY + estimates['InvoiceLine'] * COST_SQL_JOIN_ROW) / 1e6
+
+    def run(self, report, top_n=DEFAULT_TOP_N):
+        with DatabaseConfig(self.database_path).raw_connection() as conn:
+            if report == 'customer_stats':
+                rows = conn.execute(f"""
+                    SELECT c.CustomerId, c.LastName, c.FirstName, COUNT(*), COUNT(DISTINCT a.AlbumId)
+                    {PURCHASES} GROUP BY c.CustomerId
+                """).fetchall()
+                frame = pd.DataFrame(rows, columns=['CustomerId', 'LastName', 'FirstName',
+                                                    'TotalTracks', 'UniqueAlbums'])
+                return _customer_frame(frame['CustomerId'], frame['LastName'], frame['FirstName'],
+                                       frame['TotalTracks'], frame['UniqueAlbums'])
+
+            key, label, name = ('t.TrackId', 't.Name', 'Name') if report == 'top_tracks' \
+                else ('a.AlbumId', 'a.Title', 'Title')
+            rows = conn.execute(f"""
+                SELECT {key}, {label}, COUNT(*) AS n {PURCHASES}
+                GROUP BY {key} ORDER BY n DESC, {key} LIMIT ?
+            """, (top_n,)).fetchall()
+            return top_series(pd.DataFrame(rows, columns=['id', 'label', 'count']), top_n, name)
+
+
+class HybridBackend:
+    """
+    SQLite counts purchases per (CustomerId, TrackId) on integer keys only;
+    pandas attaches the small dimension tables and derives every report
+    The pair counts are fetched once and shared by every report.
+    """
+
+    name = 'hybrid'
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.pairs = None
+
+    @property
+    def prepared(self):
+        return self.pairs is not None
+
+    def prepare_cost(self, estimates):
+        if self.prepared:
+            return 0.0
+        return (COST_HYBRID_SETUP + estimates['InvoiceLine'] * COST_HYBRID_PAIRS_ROW) / 1e6
+
+    def report_cost(self, report, estimates, top_n=DEFAULT_TOP_N):
+        pairs = min(estimates['InvoiceLine'], estimates['Customer'] * estimates['Track'])
+        factor = CUSTOMER_AGG_FACTOR if report == 'customer_stats' else 1
+        return (COST_FRAME_REPORT + pairs * COST_HYBRID_AGG_ROW) * factor / 1e6
+
+    def prepare(self):
+        if self.pairs is None:
+            with DatabaseConfig(self.database_path).raw_connection() as conn:
+                pairs = pd.DataFrame(conn.execute("""
+                    SELECT i.CustomerId, il.TrackId, COUNT(*)
+                    FROM InvoiceLine il JOIN Invoice i ON i.InvoiceId = il.InvoiceId
+                    GROUP BY i.CustomerId, il.TrackId
+                """).fetchall(), columns=['CustomerId', 'TrackId', 'Purchases'])
+                customers = pd.DataFrame(conn.execute('SELECT CustomerId, LastName, FirstName FROM Customer')
+                                         .fetchall(), columns=['CustomerId', 'LastName', 'FirstName'])
+                tracks = pd.DataFrame(conn.execute('SELECT TrackId, Name, AlbumId FROM Track').fetchall(),
+                                      columns=['TrackId', 'Name', 'AlbumId'])
+                albums = pd.DataFrame(conn.execute('SELECT AlbumId, Title FROM Album').fetchall(),
+                                      columns=['AlbumId', 'Title'])
+            # Inner joins drop purchases whose customer, track or album is missing, as PURCHASES does
+            tracks = tracks.merge(albums, on='AlbumId', how='inner')
+            self.pairs = pairs.merge(customers, on='CustomerId', how='inner').merge(tracks, on='TrackId', how='inner')
+        return self.pairs
+
+    def run(self, report, top_n=DEFAULT_TOP_N):
+        pairs = self.prepare()
+        if report == 'customer_stats':
+            stats = pairs.groupby('CustomerId').agg(
+                LastName=('LastName', 'first'), FirstName=('FirstName', 'first'),
+                TotalTracks=('Purchases', 'sum'), UniqueAlbums=('AlbumId', 'nunique'))
+            return _customer_frame(stats.index, stats['LastName'], stats['FirstName'],
+                                   stats['TotalTracks'], stats['UniqueAlbums'])
+
+        key, label, name = ('TrackId', 'Name', 'Name') if report == 'top_tracks' else ('AlbumId', 'Title', 'Title')
+        counts = pairs.groupby(key).agg(label=(label, 'first'), count=('Purchases', 'sum'))
+        return top_series(counts.rename_axis('id').reset_index(), top_n, name)
+
+
+BACKENDS = {backend.name: backend for backend in (PandasBackend, PushdownBackend, HybridBackend)}
+
+
+def make_backends(database_path, merged=None):
+    """One instance of every backend; merged is an already joined frame for the pandas backend"""
+    return {
+        'pandas': PandasBackend(database_path, merged),
+        'sqlite-pushdown': PushdownBackend(database_path),
+        'hybrid': HybridBackend(database_path),
+    }
+
+
+def choose_backend(backends, report, estimates, top_n=DEFAULT_TOP_N, remaining=1):
+    """
+    Cheapest backend for a report; returns (name, {name: estimated seconds})
+    A backend that still has to build its shared frame is charged for it
+    spread over the `remaining` reports that frame would serve.
+    """
+    costs = {name: backend.report_cost(report, estimates, top_n) + backend.prepare_cost(estimates) / remaining
+             for name, backend in backends.items()}
+    return min(costs, key=costs.get), costs
+
+
+def run_reports(database_path, reports=REPORTS, backend='auto', top_n=DEFAULT_TOP_N, merged=None):
+    """
+    Compute the reports with one backend, or with backend='auto' the one
+    estimated cheapest for each report. Estimates account for work already
+    done: once the pandas or hybrid backend has prepared its frame, later
+    reports on it only pay for the group-by. Pass merged (a
+    merge_data_python result) when the pandas join has already been done.
+    Each plan step has the chooser's amortized estimates per backend and the
+    chosen backend's unamortized estimate, comparable with the measured seconds.
+    Returns {'reports': {report: result}, 'plan': [...], 'estimates': row estimates}.
+    """
+    if backend != 'auto' and backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    with DatabaseConfig(database_path).raw_connection() as conn:
+        estimates = row_estimates(conn)
+
+    backends = make_backends(database_path, merged)
+    results = {}
+    plan = []
+    for position, report in enumerate(reports):
+        if report not in REPORTS:
+            raise ValueError(f"Unknown report: {report}")
+        chosen, costs = choose_backend(backends, report, estimates, top_n, len(reports) - position)
+        if backend != 'auto':
+            chosen = backend
+        # The chosen backend's own estimate for this step, prepare included in full
+        expected = backends[chosen].report_cost(report, estimates, top_n) + backends[chosen].prepare_cost(estimates)
+        start = time.perf_counter()
+        results[report] = backends[chosen].run(report, top_n)
+        plan.append({'report': report, 'backend': chosen, 'estimated_seconds': costs,
+                     'expected_seconds': expected, 'seconds': time.perf_counter() - start})
+    return {'reports': results, 'plan': plan, 'estimates': estimates}
+
+
+def compare_backends(database_path, reports=REPORTS, top_n=DEFAULT_TOP_N):
+    """
+    Run the reports once per backend and once with the chooser, each from a
+    cold start, and check that every run returns the same results
+    Estimated next to measured seconds, with the cost constants used, show
+    whether the chooser's pick holds up.
+    """
+    runs = {name: run_reports(database_path, reports, name, top_n) for name in ['auto'] + list(BACKENDS)}
+    reference = runs['sqlite-pushdown']['reports']
+    totals = {name: sum(step['seconds'] for step in run['plan']) for name, run in runs.items()}
+    expected_totals = {name: sum(step['expected_seconds'] for step in run['plan']) for name, run in runs.items()}
+    return {
+        'estimates': runs['auto']['estimates'],
+        'runs': {name: run['plan'] for name, run in runs.items()},
+        'totals': totals,
+        'expected_totals': expected_totals,
+        'cost_model': COST_MODEL,
+        'agree': all(run['reports'][report].equals(reference[report])
+                     for run in runs.values() for report in reports),
+    }
+
+
+def print_comparison(comparison):
+    estimates = comparison['estimates']
+    print(f"Row estimates: {', '.join(f'{table} {rows}' for table, rows in sorted(estimates.items()))}")
+    names = list(BACKENDS)
+    print(f"{'report':<16}" + ''.join(f"{name:>17}" for name in names) + f"{'auto':>28}")
+    auto_plan = comparison['runs']['auto']
+    for position, step in enumerate(auto_plan):
+        cells = ''.join(f"{comparison['runs'][name][position]['seconds']:>15.3f} s" for name in names)
+        auto = f"{step['backend']} {step['seconds']:.3f} s"
+        print(f"{step['report']:<16}{cells}{auto:>28}")
+        estimated = ''.join(f"{comparison['runs'][name][position]['expected_seconds']:>15.3f} s" for name in names)
+        print(f"{'  estimated':<16}{estimated}{step['expected_seconds']:>26.3f} s")
+    totals = comparison['totals']
+    print(f"{'total':<16}" + ''.join(f"{totals[name]:>15.3f} s" for name in names) + f"{totals['auto']:>26.3f} s")
+    expected = comparison['expected_totals']
+    print(f"{'  estimated':<16}" + ''.join(f"{expected[name]:>15.3f} s" for name in names)
+          + f"{expected['auto']:>26.3f} s")
+    print(f"All backends agree: {'yes' if comparison['agree'] else 'no'}")
+
+
+def print_plan(result):
+    for step in result['plan']:
+        estimated = ', '.join(f"{name} {seconds:.3f} s" for name, seconds in step['estimated_seconds'].items())
+        print(f"{step['report']}: {step['backend']} in {step['seconds']:.3f} s (estimated: {estimated})")
+    for report, value in result['reports'].items():
+        print(f"\n{report}:")
+        print(value.nlargest(DEFAULT_TOP_N, 'TotalTracks') if report == 'customer_stats' else value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Customer, track and album reports on a choice of engines')
+    parser.add_argument('database', nargs='?', default='Chinook_Sqlite.sqlite')
+    parser.add_argument('--backend', choices=['auto'] + list(BACKENDS), default='auto')
+    parser.add_argument('--report', choices=REPORTS, nargs='+', default=REPORTS)
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP_N)
+    parser.add_argument('--compare', action='store_true', help='time every backend and check they agree')
+    args = parser.parse_args()
+
+    if args.compare:
+        print_comparison(compare_backends(args.database, args.report, args.top))
+    else:
+        print_plan(run_reports(args.database, args.report, args.backend, args.top))
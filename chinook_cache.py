@@ -0,0 +1,118 @@
+# chinook_cache.py
+import hashlib
+import json
+import os
+import shutil
+import config
+from config import DatabaseConfig
+
+
+def database_fingerprint(database_path):
+    """
+    Identify the current contents of a SQLite file by path, size, mtime and schema
+    Returns a short hex digest, or None if the file does not exist
+    """
+    if not os.path.exists(database_path):
+        return None
+
+    stat = os.stat(database_path)
+    with DatabaseConfig(database_path).raw_connection() as conn:
+        rows = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master ORDER BY type, name"
+        ).fetchall()
+
+    schema_hash = hashlib.sha256(json.dumps(rows).encode()).hexdigest()
+    key = json.dumps([os.path.abspath(database_path), stat.st_size, stat.st_mtime_ns, schema_hash])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+class TableCache:
+    """
+    On-disk Feather cache of DataFrames loaded from a Chinook database
+    Entries live in <cache_dir>/<database name>-<path hash>-<fingerprint>/ and
+    are dropped automatically when the database file or its schema changes.
+    The path hash keeps databases with the same file name apart.
+    """
+
+    def __init__(self, database_path, cache_dir=None):
+        self.database_path = database_path
+        self.cache_dir = cache_dir or os.path.join(config.OUTPUT_DIR, 'cache')
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+        self.entry_dir = None
+
+        try:
+            import pyarrow.feather  # noqa: F401
+        except ImportError:
+            print("pyarrow not available, table cache disabled")
+            self.enabled = False
+            return
+
+        fingerprint = database_fingerprint(database_path)
+        if fingerprint is None:
+            self.enabled = False
+            return
+
+        path_hash = hashlib.sha256(os.path.abspath(database_path).encode()).hexdigest()[:8]
+        prefix = f'{os.path.splitext(os.path.basename(database_path))[0]}-{path_hash}-'
+        self.entry_dir = os.path.join(self.cache_dir, prefix + fingerprint)
+        self.remove_stale_entries(prefix)
+
+    def remove_stale_entries(self, prefix):
+        """Delete cache directories for older versions of this database"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and path != self.entry_dir and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def path_for(self, name):
+        return os.path.join(self.entry_dir, f'{name}.feather')
+
+    def load(self, name):
+        """Return the cached DataFrame for name, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        path = self.path_for(name)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        import pyarrow.feather as feather
+        try:
+            # Memory-mapped read: uncompressed Feather columns are not copied on load
+            table = feather.read_table(path, memory_map=True)
+            self.hits += 1
+            return table.to_pandas()
+        except Exception as e:
+            print(f"Ignoring unreadable cache entry {path}: {e}")
+            self.misses += 1
+            return None
+
+    def store(self, name, df):
+        """Write df to the cache through a temp file and rename"""
+        if not self.enabled:
+            return
+
+        import pyarrow.feather as feather
+        temp_path = None
+        try:
+            os.makedirs(self.entry_dir, exist_ok=True)
+            path = self.path_for(name)
+            # Per-process temp name: concurrent writers must not share one
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            # Uncompressed so warm loads can be memory-mapped
+            feather.write_feather(df.reset_index(drop=True), temp_path, compression='uncompressed')
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Could not write cache entry {name}: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def clear(self):
+        """Remove all cached entries for this database"""
+        if self.entry_dir and os.path.isdir(self.entry_dir):
+            shutil.rmtree(self.entry_dir, ignore_errors=True)
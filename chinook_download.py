@@ -0,0 +1,228 @@
+# chinook_download.py
+import glob
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+# A chunk that arrives faster than this doubles the next read size
+FAST_CHUNK_SECONDS = 0.25
+PROGRESS_INTERVAL = 0.5
+# Ranges smaller than this are not worth a separate connection
+MIN_SEGMENT_BYTES = 1024 * 1024
+
+
+class Progress:
+    """Thread-safe byte counter that prints at most every PROGRESS_INTERVAL seconds"""
+
+    def __init__(self, total, done=0, interval=PROGRESS_INTERVAL, enabled=True):
+        self.total = total
+        self.done = done
+        self.interval = interval
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._last = 0.0
+
+    def add(self, nbytes):
+        with self._lock:
+            self.done += nbytes
+            now = time.monotonic()
+            if now - self._last >= self.interval:
+                self._last = now
+                self._print()
+
+    def finish(self):
+        if self.enabled:
+            self._print()
+            print()
+
+    def _print(self):
+        if not self.enabled:
+            return
+        if self.total:
+            done = int(50 * self.done / self.total)
+            print(f"\r[{'=' * done}{' ' * (50 - done)}] {self.done}/{self.total} bytes", end='', flush=True)
+        else:
+            print(f"\r{self.done} bytes", end='', flush=True)
+
+
+def local_source(url):
+    """Filesystem path for file:// URLs and plain paths, None for HTTP(S)"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'file':
+        return url2pathname(parsed.path)
+    if parsed.scheme in ('http', 'https'):
+        return None
+    return url
+
+
+def sha256_file(path, chunk_size=MAX_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_stream(read, f, progress, limit=None):
+    """
+    Copy from read(n) into f, growing the chunk size while reads are fast
+    Stops after limit bytes if given. Returns the bytes copied.
+    """
+    chunk_size = MIN_CHUNK_SIZE
+    copied = 0
+    while limit is None or copied < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - copied)
+        start = time.monotonic()
+        block = read(size)
+        if not block:
+            break
+        f.write(block)
+        copied += len(block)
+        progress.add(len(block))
+        if time.monotonic() - start < FAST_CHUNK_SECONDS:
+            chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+    return copied
+
+
+def _fetch_local(source, part_path, progress_enabled):
+    """Copy a local mirror file into the .part file, resuming from its size"""
+    total = os.path.getsize(source)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset > total:
+        offset = 0
+    progress = Progress(total, offset, enabled=progress_enabled)
+    with open(source, 'rb') as src, open(part_path, 'ab' if offset else 'wb') as f:
+        src.seek(offset)
+        _copy_stream(src.read, f, progress)
+    progress.finish()
+
+
+def _probe(session, url, timeout):
+    """Total size and whether the server honours byte ranges"""
+    response = session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout)
+    try:
+        response.raise_for_status()
+        if response.status_code == 206:
+            content_range = response.headers.get('Content-Range', '')
+            total = content_range.rsplit('/', 1)[-1]
+            return (int(total) if total.isdigit() else None), True
+        length = response.headers.get('Content-Length')
+        return (int(length) if length else None), False
+    finally:
+        response.close()
+
+
+def _fetch_range(session, url, path, start, end, timeout, progress):
+    """
+    Fill path with bytes start..end (inclusive) of url
+    An existing partial file is resumed from its current size.
+    """
+    have = os.path.getsize(path) if os.path.exists(path) else 0
+    if have > end - start + 1:
+        # Longer than its range: not ours to resume
+        os.remove(path)
+        have = 0
+    if start + have > end:
+        return
+    headers = {'Range': f'bytes={start + have}-{end}'}
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise IOError(f"Server ignored range request for bytes {start + have}-{end}")
+        with open(path, 'ab') as f:
+            _copy_stream(lambda n: response.raw.read(n, decode_content=True), f, progress,
+                         limit=end - start + 1 - have)
+
+
+def _segment_path(part_path, start, end):
+    """Segment files carry their byte range so a rerun never resumes the wrong one"""
+    return f'{part_path}.{start}-{end}'
+
+
+def _remove_stale_segments(part_path, keep=()):
+    """Delete segment files left by runs with another size or segment count"""
+    for path in glob.glob(glob.escape(part_path) + '.*-*'):
+        if path not in keep:
+            os.remove(path)
+
+
+def _fetch_http(url, part_path, segments, timeout, progress_enabled):
+    import requests
+
+    with requests.Session() as session:
+        total, ranges = _probe(session, url, timeout)
+
+        if ranges and total and segments > 1 and total >= 2 * MIN_SEGMENT_BYTES:
+            # Parallel byte ranges, each resumable in its own .part.START-END file
+            segments = min(segments, total // MIN_SEGMENT_BYTES)
+            step = -(-total // segments)
+            bounds = [(i * step, min(total, (i + 1) * step) - 1) for i in range(segments)]
+            paths = [_segment_path(part_path, start, end) for start, end in bounds]
+            _remove_stale_segments(part_path, keep=paths)
+            done = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+            progress = Progress(total, done, enabled=progress_enabled)
+            with ThreadPoolExecutor(max_workers=segments) as pool:
+                futures = [pool.submit(_fetch_range, session, url, path, start, end, timeout, progress)
+                           for path, (start, end) in zip(paths, bounds)]
+                for future in futures:
+                    future.result()
+            progress.finish()
+
+            with open(part_path, 'wb') as f:
+                for path in paths:
+                    with open(path, 'rb') as segment:
+                        shutil.copyfileobj(segment, f, MAX_CHUNK_SIZE)
+            for path in paths:
+                os.remove(path)
+            return
+
+        _remove_stale_segments(part_path)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if total and offset > total:
+            offset = 0
+        if total and offset == total:
+            return
+        headers = {'Range': f'bytes={offset}-'} if offset and ranges else {}
+        with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # Full body: start the .part file over
+                offset = 0
+            progress = Progress(total, offset, enabled=progress_enabled)
+            with open(part_path, 'ab' if offset else 'wb') as f:
+                _copy_stream(lambda n: response.raw.read(n, decode_content=True), f, progress)
+            progress.finish()
+
+
+def download_file(url, dest_path, sha256=None, segments=1, timeout=60, progress=True):
+    """
+    Download url to dest_path through a resumable dest_path + '.part' file
+    url may be http(s)://, file:// or a local mirror path. segments > 1
+    fetches that many byte ranges in parallel when the server supports them.
+    If sha256 is given the finished file must match it; on mismatch the
+    .part file is discarded and ValueError is raised. The file only appears
+    at dest_path, via an atomic rename, once it is complete and checked.
+    """
+    part_path = dest_path + '.part'
+    source = local_source(url)
+    if source is not None:
+        _fetch_local(source, part_path, progress)
+    else:
+        _fetch_http(url, part_path, segments, timeout, progress)
+
+    if sha256:
+        actual = sha256_file(part_path)
+        if actual.lower() != sha256.lower():
+            os.remove(part_path)
+            raise ValueError(f"SHA-256 mismatch for {url}: expected {sha256}, got {actual}")
+
+    os.replace(part_path, dest_path)
+    return dest_path
@@ -0,0 +1,156 @@
+# chinook_export.py
+import gzip
+import io
+import os
+import pandas as pd
+from sqlalchemy import text
+import config
+
+
+EXPORT_BATCH_SIZE = 50000
+
+# File extension per format and compression
+EXTENSIONS = {
+    ('csv', None): '.csv',
+    ('csv', 'gzip'): '.csv.gz',
+    ('csv', 'zstd'): '.csv.zst',
+    ('parquet', None): '.parquet',
+    ('arrow', None): '.arrow',
+}
+
+
+def iter_frame_batches(df, batch_size=EXPORT_BATCH_SIZE):
+    """Yield slices of an in-memory DataFrame; an empty frame is yielded once for its columns"""
+    if len(df) == 0:
+        yield df
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size]
+
+
+def iter_query_batches(connection, query, batch_size=EXPORT_BATCH_SIZE, params=None):
+    """
+    Yield DataFrames from a server-side cursor
+    Rows are fetched with fetchmany so only one batch is held at a time.
+    A query with no rows yields one empty DataFrame with the result columns.
+    """
+    result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+        text(query), params or {}
+    )
+    columns = list(result.keys())
+    try:
+        empty = True
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            empty = False
+            yield pd.DataFrame(rows, columns=columns)
+        if empty:
+            yield pd.DataFrame(columns=columns, dtype=str)
+    finally:
+        result.close()
+
+
+def export_path(filename, fmt='csv', compression=None, output_dir=None):
+    """Build the output path in OUTPUT_DIR with the right extension"""
+    if (fmt, compression) not in EXTENSIONS:
+        raise ValueError(f"Unsupported export format: {fmt} with compression {compression}")
+    output_dir = output_dir or config.OUTPUT_DIR
+    base = os.path.splitext(filename)[0]
+    return os.path.join(output_dir, base + EXTENSIONS[(fmt, compression)])
+
+
+def _plain_strings(batch):
+    """Categorical columns become plain strings so every batch has the same Arrow schema"""
+    categorical = [c for c in batch.columns if isinstance(batch[c].dtype, pd.CategoricalDtype)]
+    if categorical:
+        batch = batch.astype({c: object for c in categorical})
+    return batch
+
+
+def _open_csv(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression needs the 'zstandard' package")
+        raw = open(path, 'wb')
+        writer = zstandard.ZstdCompressor().stream_writer(raw)
+        return io.TextIOWrapper(writer, encoding='utf-8', newline='')
+    return open(path, 'w', newline='', encoding='utf-8')
+
+
+def _with_columns(batches, columns):
+    """Pass batches through; if there are none, yield an empty frame with these text columns"""
+    empty = True
+    for batch in batches:
+        empty = False
+        yield batch
+    if empty:
+        yield pd.DataFrame(columns=list(columns or []), dtype=str)
+
+
+def _write_csv(batches, path, compression):
+    rows = 0
+    with _open_csv(path, compression) as f:
+        header = True
+        for batch in batches:
+            batch.to_csv(f, header=header, index=False)
+            header = False
+            rows += len(batch)
+    return rows
+
+
+def _write_arrow(batches, path, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        for batch in batches:
+            table = pa.Table.from_pandas(_plain_strings(batch), schema=schema, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                if fmt == 'parquet':
+                    writer = pq.ParquetWriter(path, schema)
+                else:
+                    writer = pa.ipc.new_file(path, schema)
+            # One Parquet row group / IPC record batch per input batch
+            writer.write_table(table)
+            rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_batches(batches, filename, fmt='csv', compression=None, output_dir=None, columns=None):
+    """
+    Write an iterator of DataFrames to OUTPUT_DIR without holding the whole result
+    fmt is 'csv' (compression None, 'gzip' or 'zstd'), 'parquet' or 'arrow' (IPC file).
+    Data goes to a temp file in the same directory and is renamed into place,
+    so readers never see a partial export. If batches is empty the file still
+    gets a header or schema, from columns (text columns) when given.
+    Returns (path, rows written).
+    """
+    batches = _with_columns(batches, columns)
+    path = export_path(filename, fmt, compression, output_dir)
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    temp_path = os.path.join(directory, f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+    try:
+        if fmt == 'csv':
+            rows = _write_csv(batches, temp_path, compression)
+        else:
+            rows = _write_arrow(batches, temp_path, fmt)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path, rows
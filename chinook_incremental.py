@@ -0,0 +1,228 @@
+# chinook_incremental.py
+import json
+import os
+import pandas as pd
+import config
+from chinook_python_centric import ChinookAnalyzer, OUTPUT_COLUMNS, STREAM_CHUNKSIZE
+
+
+STATE_VERSION = 2
+
+
+class IncrementalState:
+    """
+    Watermark and mergeable aggregate state persisted between runs
+    Counters are keyed by CustomerId, TrackId and AlbumId like CustomerAggregates.
+    csv_size is the length of the CSV export when the state was saved, so rows
+    appended by a run that failed before saving can be cut off again.
+    """
+
+    def __init__(self):
+        self.database_path = None
+        self.max_invoice_id = 0
+        self.max_invoice_line_id = 0
+        self.csv_size = 0
+        self.customer_tracks = {}
+        self.customer_albums = {}
+        self.track_counts = {}
+        self.album_counts = {}
+
+    @classmethod
+    def load(cls, path):
+        """Read state from path, or return a fresh state if there is none"""
+        state = cls()
+        if not os.path.exists(path):
+            return state
+
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != STATE_VERSION:
+            print(f"Ignoring incremental state with unknown version: {path}")
+            return state
+
+        state.database_path = data['database_path']
+        state.max_invoice_id = data['max_invoice_id']
+        state.max_invoice_line_id = data['max_invoice_line_id']
+        state.csv_size = data['csv_size']
+        # JSON object keys are strings; restore the integer ids
+        state.customer_tracks = {int(k): v for k, v in data['customer_tracks'].items()}
+        state.customer_albums = {int(k): set(v) for k, v in data['customer_albums'].items()}
+        state.track_counts = {int(k): v for k, v in data['track_counts'].items()}
+        state.album_counts = {int(k): v for k, v in data['album_counts'].items()}
+        return state
+
+    def save(self, path):
+        """Write state through a temp file and rename"""
+        data = {
+            'version': STATE_VERSION,
+            'database_path': self.database_path,
+            'max_invoice_id': self.max_invoice_id,
+            'max_invoice_line_id': self.max_invoice_line_id,
+            'csv_size': self.csv_size,
+            'customer_tracks': self.customer_tracks,
+            'customer_albums': {k: sorted(v) for k, v in self.customer_albums.items()},
+            'track_counts': self.track_counts,
+            'album_counts': self.album_counts,
+        }
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _add_counts(totals, counts):
+        for key, count in counts.items():
+            totals[int(key)] = totals.get(int(key), 0) + int(count)
+
+    def update(self, chunk):
+        """Merge one chunk of newly joined rows into the aggregates"""
+        if chunk.empty:
+            # Nothing new; max() of an empty column is NaN
+            return
+        self._add_counts(self.customer_tracks, chunk['CustomerId'].value_counts())
+        self._add_counts(self.track_counts, chunk['TrackId'].value_counts())
+        self._add_counts(self.album_counts, chunk['AlbumId'].value_counts())
+
+        pairs = chunk[['CustomerId', 'AlbumId']].drop_duplicates()
+        for customer_id, albums in pairs.groupby('CustomerId')['AlbumId']:
+            self.customer_albums.setdefault(int(customer_id), set()).update(int(a) for a in albums)
+
+        self.max_invoice_id = max(self.max_invoice_id, int(chunk['InvoiceId'].max()))
+        self.max_invoice_line_id = max(self.max_invoice_line_id, int(chunk['InvoiceLineId'].max()))
+
+
+class IncrementalAnalyzer:
+    """
+    Process only invoice lines added since the last run
+    New lines are joined, folded into the persisted aggregates and appended
+    to the CSV export. The CSV holds the same rows as a full export, in the
+    order they were processed rather than sorted by customer name.
+    """
+
+    def __init__(self, database_path='Chinook_Sqlite.sqlite', state_dir=None, csv_path=None):
+        self.database_path = database_path
+        self.state_dir = state_dir or os.path.join(config.OUTPUT_DIR, 'incremental')
+        name = os.path.splitext(os.path.basename(database_path))[0]
+        self.state_path = os.path.join(self.state_dir, f'{name}-state.json')
+        self.csv_path = csv_path or os.path.join(config.OUTPUT_DIR, config.CSV_FILENAME)
+        self.analyzer = ChinookAnalyzer(database_path)
+        self.state = None
+
+    def reset(self):
+        """Forget the watermark so the next run recomputes everything"""
+        for path in (self.state_path, self.csv_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _check_watermark(self, state):
+        """Start over if the state belongs to another database or the tables shrank"""
+        if state.database_path not in (None, os.path.abspath(self.database_path)):
+            print("Incremental state is for a different database, recomputing from scratch")
+            return IncrementalState()
+
+        max_line = pd.read_sql(
+            'SELECT COALESCE(MAX(InvoiceLineId), 0) AS max_id FROM InvoiceLine', self.analyzer.connection
+        )['max_id'].iloc[0]
+        if max_line < state.max_invoice_line_id:
+            print("InvoiceLine is smaller than the saved watermark, recomputing from scratch")
+            return IncrementalState()
+        return state
+
+    def _check_csv(self, state):
+        """
+        Cut the CSV back to the size recorded with the state
+        Rows past that point were appended by a run that never saved its
+        watermark and will be processed again. A CSV shorter than recorded
+        has lost rows, so everything is recomputed.
+        """
+        if state.max_invoice_line_id == 0:
+            if os.path.exists(self.csv_path):
+                os.remove(self.csv_path)
+            return state
+
+        size = os.path.getsize(self.csv_path) if os.path.exists(self.csv_path) else 0
+        if size < state.csv_size:
+            print("CSV export is shorter than the saved state, recomputing from scratch")
+            if os.path.exists(self.csv_path):
+                os.remove(self.csv_path)
+            return IncrementalState()
+        if size > state.csv_size:
+            print(f"Discarding {size - state.csv_size} bytes appended by an unfinished run")
+            with open(self.csv_path, 'r+b') as f:
+                f.truncate(state.csv_size)
+        return state
+
+    def run(self, chunksize=STREAM_CHUNKSIZE):
+        """
+        Process new invoice lines and return (customer_stats, popular_tracks, popular_albums)
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(self.csv_path) or '.', exist_ok=True)
+
+        if not self.analyzer.connect_to_database():
+            return None
+
+        try:
+            state = self._check_csv(self._check_watermark(IncrementalState.load(self.state_path)))
+            state.database_path = os.path.abspath(self.database_path)
+
+            print(f"Processing invoice lines after InvoiceLineId {state.max_invoice_line_id}...")
+            new_rows = 0
+            for chunk in self.analyzer.iter_merged_chunks(chunksize, after_line_id=state.max_invoice_line_id):
+                if chunk.empty:
+                    continue
+                write_header = not os.path.exists(self.csv_path)
+                chunk[OUTPUT_COLUMNS].to_csv(self.csv_path, mode='a', header=write_header, index=False)
+                state.update(chunk)
+                new_rows += len(chunk)
+
+            state.csv_size = os.path.getsize(self.csv_path) if os.path.exists(self.csv_path) else 0
+            state.save(self.state_path)
+            self.state = state
+            print(f"Processed {new_rows} new rows; watermark now InvoiceId {state.max_invoice_id}, "
+                  f"InvoiceLineId {state.max_invoice_line_id}")
+
+            results = self.build_reports()
+            self.analyzer.print_behavior_results(*results)
+            return results
+
+        except Exception as e:
+            print(f"Error during incremental analysis: {e}")
+            return None
+
+        finally:
+            self.analyzer.close_connection()
+
+    def build_reports(self, top_n=10):
+        """
+        Turn the persisted aggregates into the analyze_customer_behavior outputs
+        Customers come in CustomerId order and ties in the top-N go to the lower
+        id, so the reports don't depend on the order runs saw the rows in.
+        """
+        tables = self.analyzer.tables
+        state = self.state
+
+        customers = tables['customers'].set_index('CustomerId')
+        customer_ids = sorted(state.customer_tracks)
+        labels = customers.loc[customer_ids, ['LastName', 'FirstName']].astype(object)
+        customer_stats = pd.DataFrame(
+            {
+                'TotalTracks': [state.customer_tracks[c] for c in customer_ids],
+                'UniqueAlbums': [len(state.customer_albums.get(c, ())) for c in customer_ids],
+            },
+            index=pd.MultiIndex.from_frame(labels),
+        )
+
+        def top(counts, table, key, label):
+            series = pd.Series(counts, dtype='int64').sort_index()
+            series = series.sort_values(ascending=False, kind='stable').head(top_n)
+            names = table.set_index(key).loc[series.index, label].astype(object)
+            return pd.Series(series.values, index=pd.Index(names.values, name=label), name='count')
+
+        popular_tracks = top(state.track_counts, tables['tracks'], 'TrackId', 'Name')
+        popular_albums = top(state.album_counts, tables['albums'], 'AlbumId', 'Title')
+        return customer_stats, popular_tracks, popular_albums
+
+
+if __name__ == "__main__":
+    IncrementalAnalyzer(config.get_database_path() or 'Chinook_Sqlite.sqlite').run()
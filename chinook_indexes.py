@@ -0,0 +1,216 @@
+# chinook_indexes.py
+import time
+import numpy as np
+import pandas as pd
+
+
+# Use a direct key -> position array when the key range is at most this many
+# times the number of rows, otherwise fall back to a sorted-key search
+DENSE_INDEX_FACTOR = 4
+
+# (table name, key column) pairs indexed after loading
+INDEXED_KEYS = [
+    ('customers', 'CustomerId'),
+    ('invoices', 'InvoiceId'),
+    ('tracks', 'TrackId'),
+    ('albums', 'AlbumId'),
+]
+
+
+class KeyIndex:
+    """Integer-position lookup for a unique key column"""
+
+    def __init__(self, keys):
+        keys = np.asarray(keys, dtype='int64')
+        self.size = len(keys)
+        self.positions = None
+        self.sorted_keys = None
+        self.order = None
+
+        if self.size and keys.min() >= 0 and keys.max() < DENSE_INDEX_FACTOR * self.size + 1024:
+            # Dense array: positions[key] is the row number, -1 when missing
+            self.positions = np.full(int(keys.max()) + 1, -1, dtype='int64')
+            self.positions[keys] = np.arange(self.size)
+        else:
+            self.order = np.argsort(keys, kind='stable')
+            self.sorted_keys = keys[self.order]
+
+    def lookup(self, values):
+        """Return (row positions, found mask) for an array of key values"""
+        values = np.asarray(values)
+        if self.size == 0:
+            return np.zeros(len(values), dtype='int64'), np.zeros(len(values), dtype=bool)
+
+        if self.positions is not None and len(values) and values.dtype.kind in 'iu' \
+                and values.min() >= 0 and values.max() < len(self.positions):
+            # Every value is in range: one gather, no int64 copy of the keys
+            rows = self.positions[values]
+            found = rows >= 0
+            return (rows, found) if found.all() else (np.where(found, rows, 0), found)
+
+        values = values.astype('int64', copy=False)
+        if self.positions is not None:
+            in_range = (values >= 0) & (values < len(self.positions))
+            rows = np.where(in_range, self.positions[np.where(in_range, values, 0)], -1)
+            found = rows >= 0
+            return np.where(found, rows, 0), found
+
+        slots = np.minimum(np.searchsorted(self.sorted_keys, values), self.size - 1)
+        found = self.sorted_keys[slots] == values
+        return self.order[slots], found
+
+
+    def map_values(self, values, mapped, missing):
+        """
+        mapped[row of each key value], or missing for values not in the index
+        On a dense index this is a single gather through a key -> mapped table,
+        so the result keeps mapped's (possibly narrow) dtype.
+        """
+        values = np.asarray(values)
+        mapped = np.asarray(mapped)
+        if self.positions is not None and len(values) and values.dtype.kind in 'iu' \
+                and values.min() >= 0 and values.max() < len(self.positions):
+            table = np.full(len(self.positions), missing, dtype=mapped.dtype)
+            present = self.positions >= 0
+            table[present] = mapped[self.positions[present]]
+            return table[values]
+
+        rows, found = self.lookup(values)
+        result = mapped[rows]
+        result[~found] = missing
+        return result
+
+
+class DimensionIndexes:
+    """Prebuilt key indexes over the loaded Chinook tables"""
+
+    def __init__(self, tables):
+        start = time.perf_counter()
+        self.indexes = {}
+        for table_name, column in INDEXED_KEYS:
+            self.indexes[column] = KeyIndex(tables[table_name][column].to_numpy())
+        self.build_seconds = time.perf_counter() - start
+
+    def __getitem__(self, column):
+        return self.indexes[column]
+
+
+def get_dimension_indexes(tables):
+    """
+    Build indexes for these loaded tables
+    Row positions are only valid for the frames they were built from, so
+    every load builds its own (well under a millisecond for Chinook).
+    """
+    return DimensionIndexes(tables)
+
+
+def stable_int_argsort(keys):
+    """
+    Stable argsort of non-negative integer keys
+    Sorts 8 or 16 bits per pass so numpy can use its radix sort instead of a comparison sort
+    """
+    keys = np.asarray(keys)
+    if keys.dtype == np.uint8 or keys.dtype == np.uint16:
+        return np.argsort(keys, kind='stable')
+    keys = keys.astype('int64', copy=False)
+    top = keys.max() if len(keys) else 0
+    if top < 256:
+        return np.argsort(keys.astype('uint8'), kind='stable')
+    if top < 65536:
+        return np.argsort(keys.astype('uint16'), kind='stable')
+
+    order = np.argsort((keys & 0xFFFF).astype('uint16'), kind='stable')
+    return order[stable_int_argsort(keys[order] >> 16)]
+
+
+def _gather(df, columns, rows):
+    """Take rows of the given columns without building a join hash table"""
+    return {column: df[column].take(rows).reset_index(drop=True) for column in columns}
+
+
+def indexed_join(tables, indexes):
+    """
+    Produce the same rows and columns as merge_data_python using index gathers
+    Rows come out in the order of the chained pd.merge calls: by customer,
+    then invoice, then invoice line.
+    """
+    customers = tables['customers']
+    invoices = tables['invoices']
+    lines = tables['invoice_items']
+    tracks = tables['tracks']
+    albums = tables['albums']
+
+    # Invoice -> Customer, resolved once on the small Invoice table. Each invoice
+    # gets a rank in (customer row, invoice row) order, which is the order the
+    # chained merges emit.
+    invoice_customer_rows, invoice_found = indexes['CustomerId'].lookup(invoices['CustomerId'].to_numpy())
+    invoice_order = np.lexsort((np.arange(len(invoices)), invoice_customer_rows))
+    invoice_rank = np.empty(len(invoices), dtype='int64')
+    invoice_rank[invoice_order] = np.arange(len(invoices))
+
+    # InvoiceLine -> Invoice
+    invoice_rows, found = indexes['InvoiceId'].lookup(lines['InvoiceId'].to_numpy())
+    found &= invoice_found[invoice_rows]
+
+    # InvoiceLine -> Track -> Album
+    track_rows, track_found = indexes['TrackId'].lookup(lines['TrackId'].to_numpy())
+    found &= track_found
+    album_rows, album_found = indexes['AlbumId'].lookup(tracks['AlbumId'].to_numpy()[track_rows])
+    found &= album_found
+
+    # A stable sort on the invoice rank keeps invoice lines in table order
+    line_rows = np.flatnonzero(found)
+    line_ranks = invoice_rank[invoice_rows[line_rows]]
+    if len(line_ranks) and (np.diff(line_ranks) < 0).any():
+        line_rows = line_rows[stable_int_argsort(line_ranks)]
+    customer_rows = invoice_customer_rows[invoice_rows]
+
+    columns = {}
+    columns.update(_gather(customers, ['CustomerId', 'FirstName', 'LastName'], customer_rows[line_rows]))
+    columns.update(_gather(lines, ['InvoiceId', 'InvoiceLineId', 'TrackId'], line_rows))
+    columns.update(_gather(tracks, ['Name', 'AlbumId'], track_rows[line_rows]))
+    columns.update(_gather(albums, ['Title'], album_rows[line_rows]))
+
+    return pd.DataFrame(columns)[['CustomerId', 'FirstName', 'LastName', 'InvoiceId',
+                                  'InvoiceLineId', 'TrackId', 'Name', 'AlbumId', 'Title']]
+
+
+def compare_join_strategies(analyzer, repeat=3):
+    """
+    Check that the indexed join matches merge_data_python and time both
+    The analyzer must already have its tables loaded
+    """
+    import contextlib
+    import io
+
+    def best_time(func):
+        best = None
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    merged, merge_seconds = best_time(lambda: analyzer.merge_data_python(use_indexes=False))
+    indexes = get_dimension_indexes(analyzer.tables)
+    indexed, indexed_seconds = best_time(lambda: indexed_join(analyzer.tables, indexes))
+
+    identical = merged.reset_index(drop=True).equals(indexed)
+    speedup = merge_seconds / indexed_seconds if indexed_seconds else float('inf')
+
+    print("\nJoin strategy comparison:")
+    print(f"  pd.merge chain: {merge_seconds * 1000:.2f} ms")
+    print(f"  Indexed gather: {indexed_seconds * 1000:.2f} ms"
+          f" (index build {indexes.build_seconds * 1000:.2f} ms)")
+    print(f"  Speedup: {speedup:.1f}x")
+    print(f"  Results identical: {identical}")
+
+    return {
+        'identical': identical,
+        'merge_seconds': merge_seconds,
+        'indexed_seconds': indexed_seconds,
+        'index_build_seconds': indexes.build_seconds,
+    }
@@ -0,0 +1,95 @@
+# chinook_parallel.py
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pandas as pd
+from sqlalchemy import text
+from config import DatabaseConfig
+
+
+DEFAULT_WORKERS = 4
+
+# Tables split into rowid ranges and read in parallel
+SPLIT_TABLES = {'InvoiceLine'}
+
+
+def _read_query(database_path, sql, params=None):
+    """Run one query on its own pooled read-only connection and time it"""
+    start = time.perf_counter()
+    with DatabaseConfig(database_path).connect() as connection:
+        df = pd.read_sql(text(sql), connection, params=params)
+    return df, time.perf_counter() - start
+
+
+def _read_query_arrow(database_path, sql, params=None):
+    """Process-pool worker: return the result as Arrow IPC bytes when pyarrow is available"""
+    df, elapsed = _read_query(database_path, sql, params)
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return df, elapsed
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), elapsed
+
+
+def _from_worker(result):
+    """Turn a worker result back into a DataFrame"""
+    if isinstance(result, pd.DataFrame):
+        return result
+    import pyarrow as pa
+    return pa.ipc.open_stream(result).read_all().to_pandas()
+
+
+def rowid_ranges(database_path, sql_table, parts):
+    """Split a table's rowid span into at most `parts` half-open ranges"""
+    with DatabaseConfig(database_path).connect() as connection:
+        low, high = connection.execute(text(f'SELECT MIN(rowid), MAX(rowid) FROM {sql_table}')).one()
+    if low is None:
+        return [(0, 1)]
+
+    step = max((high - low + 1 + parts - 1) // parts, 1)
+    return [(start, min(start + step, high + 1)) for start in range(low, high + 1, step)]
+
+
+def load_tables_parallel(database_path, queries, workers=DEFAULT_WORKERS, executor='thread'):
+    """
+    Load several tables concurrently
+    queries maps a table name to (SQL table, SELECT statement without WHERE or ORDER BY).
+    Every table is read in rowid order; tables in SPLIT_TABLES are read as
+    rowid ranges and concatenated in that order.
+    Returns (tables, latencies) where latencies holds seconds per table.
+    """
+    if executor == 'process':
+        pool_class, worker = ProcessPoolExecutor, _read_query_arrow
+    else:
+        pool_class, worker = ThreadPoolExecutor, _read_query
+
+    start = time.perf_counter()
+    with pool_class(max_workers=workers) as pool:
+        futures = {}
+        for name, (sql_table, sql) in queries.items():
+            if sql_table in SPLIT_TABLES and workers > 1:
+                ranges = rowid_ranges(database_path, sql_table, workers)
+                futures[name] = [
+                    pool.submit(worker, database_path,
+                                f'{sql} WHERE rowid >= :low AND rowid < :high ORDER BY rowid',
+                                {'low': low, 'high': high})
+                    for low, high in ranges
+                ]
+            else:
+                futures[name] = [pool.submit(worker, database_path, f'{sql} ORDER BY rowid')]
+
+        tables = {}
+        latencies = {}
+        for name, parts in futures.items():
+            results = [future.result() for future in parts]
+            frames = [_from_worker(df) for df, _ in results]
+            tables[name] = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            # Parts run side by side, so the table is ready when its slowest part is
+            latencies[name] = max(elapsed for _, elapsed in results)
+
+    latencies['total'] = time.perf_counter() - start
+    return tables, latencies
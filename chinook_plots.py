@@ -0,0 +1,156 @@
+# chinook_plots.py
+import hashlib
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import config
+
+
+DEFAULT_DPI = 100
+DEFAULT_FORMAT = 'png'
+HISTOGRAM_BINS = 20
+TOP_N = 10
+
+# Style picked once per process instead of probing plt.style.available per call
+_style = None
+
+
+def plot_data(df=None, aggregates=None, top_n=TOP_N, popular=None):
+    """
+    The small, precomputed inputs of the four plots
+    Top-N series and the tracks-per-customer histogram come from the shared
+    aggregates when available; df is only grouped when they are not. The
+    result is plain lists, cheap to hash and to send to a worker process.
+    popular=(tracks, albums) overrides the track and album counts.
+    """
+    if aggregates is not None:
+        top = aggregates.top_customers(top_n)['TotalTracks']
+        popular_tracks = aggregates.top_tracks(top_n)
+        popular_albums = aggregates.top_albums(top_n)
+        tracks_per_customer = aggregates.tracks_per_customer()
+    else:
+        customer_sizes = df.groupby(['LastName', 'FirstName'], observed=True).size()
+        top = customer_sizes.nlargest(top_n)
+        popular_tracks = df['Name'].value_counts().head(top_n)
+        popular_albums = df['Title'].value_counts().head(top_n)
+        tracks_per_customer = customer_sizes.to_numpy()
+    if popular is not None:
+        popular_tracks, popular_albums = (series.head(top_n) for series in popular)
+
+    counts, edges = np.histogram(np.asarray(tracks_per_customer), bins=HISTOGRAM_BINS)
+    return {
+        'top_customers': [[', '.join(map(str, k)) if isinstance(k, tuple) else str(k), int(v)]
+                          for k, v in top.items()],
+        'popular_tracks': [[str(k), int(v)] for k, v in popular_tracks.items()],
+        'popular_albums': [[str(k), int(v)] for k, v in popular_albums.items()],
+        'histogram': {'counts': counts.tolist(), 'edges': edges.tolist()},
+    }
+
+
+def plot_data_hash(data, dpi=DEFAULT_DPI, fmt=DEFAULT_FORMAT):
+    """Cache key for a rendered figure: the plot inputs plus the output settings"""
+    payload = json.dumps({'data': data, 'dpi': dpi, 'format': fmt}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _apply_style(plt):
+    global _style
+    if _style is None:
+        available = plt.style.available
+        if 'seaborn' in available:
+            _style = 'seaborn'
+        elif 'seaborn-v0_8' in available:
+            _style = 'seaborn-v0_8'
+        else:
+            _style = 'default'
+    plt.style.use(_style)
+
+
+def _bar(ax, pairs, title, ylabel, color):
+    labels = [label for label, _ in pairs]
+    ax.bar(range(len(pairs)), [value for _, value in pairs], color=color, edgecolor='black')
+    ax.set_title(title)
+    ax.set_xticks(range(len(pairs)))
+    ax.set_xticklabels(labels, rotation=45, ha='right')
+    ax.set_ylabel(ylabel)
+
+
+def draw_figure(plt, data):
+    """Draw the four analysis plots from plot_data() output and return the figure"""
+    _apply_style(plt)
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+
+    _bar(axes[0, 0], data['top_customers'], 'Top 10 Customers by Tracks Purchased',
+         'Number of Tracks', 'skyblue')
+    _bar(axes[0, 1], data['popular_tracks'], 'Top 10 Most Popular Tracks', 'Purchase Count', 'lightgreen')
+    _bar(axes[1, 0], data['popular_albums'], 'Top 10 Most Popular Albums', 'Purchase Count', 'lightcoral')
+
+    # Pre-binned: the histogram is drawn from its counts, not the raw rows
+    histogram = data['histogram']
+    edges = histogram['edges']
+    axes[1, 1].hist(edges[:-1], bins=edges, weights=histogram['counts'], alpha=0.7,
+                    color='purple', edgecolor='black')
+    axes[1, 1].set_title('Distribution of Tracks per Customer')
+    axes[1, 1].set_xlabel('Number of Tracks')
+    axes[1, 1].set_ylabel('Number of Customers')
+
+    fig.tight_layout()
+    return fig
+
+
+def render_figure(data, path, dpi=DEFAULT_DPI, fmt=DEFAULT_FORMAT):
+    """Render to a file with the Agg backend; runs in the worker process"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig = draw_figure(plt, data)
+    try:
+        fig.savefig(path, dpi=dpi, format=fmt, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    return path
+
+
+def figure_cache_dir():
+    return os.path.join(config.OUTPUT_DIR, 'figures')
+
+
+def render_headless(data, output_path, dpi=DEFAULT_DPI, fmt=DEFAULT_FORMAT, use_cache=True, worker=True):
+    """
+    Write the figure to output_path without a display
+    A figure rendered earlier from the same plot inputs and settings is copied
+    from OUTPUT_DIR/figures instead of being drawn again. New figures are drawn
+    in a worker process so the caller's process never imports pyplot.
+    Returns (output_path, True if served from the cache).
+    """
+    cache_dir = figure_cache_dir()
+    cached = os.path.join(cache_dir, f'{plot_data_hash(data, dpi, fmt)}.{fmt}')
+    if use_cache and os.path.exists(cached):
+        shutil.copyfile(cached, output_path)
+        return output_path, True
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f'{cached}.{os.getpid()}.tmp'
+    try:
+        if worker:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                pool.submit(render_figure, data, temp_path, dpi, fmt).result()
+        else:
+            render_figure(data, temp_path, dpi, fmt)
+        os.replace(temp_path, cached)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    shutil.copyfile(cached, output_path)
+    return output_path, False
+
+
+def display_available():
+    """True when an interactive window can be opened"""
+    if os.name == 'nt' or sys.platform == 'darwin':
+        return True
+    return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
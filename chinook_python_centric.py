@@ -1,256 +1,802 @@
 # chinook_python_centric.py
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
 import os
+import re
+from contextlib import contextmanager
+from sqlalchemy import text
+from config import DatabaseConfig
+from chinook_aggregates import CustomerAggregates
+from chinook_cache import TableCache
+from chinook_export import iter_frame_batches, write_batches
+from chinook_indexes import KeyIndex, get_dimension_indexes, indexed_join, stable_int_argsort
+from chinook_parallel import load_tables_parallel
+from chinook_plots import DEFAULT_DPI, DEFAULT_FORMAT, display_available, draw_figure, plot_data, render_headless
+from pipeline_runner import PipelineRunner
+from chinook_topk import DEFAULT_EPSILON, approximate_top_items
+
+
+# Columns each table contributes to the merge and analysis steps.
+# Keys are the analyzer's table names, values are (SQL table, columns).
+TABLE_PLAN = {
+    'customers': ('Customer', ['CustomerId', 'FirstName', 'LastName']),
+    'invoices': ('Invoice', ['InvoiceId', 'CustomerId']),
+    'invoice_items': ('InvoiceLine', ['InvoiceLineId', 'InvoiceId', 'TrackId']),
+    'tracks': ('Track', ['TrackId', 'Name', 'AlbumId']),
+    'albums': ('Album', ['AlbumId', 'Title']),
+}
+
+# Integer key columns that are safe to downcast
+KEY_COLUMNS = {'CustomerId', 'InvoiceId', 'InvoiceLineId', 'TrackId', 'AlbumId'}
+
+# Rows sampled from each table to estimate the size of a full SELECT *
+SIZE_SAMPLE_ROWS = 1000
+
+# InvoiceLine rows read per chunk in streaming mode
+STREAM_CHUNKSIZE = 50000
+
+# Column order produced by merge_data_python
+MERGED_COLUMNS = ['CustomerId', 'FirstName', 'LastName', 'InvoiceId',
+                  'InvoiceLineId', 'TrackId', 'Name', 'AlbumId', 'Title']
+OUTPUT_COLUMNS = ['LastName', 'FirstName', 'Name', 'Title']
+
+
+def compact_dtypes(df, string_dtype='category'):
+    """
+    Downcast integer key columns and convert text columns to a compact dtype.
+    string_dtype may be 'category' or an Arrow-backed dtype such as 'string[pyarrow]'.
+    """
+    for column in df.columns:
+        if column in KEY_COLUMNS:
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        elif not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].astype(string_dtype)
+    return df
+
+
+class StreamingBehaviorStats:
+    """
+    Incremental version of the analyze_customer_behavior aggregations
+    Memory grows with distinct customers, tracks and albums, not with invoice lines.
+    Customers, tracks and albums are counted by CustomerId, TrackId and AlbumId
+    like CustomerAggregates, or by name when the chunks have no key columns.
+    by_name=True forces names, e.g. to combine databases whose ids don't match.
+    Ties in the top-N reports go to the lower id (or name).
+    """
+
+    LABELS = {'CustomerId': ['LastName', 'FirstName'], 'TrackId': ['Name'], 'AlbumId': ['Title']}
+
+    def __init__(self, by_name=False):
+        self.by_name = by_name
+        self.track_counts = None
+        self.album_counts = None
+        self.customer_tracks = None
+        self.customer_albums = None
+        # Key -> label columns, kept when counting by id
+        self.labels = {}
+        self.rows_seen = 0
+
+    @staticmethod
+    def _accumulate(total, counts):
+        if total is None:
+            return counts
+        return total.add(counts, fill_value=0).astype('int64')
+
+    def _keys(self):
+        """Customer key columns, track key and album key"""
+        if self.by_name:
+            return ['LastName', 'FirstName'], 'Name', 'Title'
+        return ['CustomerId'], 'TrackId', 'AlbumId'
+
+    def _add_labels(self, labels):
+        for key, new in labels.items():
+            old = self.labels.get(key)
+            self.labels[key] = new if old is None else pd.concat([old, new[~new.index.isin(old.index)]])
+
+    def update(self, df):
+        """Fold one chunk of merged rows into the running totals"""
+        if self.rows_seen == 0 and not self.by_name:
+            self.by_name = not set(self.LABELS).issubset(df.columns)
+        self.rows_seen += len(df)
+        customer, track, album = self._keys()
+        if self.by_name:
+            df = df[['LastName', 'FirstName', 'Name', 'Title']].astype(object)
+        else:
+            self._add_labels({key: df[[key] + columns].drop_duplicates(key).set_index(key).astype(object)
+                              for key, columns in self.LABELS.items()})
+
+        self.track_counts = self._accumulate(self.track_counts, df[track].value_counts())
+        self.album_counts = self._accumulate(self.album_counts, df[album].value_counts())
+        self.customer_tracks = self._accumulate(self.customer_tracks, df.groupby(customer).size())
+
+        pairs = df[customer + [album]].drop_duplicates()
+        if self.customer_albums is not None:
+            pairs = pd.concat([self.customer_albums, pairs]).drop_duplicates()
+        self.customer_albums = pairs
+
+    def merge(self, other):
+        """Fold in the totals of another instance, e.g. one built from a different shard"""
+        if other.rows_seen == 0:
+            return self
+        if self.rows_seen and self.by_name != other.by_name:
+            raise ValueError("Cannot merge statistics counted by id with statistics counted by name")
+        self.by_name = other.by_name
+        self.rows_seen += other.rows_seen
+        self.track_counts = self._accumulate(self.track_counts, other.track_counts)
+        self.album_counts = self._accumulate(self.album_counts, other.album_counts)
+        self.customer_tracks = self._accumulate(self.customer_tracks, other.customer_tracks)
+        self._add_labels(other.labels)
+        pairs = other.customer_albums
+        if self.customer_albums is not None:
+            pairs = pd.concat([self.customer_albums, pairs]).drop_duplicates()
+        self.customer_albums = pairs
+        return self
+
+    def _top(self, counts, key, name, top_n):
+        counts = counts.sort_index().sort_values(ascending=False, kind='stable').head(top_n)
+        if not self.by_name:
+            counts.index = self.labels[key].loc[counts.index, name].to_numpy()
+        counts.index.name = name
+        counts.name = 'count'
+        return counts
+
+    def result(self, top_n=10):
+        """Return (customer_stats, popular_tracks, popular_albums) like analyze_customer_behavior"""
+        if self.rows_seen == 0:
+            empty = pd.Series(dtype='int64')
+            stats = pd.DataFrame(columns=['TotalTracks', 'UniqueAlbums'], dtype='int64')
+            return stats, empty, empty
+
+        customer, _, _ = self._keys()
+        unique_albums = self.customer_albums.groupby(customer).size()
+        customer_stats = pd.DataFrame({
+            'TotalTracks': self.customer_tracks,
+            'UniqueAlbums': unique_albums,
+        }).fillna(0).astype('int64')
+        if not self.by_name:
+            labels = self.labels['CustomerId'].loc[customer_stats.index]
+            customer_stats.index = pd.MultiIndex.from_frame(labels)
+        customer_stats.index.names = ['LastName', 'FirstName']
+
+        popular_tracks = self._top(self.track_counts, 'TrackId', 'Name', top_n)
+        popular_albums = self._top(self.album_counts, 'AlbumId', 'Title', top_n)
+        return customer_stats, popular_tracks, popular_albums
 
 
 class ChinookAnalyzer:
-    def __init__(self, database_path='Chinook_Sqlite.sqlite'):
+    def __init__(self, database_path='Chinook_Sqlite.sqlite', cache_dir=None):
         """Initialize with database connection"""
         self.database_path = database_path
+        self.cache_dir = cache_dir
+        self.db_config = DatabaseConfig(database_path)
         self.engine = None
         self.connection = None
         self.tables = {}
+        self.memory_report = {}
+        self.load_latencies = {}
+        self.indexes = None
+        # Optional instrumentation.Instrumentation; None keeps stages unmeasured
+        self.instrumentation = None
 
     def connect_to_database(self):
         """Establish database connection"""
         try:
             if not os.path.exists(self.database_path):
-                print(f"Database file not found: {self.database_path}")
-                print("Please run setup_database.py first")
+                self.log(f"Database file not found: {self.database_path}")
+                self.log("Please run setup_database.py first")
                 return False
 
-            self.engine = create_engine(f'sqlite:///{self.database_path}')
-            self.connection = self.engine.connect()
-            print("Database connection established successfully!")
+            # Pooled read-only connection from the shared engine registry
+            self.connection = self.db_config.get_connection()
+            self.engine = self.db_config.engine
+            self.log("Database connection established successfully!")
             return True
 
         except Exception as e:
-            print(f"Error connecting to database: {e}")
+            self.log(f"Error connecting to database: {e}")
             return False
 
-    def load_all_tables(self):
-        """Load all relevant tables into pandas DataFrames"""
+    def load_all_tables(self, optimized=False, string_dtype='category', use_cache=False,
+                        workers=1, executor='thread'):
+        """
+        Load all relevant tables into pandas DataFrames
+        With optimized=True only the columns in TABLE_PLAN are read and compact dtypes are used
+        With use_cache=True tables are read from the on-disk Feather cache when it is current
+        With workers > 1 tables are read concurrently on separate connections
+        """
         if not self.connection:
-            print("No database connection available")
+            self.log("No database connection available")
             return False
 
         try:
-            print("Loading database tables...")
-
-            # Load each table with connection (not engine)
-            self.tables['customers'] = pd.read_sql('SELECT * FROM Customer', self.connection)
-            self.tables['invoices'] = pd.read_sql('SELECT * FROM Invoice', self.connection)
-            self.tables['invoice_items'] = pd.read_sql('SELECT * FROM InvoiceLine', self.connection)
-            self.tables['tracks'] = pd.read_sql('SELECT * FROM Track', self.connection)
-            self.tables['albums'] = pd.read_sql('SELECT * FROM Album', self.connection)
-
-            print("All tables loaded successfully!")
+            self.log("Loading database tables...")
+
+            cache = TableCache(self.database_path, self.cache_dir) if use_cache else None
+            variant = f"projected-{re.sub(r'[^0-9A-Za-z]+', '_', string_dtype)}" if optimized else 'full'
+            cached = {}
+            if cache:
+                cached = {name: cache.load(f'{name}.{variant}') for name in TABLE_PLAN}
+            cache_hit = bool(cached) and all(df is not None for df in cached.values())
+
+            if cache_hit:
+                self.log("Using cached tables")
+                self.tables.update(cached)
+                self.memory_report = {}
+            elif workers > 1:
+                self.load_tables_concurrently(optimized, string_dtype, workers, executor)
+            elif optimized:
+                self.load_projected_tables(string_dtype)
+            else:
+                # Load each table with connection (not engine)
+                self.tables['customers'] = pd.read_sql('SELECT * FROM Customer ORDER BY rowid', self.connection)
+                self.tables['invoices'] = pd.read_sql('SELECT * FROM Invoice ORDER BY rowid', self.connection)
+                self.tables['invoice_items'] = pd.read_sql('SELECT * FROM InvoiceLine ORDER BY rowid',
+                                                           self.connection)
+                self.tables['tracks'] = pd.read_sql('SELECT * FROM Track ORDER BY rowid', self.connection)
+                self.tables['albums'] = pd.read_sql('SELECT * FROM Album ORDER BY rowid', self.connection)
+                self.memory_report = {}
+
+            if cache and not cache_hit:
+                for name in TABLE_PLAN:
+                    cache.store(f'{name}.{variant}', self.tables[name])
+
+            self.log("All tables loaded successfully!")
             self.display_table_info()
+
+            # Key indexes for the dimension lookups, reused by every join on these tables
+            self.indexes = get_dimension_indexes(self.tables)
             return True
 
         except Exception as e:
-            print(f"Error loading tables: {e}")
+            self.log(f"Error loading tables: {e}")
             return False
 
+    def load_projected_tables(self, string_dtype='category'):
+        """
+        Load only the planned columns of each table using compact dtypes
+        ORDER BY rowid keeps table order: without it SQLite may answer from a
+        covering index (Invoice via IFK_InvoiceCustomerId) in that index's order.
+        """
+        self.memory_report = {}
+        for table_name, (sql_table, columns) in TABLE_PLAN.items():
+            column_list = ', '.join(columns)
+            df = pd.read_sql(f'SELECT {column_list} FROM {sql_table} ORDER BY rowid', self.connection)
+            self.tables[table_name] = compact_dtypes(df, string_dtype)
+            self.record_memory_savings(table_name, sql_table)
+
+    def load_tables_concurrently(self, optimized=False, string_dtype='category', workers=4, executor='thread'):
+        """
+        Load the tables in a thread or process pool, splitting InvoiceLine into rowid ranges
+        Per-table latencies are kept in self.load_latencies
+        """
+        queries = {}
+        for table_name, (sql_table, columns) in TABLE_PLAN.items():
+            column_list = ', '.join(columns) if optimized else '*'
+            queries[table_name] = (sql_table, f'SELECT {column_list} FROM {sql_table}')
+
+        tables, self.load_latencies = load_tables_parallel(
+            self.database_path, queries, workers=workers, executor=executor
+        )
+
+        self.memory_report = {}
+        for table_name, df in tables.items():
+            if optimized:
+                df = compact_dtypes(df, string_dtype)
+            self.tables[table_name] = df
+            if optimized:
+                self.record_memory_savings(table_name, TABLE_PLAN[table_name][0])
+
+        self.log(f"Parallel load with {workers} {executor} workers:")
+        for table_name, seconds in self.load_latencies.items():
+            self.log(f"  {table_name}: {seconds * 1000:.1f} ms")
+
+    def record_memory_savings(self, table_name, sql_table):
+        """Compare a loaded table's footprint with an estimate for SELECT *"""
+        df = self.tables[table_name]
+        loaded_bytes = int(df.memory_usage(deep=True).sum())
+        full_bytes = self.estimate_full_table_bytes(sql_table, len(df))
+        self.memory_report[table_name] = {
+            'full_bytes': full_bytes,
+            'loaded_bytes': loaded_bytes,
+            'saved_bytes': max(full_bytes - loaded_bytes, 0),
+        }
+
+    def estimate_full_table_bytes(self, sql_table, row_count):
+        """Estimate the in-memory size of SELECT * from a sample of rows"""
+        if row_count == 0:
+            return 0
+        sample = pd.read_sql(f'SELECT * FROM {sql_table} LIMIT {SIZE_SAMPLE_ROWS}', self.connection)
+        if len(sample) == 0:
+            return 0
+        bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+        return int(bytes_per_row * row_count)
+
     def display_table_info(self):
         """Display information about loaded tables"""
-        print("\nTable Information:")
+        self.log("\nTable Information:")
         for table_name, df in self.tables.items():
-            print(f"  {table_name}: {len(df)} rows, {len(df.columns)} columns")
-
-    def merge_data_python(self):
+            line = f"  {table_name}: {len(df)} rows, {len(df.columns)} columns"
+            report = self.memory_report.get(table_name)
+            if report:
+                line += (f", {report['loaded_bytes']:,} bytes loaded"
+                         f" (~{report['saved_bytes']:,} bytes saved vs SELECT *)")
+            self.log(line)
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Run a pipeline stage under the optional instrumentation
+        Yields a record dict; callers set record['rows_out'] when they know it
+        """
+        if self.instrumentation is None:
+            yield {}
+        else:
+            with self.instrumentation.stage(name, rows_in=rows_in) as record:
+                yield record
+
+    def log(self, message):
+        """Progress message: printed, or emitted as a structured event when instrumented"""
+        if self.instrumentation is None:
+            print(message)
+        else:
+            self.instrumentation.log(message)
+
+    def merge_data_python(self, use_indexes=False):
         """
         Perform complex data merging using Python/pandas operations
         This replaces the complex SQL join with Python logic
+        With use_indexes=True the joins are done as gathers through the prebuilt key indexes
         """
-        print("\nPerforming data merging with Python...")
+        if use_indexes and self.indexes is not None:
+            self.log("\nPerforming data merging with key indexes...")
+            with self.stage('indexed_join', rows_in=len(self.tables['invoice_items'])) as record:
+                final_data = indexed_join(self.tables, self.indexes)
+                record['rows_out'] = len(final_data)
+            self.log(f"  Final dataset size: {len(final_data)} rows")
+            return final_data
+
+        self.log("\nPerforming data merging with Python...")
 
         # Start with customers and invoices
-        print("Step 1: Merging customers with invoices...")
-        customer_invoices = pd.merge(
-            self.tables['customers'][['CustomerId', 'FirstName', 'LastName']],
-            self.tables['invoices'][['InvoiceId', 'CustomerId']],
-            on='CustomerId',
-            how='inner'
-        )
-        print(f"  Customer-Invoice relationships: {len(customer_invoices)}")
+        self.log("Step 1: Merging customers with invoices...")
+        rows_in = len(self.tables['customers']) + len(self.tables['invoices'])
+        with self.stage('merge_customers_invoices', rows_in=rows_in) as record:
+            customer_invoices = pd.merge(
+                self.tables['customers'][['CustomerId', 'FirstName', 'LastName']],
+                self.tables['invoices'][['InvoiceId', 'CustomerId']],
+                on='CustomerId',
+                how='inner'
+            )
+            record['rows_out'] = len(customer_invoices)
+        self.log(f"  Customer-Invoice relationships: {len(customer_invoices)}")
 
         # Add invoice items
-        print("Step 2: Adding invoice items...")
-        customer_invoice_items = pd.merge(
-            customer_invoices,
-            self.tables['invoice_items'][['InvoiceLineId', 'InvoiceId', 'TrackId']],
-            on='InvoiceId',
-            how='inner'
-        )
-        print(f"  Customer-Invoice-Track relationships: {len(customer_invoice_items)}")
+        self.log("Step 2: Adding invoice items...")
+        rows_in = len(customer_invoices) + len(self.tables['invoice_items'])
+        with self.stage('merge_invoice_items', rows_in=rows_in) as record:
+            customer_invoice_items = pd.merge(
+                customer_invoices,
+                self.tables['invoice_items'][['InvoiceLineId', 'InvoiceId', 'TrackId']],
+                on='InvoiceId',
+                how='inner'
+            )
+            record['rows_out'] = len(customer_invoice_items)
+        self.log(f"  Customer-Invoice-Track relationships: {len(customer_invoice_items)}")
 
         # Add track information
-        print("Step 3: Adding track information...")
-        tracks_info = self.tables['tracks'][['TrackId', 'Name', 'AlbumId']]
-        customer_tracks = pd.merge(
-            customer_invoice_items,
-            tracks_info,
-            on='TrackId',
-            how='inner'
-        )
-        print(f"  Customer-Track relationships: {len(customer_tracks)}")
+        self.log("Step 3: Adding track information...")
+        rows_in = len(customer_invoice_items) + len(self.tables['tracks'])
+        with self.stage('merge_tracks', rows_in=rows_in) as record:
+            tracks_info = self.tables['tracks'][['TrackId', 'Name', 'AlbumId']]
+            customer_tracks = pd.merge(
+                customer_invoice_items,
+                tracks_info,
+                on='TrackId',
+                how='inner'
+            )
+            record['rows_out'] = len(customer_tracks)
+        self.log(f"  Customer-Track relationships: {len(customer_tracks)}")
 
         # Add album information
-        print("Step 4: Adding album information...")
-        albums_info = self.tables['albums'][['AlbumId', 'Title']]
-        final_data = pd.merge(
-            customer_tracks,
-            albums_info,
-            on='AlbumId',
-            how='inner'
-        )
-        print(f"  Final dataset size: {len(final_data)} rows")
+        self.log("Step 4: Adding album information...")
+        rows_in = len(customer_tracks) + len(self.tables['albums'])
+        with self.stage('merge_albums', rows_in=rows_in) as record:
+            albums_info = self.tables['albums'][['AlbumId', 'Title']]
+            final_data = pd.merge(
+                customer_tracks,
+                albums_info,
+                on='AlbumId',
+                how='inner'
+            )
+            record['rows_out'] = len(final_data)
+        self.log(f"  Final dataset size: {len(final_data)} rows")
 
         return final_data
 
+    def load_dimension_tables(self, string_dtype='category'):
+        """
+        Load the small tables used by the streaming join and index them by join key
+        Returns (customer_invoices indexed by InvoiceId, track_albums indexed by TrackId)
+        """
+        for table_name in ('customers', 'invoices', 'tracks', 'albums'):
+            sql_table, columns = TABLE_PLAN[table_name]
+            column_list = ', '.join(columns)
+            df = pd.read_sql(f'SELECT {column_list} FROM {sql_table} ORDER BY rowid', self.connection)
+            self.tables[table_name] = compact_dtypes(df, string_dtype)
+
+        customer_invoices = pd.merge(
+            self.tables['customers'], self.tables['invoices'], on='CustomerId', how='inner'
+        ).set_index('InvoiceId')
+        track_albums = pd.merge(
+            self.tables['tracks'], self.tables['albums'], on='AlbumId', how='inner'
+        ).set_index('TrackId')
+        return customer_invoices, track_albums
+
+    def iter_invoice_lines(self, chunksize=STREAM_CHUNKSIZE, after_line_id=None):
+        """Yield InvoiceLine in bounded chunks, optionally only rows after a given InvoiceLineId"""
+        sql_table, columns = TABLE_PLAN['invoice_items']
+        column_list = ', '.join(columns)
+        query = f'SELECT {column_list} FROM {sql_table}'
+        params = None
+        if after_line_id is not None:
+            query += ' WHERE InvoiceLineId > :after ORDER BY InvoiceLineId'
+            params = {'after': int(after_line_id)}
+        for chunk in pd.read_sql(text(query), self.connection, params=params, chunksize=chunksize):
+            yield compact_dtypes(chunk)
+
+    def iter_merged_chunks(self, chunksize=STREAM_CHUNKSIZE, after_line_id=None):
+        """
+        Streaming version of merge_data_python
+        Each InvoiceLine chunk is joined against the resident dimension tables
+        and yielded as a partial result with the same columns as merge_data_python
+        """
+        customer_invoices, track_albums = self.load_dimension_tables()
+
+        for chunk in self.iter_invoice_lines(chunksize, after_line_id):
+            merged = chunk.join(customer_invoices, on='InvoiceId', how='inner')
+            merged = merged.join(track_albums, on='TrackId', how='inner')
+            yield merged[MERGED_COLUMNS].reset_index(drop=True)
+
+    def run_streaming_analysis(self, filename='customer_tracks_python.csv', chunksize=STREAM_CHUNKSIZE,
+                               export_format='csv', compression=None):
+        """
+        Run the analysis with bounded memory
+        Rows are exported to OUTPUT_DIR and aggregated chunk by chunk. The
+        export keeps InvoiceLine order because a global sort would need the
+        full result.
+        """
+        self.log("Starting streaming Chinook Database Analysis...")
+
+        if not self.connect_to_database():
+            return None
+
+        try:
+            stats = StreamingBehaviorStats()
+
+            def observe(chunks):
+                for chunk in chunks:
+                    stats.update(chunk)
+                    self.log(f"  Processed {stats.rows_seen} rows...")
+                    yield chunk[OUTPUT_COLUMNS]
+
+            path, _ = write_batches(observe(self.iter_merged_chunks(chunksize)), filename,
+                                    export_format, compression, columns=OUTPUT_COLUMNS)
+            self.log(f"Streaming results saved to '{path}'")
+            results = stats.result()
+            self.print_behavior_results(*results)
+            return results
+
+        except Exception as e:
+            self.log(f"Error during streaming analysis: {e}")
+            return None
+
+        finally:
+            self.close_connection()
+
+    def customer_name_order(self, df):
+        """
+        Row order of df by (LastName, FirstName), ties kept in row order
+        Only the Customer table is sorted: each name pair gets a dense rank and
+        the rows are ordered by a stable integer sort on the rank of their
+        CustomerId, which matches a stable sort of the name columns. Returns
+        None when df has no CustomerId or the loaded Customer table can't
+        rank every row.
+        """
+        customers = self.tables.get('customers')
+        if customers is None or 'CustomerId' not in df.columns or len(df) == 0:
+            return None
+
+        # Same ordering as sort_values: by category order for categoricals, missing names last
+        ranks = customers.groupby(['LastName', 'FirstName'], sort=True, dropna=False,
+                                  observed=True).ngroup().to_numpy()
+        # Narrow ranks keep the per-row gather and the radix sort small; len(ranks) marks unknown ids
+        ranks = ranks.astype(np.min_scalar_type(len(ranks)))
+        row_ranks = KeyIndex(customers['CustomerId'].to_numpy()).map_values(
+            df['CustomerId'].to_numpy(), ranks, missing=len(ranks))
+        if (row_ranks == len(ranks)).any():
+            return None
+        return stable_int_argsort(row_ranks)
+
     def clean_and_format_data(self, df):
         """
         Clean and format the final DataFrame according to requirements
+        Rows are sorted by LastName then FirstName through customer_name_order
+        when possible, so no string sort or intermediate copy is needed.
         """
-        print("\nFormatting final output...")
+        self.log("\nFormatting final output...")
 
-        # Select and rename columns to match required output
-        formatted_df = df[[
-            'LastName', 'FirstName', 'Name', 'Title'
-        ]].copy()
+        order = self.customer_name_order(df)
+        if order is None:
+            # Select the output columns, sort by LastName then FirstName and reset the index
+            formatted_df = df[OUTPUT_COLUMNS].sort_values(['LastName', 'FirstName'])
+            return formatted_df.reset_index(drop=True)
 
-        # Sort by LastName then FirstName
-        formatted_df = formatted_df.sort_values(['LastName', 'FirstName'])
+        # One gather of the output columns; dropping the taken index doesn't copy the data
+        return df[OUTPUT_COLUMNS].take(order).reset_index(drop=True)
 
-        # Reset index
-        formatted_df = formatted_df.reset_index(drop=True)
-
-        return formatted_df
+    def approximate_popularity(self, top_n=10, method='misra_gries', epsilon=DEFAULT_EPSILON):
+        """
+        Most purchased tracks and albums from one bounded-memory pass over InvoiceLine
+        The heavy-hitter summary only picks candidates; their counts are exact.
+        """
+        with self.stage('topk') as record:
+            popular = approximate_top_items(self.database_path, top_n, method, epsilon)
+            record['rows_out'] = sum(len(series) for series in popular)
+        return popular
 
-    def analyze_customer_behavior(self, df):
+    def analyze_customer_behavior(self, df, aggregates=None, use_summaries=False, popular=None):
         """
         Additional Python analysis on the data
+        With use_summaries=True the statistics come from the materialized summary
+        tables (see summary_tables.py) when they exist. Otherwise the single-pass
+        integer-key aggregates are used when df has its key columns (or aggregates
+        are passed in), and the name columns are grouped as a last resort.
+        popular=(tracks, albums), e.g. from approximate_popularity, replaces the
+        track and album reports.
         """
-        print("\n" + "=" * 50)
-        print("PYTHON DATA ANALYSIS RESULTS")
-        print("=" * 50)
+        if use_summaries:
+            results = self.load_summary_reports()
+            if results is not None:
+                self.print_behavior_results(*results)
+                return results
+            self.log("Summary tables not found, aggregating the joined data instead")
+
+        if aggregates is None:
+            aggregates = CustomerAggregates.from_frame(df)
+
+        if aggregates is not None:
+            customer_stats = aggregates.customer_stats()
+            popular_tracks, popular_albums = popular or (aggregates.top_tracks(10), aggregates.top_albums(10))
+            self.print_behavior_results(customer_stats, popular_tracks, popular_albums)
+            return customer_stats, popular_tracks, popular_albums
 
         # Customer purchase statistics
-        customer_stats = df.groupby(['LastName', 'FirstName']).agg({
+        customer_stats = df.groupby(['LastName', 'FirstName'], observed=True).agg({
             'Name': 'count',  # Number of tracks purchased
             'Title': 'nunique'  # Number of unique albums
         }).rename(columns={'Name': 'TotalTracks', 'Title': 'UniqueAlbums'})
 
-        print("\nTop 10 customers by tracks purchased:")
-        print(customer_stats.nlargest(10, 'TotalTracks'))
-
-        # Most popular tracks
-        popular_tracks = df['Name'].value_counts().head(10)
-        print("\nTop 10 most purchased tracks:")
-        print(popular_tracks)
+        if popular is not None:
+            popular_tracks, popular_albums = popular
+        else:
+            # Most popular tracks
+            popular_tracks = df['Name'].value_counts().head(10)
 
-        # Most popular albums
-        popular_albums = df['Title'].value_counts().head(10)
-        print("\nTop 10 most purchased albums:")
-        print(popular_albums)
+            # Most popular albums
+            popular_albums = df['Title'].value_counts().head(10)
 
+        self.print_behavior_results(customer_stats, popular_tracks, popular_albums)
         return customer_stats, popular_tracks, popular_albums
 
-    def create_visualizations(self, df):
+    def load_summary_reports(self, top_n=10):
         """
-        Create visualizations using Python with robust style handling
+        Read customer stats and top tracks/albums from the summary tables
+        Returns None if the tables have not been built in this database
         """
-        try:
-            import matplotlib.pyplot as plt
+        if not self.connection:
+            return None
+        exists = pd.read_sql(
+            "SELECT COUNT(*) AS n FROM sqlite_master WHERE type='table' AND name='SummaryMeta'",
+            self.connection
+        )['n'].iloc[0]
+        if not exists:
+            return None
 
-            print("\nCreating visualizations...")
+        customer_stats = pd.read_sql(
+            'SELECT c.LastName, c.FirstName, s.TotalTracks, s.UniqueAlbums '
+            'FROM CustomerTrackStats s JOIN Customer c ON c.CustomerId = s.CustomerId ORDER BY s.CustomerId',
+            self.connection
+        ).set_index(['LastName', 'FirstName'])
 
-            # Get available styles and use a safe option
-            available_styles = plt.style.available
-            if 'seaborn' in available_styles:
-                plt.style.use('seaborn')
-            elif 'seaborn-v0_8' in available_styles:
-                plt.style.use('seaborn-v0_8')
-            else:
-                plt.style.use('default')  # Fallback to default style
+        popular_tracks = pd.read_sql(
+            text('SELECT t.Name, p.Purchases AS count FROM TrackPurchaseCounts p '
+                 'JOIN Track t ON t.TrackId = p.TrackId ORDER BY p.Purchases DESC, p.TrackId LIMIT :n'),
+            self.connection, params={'n': top_n}
+        ).set_index('Name')['count']
 
-            fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+        popular_albums = pd.read_sql(
+            text('SELECT a.Title, p.Purchases AS count FROM AlbumPurchaseCounts p '
+                 'JOIN Album a ON a.AlbumId = p.AlbumId ORDER BY p.Purchases DESC, p.AlbumId LIMIT :n'),
+            self.connection, params={'n': top_n}
+        ).set_index('Title')['count']
 
-            # Plot 1: Top 10 customers by tracks purchased
-            top_customers = df.groupby(['LastName', 'FirstName']).size().nlargest(10)
-            top_customers.plot(kind='bar', ax=axes[0, 0], title='Top 10 Customers by Tracks Purchased',
-                               color='skyblue', edgecolor='black')
-            axes[0, 0].tick_params(axis='x', rotation=45)
-            axes[0, 0].set_ylabel('Number of Tracks')
+        return customer_stats, popular_tracks, popular_albums
 
-            # Plot 2: Top 10 most popular tracks
-            popular_tracks = df['Name'].value_counts().head(10)
-            axes[0, 1].bar(range(len(popular_tracks)), popular_tracks.values, color='lightgreen', edgecolor='black')
-            axes[0, 1].set_title('Top 10 Most Popular Tracks')
-            axes[0, 1].set_xticks(range(len(popular_tracks)))
-            axes[0, 1].set_xticklabels(popular_tracks.index, rotation=45, ha='right')
-            axes[0, 1].set_ylabel('Purchase Count')
+    def print_behavior_results(self, customer_stats, popular_tracks, popular_albums):
+        """Print the customer behavior report"""
+        self.log("\n" + "=" * 50)
+        self.log("PYTHON DATA ANALYSIS RESULTS")
+        self.log("=" * 50)
 
-            # Plot 3: Top 10 most popular albums
-            popular_albums = df['Title'].value_counts().head(10)
-            axes[1, 0].bar(range(len(popular_albums)), popular_albums.values, color='lightcoral', edgecolor='black')
-            axes[1, 0].set_title('Top 10 Most Popular Albums')
-            axes[1, 0].set_xticks(range(len(popular_albums)))
-            axes[1, 0].set_xticklabels(popular_albums.index, rotation=45, ha='right')
-            axes[1, 0].set_ylabel('Purchase Count')
-
-            # Plot 4: Distribution of tracks per customer
-            tracks_per_customer = df.groupby(['LastName', 'FirstName']).size()
-            axes[1, 1].hist(tracks_per_customer, bins=20, alpha=0.7, color='purple', edgecolor='black')
-            axes[1, 1].set_title('Distribution of Tracks per Customer')
-            axes[1, 1].set_xlabel('Number of Tracks')
-            axes[1, 1].set_ylabel('Number of Customers')
-
-            plt.tight_layout()
-            plt.savefig('customer_tracks_analysis.png', dpi=300, bbox_inches='tight')
-            plt.show()
-            print("Visualizations saved as 'customer_tracks_analysis.png'")
+        self.log("\nTop 10 customers by tracks purchased:")
+        self.log(str(customer_stats.nlargest(10, 'TotalTracks')))
+
+        self.log("\nTop 10 most purchased tracks:")
+        self.log(str(popular_tracks))
+
+        self.log("\nTop 10 most purchased albums:")
+        self.log(str(popular_albums))
+
+    def create_visualizations(self, df, aggregates=None, headless=None, dpi=DEFAULT_DPI, fmt=DEFAULT_FORMAT,
+                              use_cache=True, popular=None):
+        """
+        Create visualizations from the precomputed top-N aggregates
+        headless=True renders with Agg in a worker process, never calls show() and
+        reuses a cached figure when the plotted aggregates are unchanged.
+        headless=None picks headless mode when no display is available.
+        popular=(tracks, albums) replaces the track and album plots' data.
+        """
+        path = f'customer_tracks_analysis.{fmt}'
+        try:
+            self.log("\nCreating visualizations...")
+            data = plot_data(df, aggregates=aggregates if aggregates is not None
+                             else CustomerAggregates.from_frame(df), popular=popular)
+
+            if headless is None:
+                headless = not display_available()
+            if headless:
+                _, cached = render_headless(data, path, dpi=dpi, fmt=fmt, use_cache=use_cache)
+                if cached:
+                    self.log("Aggregates unchanged, reused the cached figure")
+            else:
+                import matplotlib.pyplot as plt
+                fig = draw_figure(plt, data)
+                fig.savefig(path, dpi=dpi, format=fmt, bbox_inches='tight')
+                plt.show()
+            self.log(f"Visualizations saved as '{path}'")
 
         except ImportError:
-            print("Matplotlib not available for visualizations")
+            self.log("Matplotlib not available for visualizations")
         except Exception as e:
-            print(f"Error creating visualizations: {e}")
-            print("Continuing without visualizations...")
+            self.log(f"Error creating visualizations: {e}")
+            self.log("Continuing without visualizations...")
+
+    def export_results(self, final_df, filename):
+        """Write the formatted result to OUTPUT_DIR in batches"""
+        path, rows = write_batches(iter_frame_batches(final_df), filename)
+        self.log(f"\nResults saved to '{path}'")
+        return path
 
-    def run_complete_analysis(self):
+    def build_analysis_pipeline(self, merged_data, use_summaries=False, export_filename=None,
+                                stage_timeout=None, headless=None, approximate_top=False):
+        """
+        DAG of the stages that follow the merge, for PipelineRunner
+        format and aggregate both only need the merged data, and analyze,
+        visualize and export only need their outputs, so those run concurrently.
+        visualize runs inline on the calling thread: pyplot, and plt.show() in
+        particular, must stay on the main thread.
+        """
+        runner = PipelineRunner(max_workers=4, default_timeout=stage_timeout)
+        if self.instrumentation is not None and self.instrumentation.profile:
+            # One profiler at a time
+            runner.max_workers = 1
+
+        def format_stage():
+            with self.stage('format', rows_in=len(merged_data)) as record:
+                final_df = self.clean_and_format_data(merged_data)
+                record['rows_out'] = len(final_df)
+            self.log("\n" + "=" * 50)
+            self.log("REQUIRED OUTPUT - First 5 Rows")
+            self.log("=" * 50)
+            self.log(str(final_df.head()))
+            return final_df
+
+        def aggregate_stage():
+            with self.stage('aggregate', rows_in=len(merged_data)):
+                return CustomerAggregates.from_frame(merged_data)
+
+        def analyze_stage(final_df, aggregates, popular=None):
+            with self.stage('analyze', rows_in=len(final_df)):
+                return self.analyze_customer_behavior(final_df, aggregates=aggregates,
+                                                      use_summaries=use_summaries, popular=popular)
+
+        def visualize_stage(final_df, aggregates, popular=None):
+            with self.stage('visualize', rows_in=len(final_df)):
+                self.create_visualizations(final_df, aggregates=aggregates, headless=headless, popular=popular)
+
+        report_inputs = ['format', 'aggregate']
+        runner.add_stage('format', format_stage)
+        runner.add_stage('aggregate', aggregate_stage)
+        if approximate_top:
+            runner.add_stage('topk', self.approximate_popularity)
+            report_inputs.append('topk')
+        runner.add_stage('analyze', analyze_stage, inputs=report_inputs)
+        runner.add_stage('visualize', visualize_stage, inputs=report_inputs, executor='inline')
+        if export_filename:
+            runner.add_stage('export', lambda final_df: self.export_results(final_df, export_filename),
+                             inputs=['format'])
+        return runner
+
+    def run_complete_analysis(self, optimized=False, use_indexes=False, use_cache=False, instrumentation=None,
+                              use_summaries=False, concurrent=False, stage_timeout=None, export_filename=None,
+                              headless=None, approximate_top=False):
         """
         Run the complete analysis pipeline
+        Pass optimized=True to load only the planned columns with compact dtypes,
+        use_indexes=True to join through the prebuilt key indexes,
+        use_cache=True to read tables from the on-disk columnar cache,
+        an instrumentation.Instrumentation to measure each stage,
+        use_summaries=True to report from the materialized summary tables,
+        concurrent=True to run the independent post-merge stages in parallel
+        (each limited to stage_timeout seconds), export_filename to also
+        write the result to OUTPUT_DIR, headless=True to render the plots
+        without a display (the default when none is available) and
+        approximate_top=True to take the track/album reports from a streaming
+        heavy-hitter pass instead of counting the joined rows
         """
-        print("Starting Chinook Database Analysis...")
+        if instrumentation is not None:
+            self.instrumentation = instrumentation
+        self.log("Starting Chinook Database Analysis...")
 
         # Step 0: Connect to database
         if not self.connect_to_database():
             return None
 
         # Step 1: Load all tables
-        if not self.load_all_tables():
+        with self.stage('load') as record:
+            loaded = self.load_all_tables(optimized=optimized, use_cache=use_cache)
+            record['rows_out'] = sum(len(df) for df in self.tables.values())
+        if not loaded:
             self.close_connection()
             return None
 
         # Step 2: Merge data using Python
-        merged_data = self.merge_data_python()
+        merged_data = self.merge_data_python(use_indexes=use_indexes)
+
+        if concurrent:
+            runner = self.build_analysis_pipeline(merged_data, use_summaries, export_filename, stage_timeout,
+                                                  headless, approximate_top)
+            results = runner.run()
+            runner.print_report(log=self.log)
+            self.close_connection()
+            return results.get('format')
 
         # Step 3: Clean and format data
-        final_df = self.clean_and_format_data(merged_data)
+        with self.stage('format', rows_in=len(merged_data)) as record:
+            final_df = self.clean_and_format_data(merged_data)
+            record['rows_out'] = len(final_df)
 
         # Step 4: Display required output
-        print("\n" + "=" * 50)
-        print("REQUIRED OUTPUT - First 5 Rows")
-        print("=" * 50)
-        print(final_df.head())
-
-        # Step 5: Additional Python analysis
-        self.analyze_customer_behavior(final_df)
+        self.log("\n" + "=" * 50)
+        self.log("REQUIRED OUTPUT - First 5 Rows")
+        self.log("=" * 50)
+        self.log(str(final_df.head()))
+
+        # Step 5: Additional Python analysis, one aggregation pass shared with the plots
+        with self.stage('aggregate', rows_in=len(merged_data)):
+            aggregates = CustomerAggregates.from_frame(merged_data)
+        popular = self.approximate_popularity() if approximate_top else None
+        with self.stage('analyze', rows_in=len(final_df)):
+            self.analyze_customer_behavior(final_df, aggregates=aggregates, use_summaries=use_summaries,
+                                           popular=popular)
 
         # Step 6: Create visualizations
-        self.create_visualizations(final_df)
+        with self.stage('visualize', rows_in=len(final_df)):
+            self.create_visualizations(final_df, aggregates=aggregates, headless=headless, popular=popular)
+
+        if export_filename:
+            with self.stage('export', rows_in=len(final_df)):
+                self.export_results(final_df, export_filename)
 
         # Step 7: Close connection
         self.close_connection()
@@ -260,10 +806,11 @@ class ChinookAnalyzer:
     def close_connection(self):
         """Close database connection"""
         if self.connection:
-            self.connection.close()
-            print("Database connection closed.")
-        if self.engine:
-            self.engine.dispose()
+            # Returns the connection to the shared pool; the engine stays open for reuse
+            self.db_config.close_connection()
+            self.log("Database connection closed.")
+        self.connection = None
+        self.engine = None
 
 
 def main():
@@ -274,12 +821,9 @@ def main():
         analyzer = ChinookAnalyzer('Chinook_Sqlite.sqlite')
 
         # Run complete analysis
-        result_df = analyzer.run_complete_analysis()
+        result_df = analyzer.run_complete_analysis(export_filename='customer_tracks_python.csv')
 
-        # Save results
         if result_df is not None:
-            result_df.to_csv('customer_tracks_python.csv', index=False)
-            print(f"\nResults saved to 'customer_tracks_python.csv'")
             print(f"Final DataFrame shape: {result_df.shape}")
 
     except Exception as e:
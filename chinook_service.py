@@ -0,0 +1,370 @@
+# chinook_service.py
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from chinook_aggregates import CustomerAggregates
+from chinook_indexes import stable_int_argsort
+from chinook_python_centric import ChinookAnalyzer
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 1000
+# Latency samples kept per endpoint for the percentiles
+LATENCY_WINDOW = 10000
+
+ROUTES = [
+    ('top_customers', re.compile(r'^/customers/top$')),
+    ('customer_tracks', re.compile(r'^/customers/(\d+)/tracks$')),
+    ('popular_albums', re.compile(r'^/albums/popular$')),
+    ('popular_tracks', re.compile(r'^/tracks/popular$')),
+    ('metrics', re.compile(r'^/metrics$')),
+    ('health', re.compile(r'^/health$')),
+]
+
+
+def file_fingerprint(database_path):
+    """Size and mtime of the database file and its WAL; changes whenever the data can have"""
+    fingerprint = []
+    for path in (database_path, database_path + '-wal'):
+        try:
+            stat = os.stat(path)
+            fingerprint.append((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+class ResultCache:
+    """
+    LRU cache of encoded responses, bounded by their total size in bytes
+    The least recently used entries are evicted once max_bytes is exceeded.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= len(previous)
+            self.entries[key] = body
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+            }
+
+
+class LatencyRecorder:
+    """Per-endpoint request latencies over a sliding window of recent requests"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            if endpoint not in self.samples:
+                self.samples[endpoint] = deque(maxlen=self.window)
+                self.counts[endpoint] = 0
+            self.samples[endpoint].append(seconds)
+            self.counts[endpoint] += 1
+
+    def summary(self):
+        """{endpoint: {requests, p50_ms, p99_ms, max_ms}}"""
+        with self._lock:
+            samples = {endpoint: np.array(values) for endpoint, values in self.samples.items()}
+            counts = dict(self.counts)
+        summary = {}
+        for endpoint, values in sorted(samples.items()):
+            p50, p99 = np.percentile(values, [50, 99]) * 1000
+            summary[endpoint] = {
+                'requests': counts[endpoint],
+                'p50_ms': round(float(p50), 3),
+                'p99_ms': round(float(p99), 3),
+                'max_ms': round(float(values.max()) * 1000, 3),
+            }
+        return summary
+
+
+class ResidentDataset:
+    """
+    The joined purchase rows, their aggregates and a per-customer row index,
+    loaded once through ChinookAnalyzer and then only read
+    """
+
+    def __init__(self, database_path):
+        start = time.perf_counter()
+        self.database_path = database_path
+        self.fingerprint = file_fingerprint(database_path)
+
+        analyzer = ChinookAnalyzer(database_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            if not analyzer.connect_to_database():
+                raise FileNotFoundError(f"Database file not found: {database_path}")
+            try:
+                if not analyzer.load_all_tables(optimized=True):
+                    raise RuntimeError(f"Could not load tables from {database_path}")
+                self.merged = analyzer.merge_data_python(use_indexes=True)
+            finally:
+                analyzer.close_connection()
+        self.customers = analyzer.tables['customers']
+        self.customer_index = analyzer.indexes['CustomerId']
+        self.aggregates = CustomerAggregates(self.merged)
+
+        # Merged rows grouped by customer: rows of customer position p are
+        # customer_rows[customer_offsets[p]:customer_offsets[p + 1]]
+        positions, _ = self.customer_index.lookup(self.merged['CustomerId'].to_numpy())
+        self.customer_rows = stable_int_argsort(positions)
+        self.customer_offsets = np.r_[0, np.cumsum(np.bincount(positions, minlength=len(self.customers)))]
+        self.track_ids = self.merged['TrackId'].to_numpy()
+
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - start
+
+    def top_customers(self, n):
+        codes = self.aggregates.top_customer_codes(n)
+        stats = self.aggregates.customer_stats(codes).reset_index()
+        return [{
+            'CustomerId': int(customer_id),
+            'LastName': str(row.LastName),
+            'FirstName': str(row.FirstName),
+            'TotalTracks': int(row.TotalTracks),
+            'UniqueAlbums': int(row.UniqueAlbums),
+        } for customer_id, row in zip(self.aggregates.customer_ids[codes], stats.itertuples(index=False))]
+
+    def customer_tracks(self, customer_id):
+        """Tracks a customer bought, most purchased first; None for an unknown customer"""
+        if not np.iinfo(np.int64).min <= customer_id <= np.iinfo(np.int64).max:
+            # No such key, and np.array would raise OverflowError
+            return None
+        position, found = self.customer_index.lookup(np.array([customer_id], dtype='int64'))
+        if not found[0]:
+            return None
+        position = int(position[0])
+        rows = self.customer_rows[self.customer_offsets[position]:self.customer_offsets[position + 1]]
+        track_ids, first, purchases = np.unique(self.track_ids[rows], return_index=True, return_counts=True)
+        order = np.argsort(-purchases, kind='stable')
+        labels = self.merged[['Name', 'Title']].take(rows[first[order]])
+        customer = self.customers.iloc[position]
+        return {
+            'CustomerId': int(customer_id),
+            'LastName': str(customer['LastName']),
+            'FirstName': str(customer['FirstName']),
+            'tracks': [{'TrackId': track_id, 'Name': str(name), 'Title': str(title), 'Purchases': count}
+                       for track_id, name, title, count in zip(track_ids[order].tolist(), labels['Name'].tolist(),
+                                                               labels['Title'].tolist(), purchases[order].tolist())],
+        }
+
+    def popular_albums(self, n):
+        return [{'Title': str(k), 'count': int(v)} for k, v in self.aggregates.top_albums(n).items()]
+
+    def popular_tracks(self, n):
+        return [{'Name': str(k), 'count': int(v)} for k, v in self.aggregates.top_tracks(n).items()]
+
+    def info(self):
+        return {
+            'database': self.database_path,
+            'rows': len(self.merged),
+            'customers': len(self.customers),
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.loaded_at)),
+            'load_seconds': round(self.load_seconds, 3),
+        }
+
+
+class AnalysisService:
+    """
+    Answers report queries from a resident dataset through a result cache
+    Before each request the database file is checked (one stat call); if it
+    has changed the dataset is reloaded and the cache cleared. A failed reload
+    keeps serving the previous data and is retried on the next request.
+    """
+
+    def __init__(self, database_path, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.database_path = database_path
+        self.cache = ResultCache(cache_bytes)
+        self.latency = LatencyRecorder()
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+        self.dataset = ResidentDataset(database_path)
+
+    def current_dataset(self):
+        dataset = self.dataset
+        if file_fingerprint(self.database_path) == dataset.fingerprint:
+            return dataset
+        with self._reload_lock:
+            # Another request may have reloaded while this one waited
+            if file_fingerprint(self.database_path) != self.dataset.fingerprint:
+                print(f"Database changed, reloading {self.database_path}...")
+                try:
+                    self.dataset = ResidentDataset(self.database_path)
+                    self.cache.clear()
+                    self.reloads += 1
+                    print(f"Reloaded {len(self.dataset.merged)} rows in {self.dataset.load_seconds:.2f} s")
+                except Exception as e:
+                    print(f"Reload failed, still serving the previous data: {e}")
+            return self.dataset
+
+    def metrics(self):
+        return {
+            'dataset': self.dataset.info(),
+            'reloads': self.reloads,
+            'cache': self.cache.stats(),
+            'latency': self.latency.summary(),
+        }
+
+    def handle(self, path, query):
+        """Return (status, JSON body bytes, endpoint name, served from cache)"""
+        for endpoint, pattern in ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return 404, _encode({'error': f'unknown path {path}'}), 'not_found', False
+
+        try:
+            n = int(query.get('n', [DEFAULT_TOP_N])[0])
+        except ValueError:
+            return 400, _encode({'error': 'n must be an integer'}), endpoint, False
+        n = max(1, min(n, MAX_TOP_N))
+
+        if endpoint == 'health':
+            return 200, _encode({'status': 'ok'}), endpoint, False
+        if endpoint == 'metrics':
+            return 200, _encode(self.metrics()), endpoint, False
+
+        dataset = self.current_dataset()
+        key = (endpoint, match.groups(), n if endpoint != 'customer_tracks' else None)
+        body = self.cache.get(key)
+        if body is not None:
+            return 200, body, endpoint, True
+
+        if endpoint == 'top_customers':
+            result = dataset.top_customers(n)
+        elif endpoint == 'customer_tracks':
+            result = dataset.customer_tracks(int(match.group(1)))
+            if result is None:
+                return 404, _encode({'error': f'unknown customer {match.group(1)}'}), endpoint, False
+        elif endpoint == 'popular_albums':
+            result = dataset.popular_albums(n)
+        else:
+            result = dataset.popular_tracks(n)
+
+        body = _encode(result)
+        # Only cache answers computed from the dataset that is still current
+        if dataset is self.dataset:
+            self.cache.put(key, body)
+        return 200, body, endpoint, False
+
+
+def _encode(result):
+    return json.dumps(result).encode('utf-8')
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """GET-only JSON endpoints; the AnalysisService is attached to the server"""
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        try:
+            status, body, endpoint, cached = self.server.service.handle(url.path, parse_qs(url.query))
+        except Exception as e:
+            status, body, endpoint, cached = 500, _encode({'error': str(e)}), 'error', False
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Cache', 'hit' if cached else 'miss')
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.service.latency.record(endpoint, time.perf_counter() - start)
+
+    def log_message(self, format, *args):
+        # One line per request would dominate the output; /metrics has the numbers
+        pass
+
+
+def serve(database_path, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_bytes=DEFAULT_CACHE_BYTES):
+    """Load the dataset once and answer requests until interrupted; returns the final metrics"""
+    print(f"Loading {database_path}...")
+    service = AnalysisService(database_path, cache_bytes)
+    info = service.dataset.info()
+    print(f"Resident dataset: {info['rows']} rows, loaded in {info['load_seconds']:.2f} s")
+
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"Serving on http://{host}:{server.server_port}")
+    for _, pattern in ROUTES:
+        route = pattern.pattern.strip('^$').replace(r'(\d+)', '<id>')
+        print(f"  GET {route}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        server.server_close()
+    return service.metrics()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Resident Chinook analysis service over local HTTP')
+    parser.add_argument('database', nargs='?', default='Chinook_Sqlite.sqlite')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_CACHE_BYTES / 2 ** 20,
+                        help='result cache size limit')
+    args = parser.parse_args()
+    serve(args.database, args.host, args.port, int(args.cache_mb * 2 ** 20))
@@ -0,0 +1,193 @@
+# chinook_shards.py
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from chinook_python_centric import ChinookAnalyzer, STREAM_CHUNKSIZE, StreamingBehaviorStats
+
+
+SHARD_DIR = os.path.join('benchmark_data', 'shards')
+
+
+def resolve_shards(shards):
+    """
+    Database files from a list of paths and/or glob patterns
+    Missing files and duplicates are dropped; the order is sorted so runs are repeatable.
+    """
+    if isinstance(shards, str):
+        shards = [shards]
+    paths = set()
+    for pattern in shards:
+        paths.update(os.path.abspath(path) for path in glob.glob(pattern) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def analyze_shard(database_path, chunksize=STREAM_CHUNKSIZE):
+    """
+    Process-pool worker: load, join and aggregate one shard
+    The join is streamed in chunks, so a worker holds one chunk plus the
+    dimension tables, never the whole merged result.
+    Returns (StreamingBehaviorStats, seconds).
+    """
+    start = time.perf_counter()
+    analyzer = ChinookAnalyzer(database_path)
+    if not analyzer.connect_to_database():
+        raise RuntimeError(f"Cannot open shard {database_path}")
+    try:
+        stats = StreamingBehaviorStats(by_name=True)
+        for chunk in analyzer.iter_merged_chunks(chunksize):
+            stats.update(chunk)
+    finally:
+        analyzer.close_connection()
+    return stats, time.perf_counter() - start
+
+
+def run_sharded_analysis(shards, workers=None, top_n=10, chunksize=STREAM_CHUNKSIZE):
+    """
+    Customer, track and album statistics over several Chinook-schema databases
+    Each shard is aggregated in its own worker process. The partial results
+    (tracks per customer, distinct (customer, album) pairs, track and album
+    counts) are merged in the parent. Ids are local to a shard, so customers,
+    tracks and albums are matched across shards by name, as in the SQL report.
+    workers=1 runs the shards one after another in this process.
+    Returns a dict with the merged results and per-shard timings, or None.
+    """
+    paths = resolve_shards(shards)
+    if not paths:
+        print("No shard databases found")
+        return None
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths)))
+
+    start = time.perf_counter()
+    try:
+        if workers == 1:
+            partials = [analyze_shard(path, chunksize) for path in paths]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                partials = list(pool.map(analyze_shard, paths, repeat(chunksize)))
+    except Exception as e:
+        print(f"Error analyzing shards: {e}")
+        return None
+
+    merge_start = time.perf_counter()
+    total = StreamingBehaviorStats(by_name=True)
+    for stats, _ in partials:
+        total.merge(stats)
+    customer_stats, popular_tracks, popular_albums = total.result(top_n)
+    end = time.perf_counter()
+
+    return {
+        'workers': workers,
+        'shards': [{'path': path, 'rows': stats.rows_seen, 'seconds': seconds}
+                   for path, (stats, seconds) in zip(paths, partials)],
+        'rows': total.rows_seen,
+        'elapsed_seconds': end - start,
+        'merge_seconds': end - merge_start,
+        'customer_stats': customer_stats,
+        'popular_tracks': popular_tracks,
+        'popular_albums': popular_albums,
+    }
+
+
+def print_sharded_results(result, top_n=10):
+    print(f"\n{len(result['shards'])} shard(s), {result['rows']} rows, {result['workers']} worker(s): "
+          f"{result['elapsed_seconds']:.3f} s (merge {result['merge_seconds']:.3f} s)")
+    for shard in result['shards']:
+        print(f"  {os.path.basename(shard['path']):<28} {shard['rows']:>10} rows {shard['seconds']:>8.3f} s")
+
+    print(f"\nTop {top_n} customers by tracks purchased:")
+    print(result['customer_stats'].nlargest(top_n, 'TotalTracks'))
+    print(f"\nTop {top_n} most purchased tracks:")
+    print(result['popular_tracks'])
+    print(f"\nTop {top_n} most purchased albums:")
+    print(result['popular_albums'])
+
+
+def scaling_report(shards, worker_counts=None, top_n=10, chunksize=STREAM_CHUNKSIZE):
+    """
+    Run the sharded analysis with 1..N workers
+    Speedup and efficiency are relative to the single-worker run; every run
+    must produce the same merged results.
+    """
+    paths = resolve_shards(shards)
+    if not paths:
+        print("No shard databases found")
+        return None
+    if not worker_counts:
+        worker_counts = range(1, min(os.cpu_count() or 1, len(paths)) + 1)
+
+    rows = []
+    baseline = None
+    for workers in worker_counts:
+        result = run_sharded_analysis(paths, workers, top_n, chunksize)
+        if result is None:
+            return None
+        if baseline is None:
+            baseline = result
+        same = (result['customer_stats'].sort_index().equals(baseline['customer_stats'].sort_index())
+                and result['popular_tracks'].equals(baseline['popular_tracks'])
+                and result['popular_albums'].equals(baseline['popular_albums']))
+        speedup = baseline['elapsed_seconds'] / result['elapsed_seconds']
+        rows.append({
+            'workers': result['workers'],
+            'seconds': result['elapsed_seconds'],
+            'merge_seconds': result['merge_seconds'],
+            'speedup': speedup,
+            'efficiency': speedup / result['workers'],
+            'same_results': same,
+        })
+    return {'shards': len(paths), 'rows': baseline['rows'], 'cpus': os.cpu_count(), 'runs': rows}
+
+
+def print_scaling_report(report):
+    print(f"\nScaling over {report['shards']} shard(s), {report['rows']} rows, {report['cpus']} CPU(s)")
+    print(f"{'workers':>8} {'seconds':>9} {'merge s':>8} {'speedup':>8} {'efficiency':>11} {'same':>5}")
+    for run in report['runs']:
+        print(f"{run['workers']:>8} {run['seconds']:>9.3f} {run['merge_seconds']:>8.3f} "
+              f"{run['speedup']:>7.2f}x {run['efficiency']:>10.0%} {'yes' if run['same_results'] else 'no':>5}")
+
+
+def generate_shards(count, scale=10, data_dir=SHARD_DIR):
+    """Write `count` synthetic Chinook databases (one seed each) for scaling runs"""
+    from benchmark import generate_chinook_database
+    os.makedirs(data_dir, exist_ok=True)
+    paths = []
+    for shard in range(count):
+        path = os.path.join(data_dir, f'chinook_shard{shard:02d}_x{scale}.sqlite')
+        if not os.path.exists(path):
+            print(f"Generating {path}...")
+            generate_chinook_database(path, scale, seed=shard)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Analyze several Chinook-schema databases as one')
+    parser.add_argument('shards', nargs='*', help='database files or quoted glob patterns')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--chunksize', type=int, default=STREAM_CHUNKSIZE)
+    parser.add_argument('--scaling', type=int, nargs='*',
+                        help='worker counts to compare (no values: 1..number of CPUs)')
+    parser.add_argument('--generate', type=int, metavar='N', help=f'generate N synthetic shards in {SHARD_DIR}')
+    parser.add_argument('--scale', type=int, default=10, help='with --generate, scale of each shard')
+    args = parser.parse_args()
+
+    shards = args.shards
+    if args.generate:
+        shards = shards + generate_shards(args.generate, args.scale)
+    if not shards:
+        parser.error('no shards given')
+
+    if args.scaling is not None:
+        report = scaling_report(shards, args.scaling, args.top, args.chunksize)
+        if report:
+            print_scaling_report(report)
+    else:
+        result = run_sharded_analysis(shards, args.workers, args.top, args.chunksize)
+        if result:
+            print_sharded_results(result, args.top)
@@ -1,42 +1,79 @@
 # chinook_simple_sql.py
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import os
+import time
+from chinook_cache import TableCache
+from chinook_export import EXPORT_BATCH_SIZE, iter_frame_batches, iter_query_batches, write_batches
+from chinook_python_centric import OUTPUT_COLUMNS, StreamingBehaviorStats
+from config import DatabaseConfig
 
 
-def simple_sql_solution():
-    """Simple solution using SQL query (for comparison)"""
+# SQL query that does the complex joining
+SIMPLE_SQL_QUERY = """
+SELECT 
+    c.LastName,
+    c.FirstName,
+    t.Name AS Name,
+    a.Title AS Title
+FROM Customer c
+JOIN Invoice i ON c.CustomerId = i.CustomerId
+JOIN InvoiceLine il ON i.InvoiceId = il.InvoiceId
+JOIN Track t ON il.TrackId = t.TrackId
+JOIN Album a ON t.AlbumId = a.AlbumId
+ORDER BY c.LastName, c.FirstName
+"""
+
+# The same join with its key columns, so statistics can count by id like the
+# Python approach; the exported columns stay those of SIMPLE_SQL_QUERY
+SIMPLE_SQL_KEYED_QUERY = SIMPLE_SQL_QUERY.replace(
+    'a.Title AS Title', 'a.Title AS Title,\n    c.CustomerId,\n    t.TrackId,\n    a.AlbumId'
+)
+
+
+SIMPLE_SQL_FILENAME = 'customer_tracks_simple.csv'
+
+
+def save_results(df, fmt='csv', compression=None):
+    """Export the SQL result to OUTPUT_DIR through the shared export layer"""
+    path, _ = write_batches(iter_frame_batches(df), SIMPLE_SQL_FILENAME, fmt, compression)
+    print(f"Results saved to '{path}'")
+    return path
 
-    # Database connection
-    database_path = 'Chinook_Sqlite.sqlite'
 
+def simple_sql_solution(use_cache=False, cache_dir=None, database_path='Chinook_Sqlite.sqlite',
+                        export_format='csv', compression=None):
+    """
+    Simple solution using SQL query (for comparison)
+    With use_cache=True the joined result is read from the on-disk columnar cache when current
+    """
+
+    # Database connection
     if not os.path.exists(database_path):
         print(f"Database file not found: {database_path}")
         print("Please run setup_database.py first")
         return None
 
-    engine = create_engine(f'sqlite:///{database_path}')
+    cache = TableCache(database_path, cache_dir) if use_cache else None
+    if cache:
+        df = cache.load('simple_sql_result')
+        if df is not None:
+            print("Simple SQL Solution Results (cached):")
+            print("First 10 rows:")
+            print(df.head(10))
+            print(f"\nTotal rows: {len(df)}")
+            save_results(df, export_format, compression)
+            return df
 
-    try:
-        # Use connection context manager
-        with engine.connect() as connection:
-            # SQL query that does the complex joining
-            sql_query = """
-            SELECT 
-                c.LastName,
-                c.FirstName,
-                t.Name AS Name,
-                a.Title AS Title
-            FROM Customer c
-            JOIN Invoice i ON c.CustomerId = i.CustomerId
-            JOIN InvoiceLine il ON i.InvoiceId = il.InvoiceId
-            JOIN Track t ON il.TrackId = t.TrackId
-            JOIN Album a ON t.AlbumId = a.AlbumId
-            ORDER BY c.LastName, c.FirstName
-            """
+    db_config = DatabaseConfig(database_path)
 
+    try:
+        # Pooled connection from the shared engine registry
+        with db_config.connect() as connection:
             # Execute query with connection
-            df = pd.read_sql(text(sql_query), connection)
+            df = pd.read_sql(text(SIMPLE_SQL_QUERY), connection)
+            if cache:
+                cache.store('simple_sql_result', df)
 
             print("Simple SQL Solution Results:")
             print("First 10 rows:")
@@ -44,8 +81,7 @@ def simple_sql_solution():
             print(f"\nTotal rows: {len(df)}")
 
             # Save results
-            df.to_csv('customer_tracks_simple.csv', index=False)
-            print("Results saved to 'customer_tracks_simple.csv'")
+            save_results(df, export_format, compression)
 
             return df
 
@@ -53,9 +89,77 @@ def simple_sql_solution():
         print(f"Error: {e}")
         return None
 
-    finally:
-        # Ensure engine is disposed
-        engine.dispose()
+
+def export_sql_solution(database_path='Chinook_Sqlite.sqlite', export_format='csv', compression=None,
+                        batch_size=EXPORT_BATCH_SIZE):
+    """
+    Stream the SQL join straight from a server-side cursor into an export file
+    Only one batch of rows is in memory at a time. Returns the output path.
+    """
+    if not os.path.exists(database_path):
+        print(f"Database file not found: {database_path}")
+        print("Please run setup_database.py first")
+        return None
+
+    try:
+        with DatabaseConfig(database_path).connect() as connection:
+            batches = iter_query_batches(connection, SIMPLE_SQL_QUERY, batch_size)
+            path, rows = write_batches(batches, SIMPLE_SQL_FILENAME, export_format, compression)
+        print(f"Exported {rows} rows to '{path}'")
+        return path
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return None
+
+
+def iter_sql_solution(database_path='Chinook_Sqlite.sqlite', chunksize=EXPORT_BATCH_SIZE, keys=False):
+    """
+    Generator version of simple_sql_solution
+    Yields DataFrame chunks from a server-side cursor as SQLite produces them,
+    so callers can show or process the first rows before the query finishes.
+    keys=True adds the CustomerId, TrackId and AlbumId columns.
+    """
+    query = SIMPLE_SQL_KEYED_QUERY if keys else SIMPLE_SQL_QUERY
+    with DatabaseConfig(database_path).connect() as connection:
+        yield from iter_query_batches(connection, query, chunksize)
+
+
+def simple_sql_solution_streaming(database_path='Chinook_Sqlite.sqlite', chunksize=EXPORT_BATCH_SIZE,
+                                  export_format='csv', compression=None):
+    """
+    Streaming variant of simple_sql_solution
+    The first 10 rows are printed as soon as the first chunk arrives, and every
+    chunk is exported and aggregated while the rest of the query is still running.
+    Returns (total rows, (customer_stats, popular_tracks, popular_albums)).
+    """
+    if not os.path.exists(database_path):
+        print(f"Database file not found: {database_path}")
+        print("Please run setup_database.py first")
+        return None
+
+    stats = StreamingBehaviorStats()
+    start = time.perf_counter()
+
+    def observe(chunks):
+        for chunk in chunks:
+            if stats.rows_seen == 0:
+                print(f"Simple SQL Solution Results (first chunk after {time.perf_counter() - start:.3f} s):")
+                print("First 10 rows:")
+                print(chunk.head(10))
+            stats.update(chunk)
+            yield chunk[OUTPUT_COLUMNS]
+
+    try:
+        path, rows = write_batches(observe(iter_sql_solution(database_path, chunksize, keys=True)),
+                                   SIMPLE_SQL_FILENAME, export_format, compression, columns=OUTPUT_COLUMNS)
+        print(f"\nTotal rows: {rows} in {time.perf_counter() - start:.3f} s")
+        print(f"Results saved to '{path}'")
+        return rows, stats.result()
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return None
 
 
 if __name__ == "__main__":
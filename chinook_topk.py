@@ -0,0 +1,324 @@
+# chinook_topk.py
+import argparse
+import math
+import time
+import numpy as np
+import pandas as pd
+from chinook_indexes import KeyIndex
+from config import DatabaseConfig
+from summary_tables import PURCHASES
+
+
+DEFAULT_EPSILON = 0.001
+DEFAULT_DELTA = 0.01
+TOPK_CHUNKSIZE = 50000
+# Count-Min keeps this many candidates per requested item
+CANDIDATE_FACTOR = 4
+_PRIME = 2147483647
+
+
+class MisraGries:
+    """
+    Heavy-hitter summary holding at most capacity counters
+    This is the deterministic form of the space-saving algorithm: counts are
+    underestimated by at most (N - sum of counters) / (capacity + 1) <= epsilon * N,
+    and every item with a true count above that bound stays in the summary.
+    Batches are merged whole: the batch's exact counts are added to the
+    counters and the (capacity + 1)-th largest count is subtracted from all,
+    which keeps the bound while staying vectorized.
+    """
+
+    def __init__(self, epsilon=DEFAULT_EPSILON):
+        self.capacity = max(1, math.ceil(1 / epsilon))
+        self.ids = np.empty(0, dtype='int64')
+        self.counts = np.empty(0, dtype='int64')
+        self.total = 0
+
+    def update(self, items):
+        items = np.asarray(items, dtype='int64')
+        if len(items) == 0:
+            return
+        batch_ids, batch_counts = np.unique(items, return_counts=True)
+        ids, inverse = np.unique(np.concatenate([self.ids, batch_ids]), return_inverse=True)
+        counts = np.zeros(len(ids), dtype='int64')
+        np.add.at(counts, inverse, np.concatenate([self.counts, batch_counts]))
+
+        if len(ids) > self.capacity:
+            cut = np.partition(counts, len(counts) - self.capacity - 1)[len(counts) - self.capacity - 1]
+            counts -= cut
+            keep = counts > 0
+            ids, counts = ids[keep], counts[keep]
+        self.ids, self.counts = ids, counts
+        self.total += len(items)
+
+    def error_bound(self):
+        """Largest possible undercount of any item"""
+        return (self.total - int(self.counts.sum())) / (self.capacity + 1)
+
+    def candidates(self, n=None):
+        """Tracked ids, largest estimates first, with their estimates"""
+        order = np.argsort(-self.counts, kind='stable')
+        if n is not None:
+            order = order[:n]
+        return self.ids[order], self.counts[order]
+
+    def refine_set(self, top_n):
+        """Ids whose true count could still reach the top_n: untracked ids can't exceed the bound"""
+        ids, counts = self.candidates()
+        if len(ids) <= top_n:
+            return ids
+        return ids[counts + self.error_bound() >= counts[top_n - 1]]
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.counts.nbytes
+
+
+class CountMinTopK:
+    """
+    Count-Min sketch plus a bounded candidate set
+    Estimates overcount by at most epsilon * N with probability 1 - delta.
+    After each batch the candidates are the top_n * CANDIDATE_FACTOR ids by
+    estimate among the previous candidates and the batch's ids.
+    """
+
+    def __init__(self, top_n, epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA, seed=0):
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.epsilon = epsilon
+        self.table = np.zeros((self.depth, self.width), dtype='int64')
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, self.depth)
+        self.b = rng.integers(0, _PRIME, self.depth)
+        self.keep = top_n * CANDIDATE_FACTOR
+        self.ids = np.empty(0, dtype='int64')
+        self.total = 0
+
+    def _buckets(self, row, ids):
+        return ((self.a[row] * (ids % _PRIME) + self.b[row]) % _PRIME) % self.width
+
+    def estimate(self, ids):
+        ids = np.asarray(ids, dtype='int64')
+        return np.min([self.table[row, self._buckets(row, ids)] for row in range(self.depth)], axis=0)
+
+    def update(self, items):
+        items = np.asarray(items, dtype='int64')
+        if len(items) == 0:
+            return
+        batch_ids, batch_counts = np.unique(items, return_counts=True)
+        for row in range(self.depth):
+            np.add.at(self.table[row], self._buckets(row, batch_ids), batch_counts)
+        self.total += len(items)
+
+        ids = np.union1d(self.ids, batch_ids)
+        estimates = self.estimate(ids)
+        if len(ids) > self.keep:
+            top = np.argpartition(-estimates, self.keep - 1)[:self.keep]
+            ids = ids[top]
+        self.ids = ids
+
+    def error_bound(self):
+        """Overcount bound that holds with probability 1 - delta"""
+        return self.epsilon * self.total
+
+    def candidates(self, n=None):
+        estimates = self.estimate(self.ids)
+        order = np.argsort(-estimates, kind='stable')
+        if n is not None:
+            order = order[:n]
+        return self.ids[order], estimates[order]
+
+    def refine_set(self, top_n):
+        """Candidates whose estimate is within the overcount bound of the top_n-th estimate"""
+        ids, estimates = self.candidates()
+        if len(ids) <= top_n:
+            return ids
+        return ids[estimates >= estimates[top_n - 1] - self.error_bound()]
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes + self.ids.nbytes
+
+
+SUMMARIES = {
+    'misra_gries': lambda top_n, epsilon, delta: MisraGries(epsilon),
+    'count_min': lambda top_n, epsilon, delta: CountMinTopK(top_n, epsilon, delta),
+}
+
+
+def iter_track_ids(conn, chunksize=TOPK_CHUNKSIZE):
+    """Yield InvoiceLine.TrackId in bounded numpy batches"""
+    cursor = conn.execute('SELECT TrackId FROM InvoiceLine')
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if not rows:
+            break
+        yield np.fromiter((row[0] for row in rows), dtype='int64', count=len(rows))
+
+
+def track_album_index(conn):
+    """KeyIndex over Track plus the AlbumId of each Track row, for mapping batches"""
+    rows = conn.execute('SELECT TrackId, AlbumId FROM Track WHERE AlbumId IS NOT NULL').fetchall()
+    tracks = np.array([row[0] for row in rows], dtype='int64')
+    albums = np.array([row[1] for row in rows], dtype='int64')
+    return KeyIndex(tracks), albums
+
+
+def exact_counts(conn, level, ids=None):
+    """
+    Purchase counts per track or album over the analysis join
+    With ids only those keys are counted, which the InvoiceLine/Track
+    indexes make cheap. Returns a DataFrame of key, label and count.
+    """
+    key, label = ('t.TrackId', 't.Name') if level == 'track' else ('a.AlbumId', 'a.Title')
+    where = ''
+    if ids is not None:
+        where = f"WHERE {key} IN ({', '.join(str(int(i)) for i in ids)})"
+    query = f'SELECT {key}, {label}, COUNT(*) {PURCHASES} {where} GROUP BY {key}'
+    return pd.DataFrame(conn.execute(query).fetchall(), columns=['id', 'label', 'count'])
+
+
+def labels(conn, level, ids):
+    """Track names or album titles for the given keys"""
+    table, key, label = ('Track', 'TrackId', 'Name') if level == 'track' else ('Album', 'AlbumId', 'Title')
+    query = f"SELECT {key}, {label} FROM {table} WHERE {key} IN ({', '.join(str(int(i)) for i in ids)})"
+    return dict(conn.execute(query).fetchall())
+
+
+def top_series(counts, top_n, name):
+    """
+    Largest counts first, ties by key, indexed by label like value_counts()
+    counts is a DataFrame of id, label and count.
+    """
+    counts = counts.sort_values(['count', 'id'], ascending=[False, True], kind='stable').head(top_n)
+    return pd.Series(counts['count'].to_numpy('int64'), index=pd.Index(counts['label'].astype(object), name=name),
+                     name='count')
+
+
+def stream_summaries(conn, top_n=10, method='misra_gries', epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA,
+                     chunksize=TOPK_CHUNKSIZE):
+    """One pass over InvoiceLine feeding a track and an album summary"""
+    make = SUMMARIES[method]
+    tracks = make(top_n, epsilon, delta)
+    albums = make(top_n, epsilon, delta)
+    index, track_albums = track_album_index(conn)
+    for track_ids in iter_track_ids(conn, chunksize):
+        tracks.update(track_ids)
+        rows, found = index.lookup(track_ids)
+        albums.update(track_albums[rows[found]])
+    return tracks, albums
+
+
+def approximate_top_items(database_path, top_n=10, method='misra_gries', epsilon=DEFAULT_EPSILON,
+                          delta=DEFAULT_DELTA, chunksize=TOPK_CHUNKSIZE, refine=True):
+    """
+    Most purchased tracks and albums in bounded memory
+    InvoiceLine is read once in batches of TrackIds; albums come from the
+    small Track table. With refine=True the summaries only pick candidates
+    and their counts are then taken exactly from the database.
+    Returns (popular_tracks, popular_albums) in the shape of value_counts().
+    """
+    with DatabaseConfig(database_path).raw_connection() as conn:
+        tracks, albums = stream_summaries(conn, top_n, method, epsilon, delta, chunksize)
+        results = []
+        for level, summary, name in (('track', tracks, 'Name'), ('album', albums, 'Title')):
+            if refine:
+                ids = summary.refine_set(top_n)
+                counts = exact_counts(conn, level, ids) if len(ids) else \
+                    pd.DataFrame(columns=['id', 'label', 'count'])
+            else:
+                ids, estimates = summary.candidates(top_n)
+                names = labels(conn, level, ids) if len(ids) else {}
+                counts = pd.DataFrame({'id': ids, 'label': [names.get(int(i)) for i in ids], 'count': estimates})
+            results.append(top_series(counts, top_n, name))
+        return tuple(results)
+
+
+def _recall(exact, estimated_ids, top_n):
+    """Share of the true top-n (ties at the cut included) found among the estimated top-n"""
+    if len(exact) == 0:
+        return 1.0
+    ranked = exact.sort_values('count', ascending=False)
+    threshold = ranked['count'].iloc[min(top_n, len(ranked)) - 1]
+    true_top = set(ranked.loc[ranked['count'] >= threshold, 'id'])
+    hits = len(true_top & set(int(i) for i in estimated_ids[:top_n]))
+    return hits / min(top_n, len(true_top))
+
+
+def accuracy_report(database_path, top_n=10, epsilons=(0.01, 0.001, 0.0001), delta=DEFAULT_DELTA,
+                    chunksize=TOPK_CHUNKSIZE):
+    """
+    Accuracy and memory of each summary against exact counts
+    For every method and epsilon: bytes held, pass time, recall of the
+    estimated top-n, worst error of its estimates, and whether the refined
+    top-n matches the exact one.
+    """
+    with DatabaseConfig(database_path).raw_connection() as conn:
+        exact = {level: exact_counts(conn, level) for level in ('track', 'album')}
+        exact_top = {level: top_series(exact[level], top_n, 'label') for level in exact}
+        # An exact in-memory count keeps one key and one count per distinct item
+        exact_bytes = sum(len(counts) * 16 for counts in exact.values())
+        report = {'top_n': top_n, 'exact_bytes': exact_bytes, 'rows': []}
+
+        for method in SUMMARIES:
+            for epsilon in epsilons:
+                start = time.perf_counter()
+                summaries = dict(zip(('track', 'album'),
+                                     stream_summaries(conn, top_n, method, epsilon, delta, chunksize)))
+                seconds = time.perf_counter() - start
+
+                entry = {'method': method, 'epsilon': epsilon, 'seconds': seconds,
+                         'bytes': sum(s.nbytes for s in summaries.values())}
+                for level, summary in summaries.items():
+                    top_ids, top_estimates = summary.candidates(top_n)
+                    truth = exact[level].set_index('id')['count']
+                    errors = np.abs(top_estimates - truth.reindex(top_ids).fillna(0).to_numpy())
+                    ids = summary.refine_set(top_n)
+                    refined = top_series(exact_counts(conn, level, ids), top_n, 'label') if len(ids) else None
+                    entry[level] = {
+                        'candidates': len(ids),
+                        'error_bound': summary.error_bound(),
+                        'recall': _recall(exact[level], top_ids, top_n),
+                        'max_error': int(errors.max()) if len(errors) else 0,
+                        'refined_exact': refined is not None and refined.to_numpy().tolist()
+                                         == exact_top[level].to_numpy().tolist(),
+                    }
+                report['rows'].append(entry)
+        return report
+
+
+def print_accuracy_report(report):
+    print(f"\nTop-{report['top_n']} accuracy vs exact counts "
+          f"(exact counting holds ~{report['exact_bytes']:,} bytes)")
+    print(f"{'method':<12} {'epsilon':>8} {'bytes':>10} {'seconds':>8}  "
+          f"{'track recall/err/bound':>24}  {'album recall/err/bound':>24}  refined exact")
+    for row in report['rows']:
+        cells = []
+        for level in ('track', 'album'):
+            info = row[level]
+            cells.append(f"{info['recall']:.2f}/{info['max_error']}/{info['error_bound']:.1f}")
+        refined = 'yes' if row['track']['refined_exact'] and row['album']['refined_exact'] else 'no'
+        print(f"{row['method']:<12} {row['epsilon']:>8} {row['bytes']:>10,} {row['seconds']:>8.3f}  "
+              f"{cells[0]:>24}  {cells[1]:>24}  {refined}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Approximate top-K tracks and albums in bounded memory')
+    parser.add_argument('database', nargs='?', default='Chinook_Sqlite.sqlite')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--method', choices=list(SUMMARIES), default='misra_gries')
+    parser.add_argument('--epsilon', type=float, default=DEFAULT_EPSILON)
+    parser.add_argument('--delta', type=float, default=DEFAULT_DELTA)
+    parser.add_argument('--chunksize', type=int, default=TOPK_CHUNKSIZE)
+    parser.add_argument('--report', action='store_true', help='compare accuracy and memory against exact counts')
+    args = parser.parse_args()
+
+    if args.report:
+        print_accuracy_report(accuracy_report(args.database, args.top, delta=args.delta, chunksize=args.chunksize))
+    else:
+        popular_tracks, popular_albums = approximate_top_items(
+            args.database, args.top, args.method, args.epsilon, args.delta, args.chunksize)
+        print("Top tracks:")
+        print(popular_tracks)
+        print("\nTop albums:")
+        print(popular_albums)
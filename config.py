@@ -1,32 +1,139 @@
 # config.py
 import os
-from sqlalchemy import create_engine
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL
+
+
+# Connection pool and SQLite tuning defaults
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 10
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # bytes
+SQLITE_CACHE_SIZE = -64 * 1024  # negative values are KiB, so 64 MB
 
 
 class DatabaseConfig:
-    """Database configuration and connection management"""
+    """
+    Database configuration and connection management
+    Engines are shared process-wide: every DatabaseConfig for the same file and
+    mode reuses one pooled engine, so repeated analyses do not reconnect.
+    """
 
-    def __init__(self, database_path='Chinook_Sqlite.sqlite'):
+    _engines = {}
+    _lock = threading.Lock()
+    _stats = {'engine_hits': 0, 'engine_misses': 0, 'checkouts': 0, 'connects': 0}
+
+    def __init__(self, database_path='Chinook_Sqlite.sqlite', read_only=True, wal=False,
+                 pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                 mmap_size=SQLITE_MMAP_SIZE, cache_size=SQLITE_CACHE_SIZE):
         self.database_path = database_path
+        self.read_only = read_only
+        self.wal = wal
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
         self.engine = None
         self.connection = None
 
+    def _registry_key(self):
+        # Keyed by process too: pooled SQLite connections must not cross a fork
+        return (os.getpid(), os.path.abspath(self.database_path), self.read_only, self.wal)
+
+    def _create_engine(self):
+        """Create a pooled engine with SQLite tuning applied to each new connection"""
+        path = os.path.abspath(self.database_path)
+        # URL.create keeps SQLAlchemy from unquoting the path again; SQLite
+        # itself decodes the file: URI, so '?', '#' and '%' in names stay literal
+        if self.read_only:
+            url = URL.create('sqlite', database=f'file:{quote(path)}', query={'mode': 'ro', 'uri': 'true'})
+        else:
+            url = URL.create('sqlite', database=path)
+
+        engine = create_engine(url, pool_size=self.pool_size, max_overflow=self.max_overflow)
+        stats = DatabaseConfig._stats
+
+        @event.listens_for(engine, 'connect')
+        def tune_connection(dbapi_connection, connection_record):
+            stats['connects'] += 1
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+            cursor.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+            if self.read_only:
+                cursor.execute('PRAGMA query_only = ON')
+            elif self.wal:
+                cursor.execute('PRAGMA journal_mode = WAL')
+            cursor.close()
+
+        @event.listens_for(engine, 'checkout')
+        def count_checkout(dbapi_connection, connection_record, connection_proxy):
+            stats['checkouts'] += 1
+
+        return engine
+
+    def get_engine(self):
+        """Return the shared engine for this database, creating it on first use"""
+        key = self._registry_key()
+        with DatabaseConfig._lock:
+            engine = DatabaseConfig._engines.get(key)
+            if engine is None:
+                DatabaseConfig._stats['engine_misses'] += 1
+                engine = self._create_engine()
+                DatabaseConfig._engines[key] = engine
+            else:
+                DatabaseConfig._stats['engine_hits'] += 1
+        self.engine = engine
+        return engine
+
+    @contextmanager
+    def connect(self):
+        """Context manager yielding a pooled connection that is returned on exit"""
+        connection = self.get_engine().connect()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    @contextmanager
+    def raw_connection(self):
+        """Context manager yielding a pooled sqlite3 connection, for code that uses plain cursors"""
+        connection = self.get_engine().raw_connection()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
     def get_connection(self):
         """Get database connection"""
         if not self.connection:
-            self.engine = create_engine(f'sqlite:///{self.database_path}')
-            self.connection = self.engine.connect()
+            self.connection = self.get_engine().connect()
         return self.connection
 
     def close_connection(self):
-        """Close database connection"""
+        """Return the connection to the pool (the shared engine stays open)"""
         if self.connection:
             self.connection.close()
-        if self.engine:
-            self.engine.dispose()
         self.connection = None
         self.engine = None
 
+    @classmethod
+    def pool_stats(cls):
+        """Engine registry and connection pool hit/miss counters"""
+        stats = dict(cls._stats)
+        stats['pool_misses'] = stats['connects']
+        stats['pool_hits'] = max(stats['checkouts'] - stats['connects'], 0)
+        return stats
+
+    @classmethod
+    def dispose_all(cls):
+        """Dispose every shared engine, e.g. before the database file is replaced"""
+        with cls._lock:
+            for engine in cls._engines.values():
+                engine.dispose()
+            cls._engines.clear()
+
 
 # Project settings
 OUTPUT_DIR = 'output'
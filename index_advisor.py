@@ -0,0 +1,162 @@
+# index_advisor.py
+import argparse
+import sqlite3
+import time
+from chinook_simple_sql import SIMPLE_SQL_QUERY
+
+
+# Queries the project runs against the join path
+PROJECT_QUERIES = {
+    'simple_sql_join': SIMPLE_SQL_QUERY,
+    'incremental_lines': 'SELECT InvoiceLineId, InvoiceId, TrackId FROM InvoiceLine '
+                         'WHERE InvoiceLineId > 0 ORDER BY InvoiceLineId',
+    'customer_invoices': 'SELECT c.CustomerId, c.FirstName, c.LastName, i.InvoiceId '
+                         'FROM Customer c JOIN Invoice i ON c.CustomerId = i.CustomerId',
+}
+
+# Covering indexes for the join keys and the LastName/FirstName ordering:
+# name -> (table, columns). Every index already carries the rowid, so the
+# stock Invoice (CustomerId) and Track (AlbumId) indexes cover their joins.
+RECOMMENDED_INDEXES = {
+    'IX_Customer_Name': ('Customer', ('LastName', 'FirstName')),
+    'IX_InvoiceLine_Invoice_Track': ('InvoiceLine', ('InvoiceId', 'TrackId')),
+}
+
+
+def explain(conn, query):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query"""
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {query}').fetchall()
+    return [row[-1] for row in rows]
+
+
+def find_issues(plan):
+    """Full table scans and temp B-tree sorts in a query plan"""
+    issues = []
+    for detail in plan:
+        if detail.startswith('SCAN') and 'INDEX' not in detail:
+            issues.append(f'full scan: {detail}')
+        if 'TEMP B-TREE' in detail:
+            issues.append(f'temp sort: {detail}')
+    return issues
+
+
+def measure(conn, query, repeat=3):
+    """Best-of-N latency in seconds for running a query to completion"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(query).fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def existing_indexes(conn, table):
+    """{index name: column tuple} for the indexes on a table"""
+    indexes = {}
+    for row in conn.execute(f"PRAGMA index_list('{table}')").fetchall():
+        name = row[1]
+        columns = conn.execute(f"PRAGMA index_info('{name}')").fetchall()
+        indexes[name] = tuple(column[2] for column in sorted(columns))
+    return indexes
+
+
+def covering_index(conn, table, columns):
+    """Name of an existing index whose leading columns are `columns`, or None"""
+    for name, indexed in existing_indexes(conn, table).items():
+        if indexed[:len(columns)] == tuple(columns):
+            return name
+    return None
+
+
+def missing_indexes(conn):
+    """Recommended indexes whose columns no existing index already covers"""
+    return [name for name, (table, columns) in RECOMMENDED_INDEXES.items()
+            if covering_index(conn, table, columns) is None]
+
+
+def index_sql(name):
+    table, columns = RECOMMENDED_INDEXES[name]
+    return f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"
+
+
+def inspect_queries(conn, repeat=3):
+    """Plan, issues and latency for each project query"""
+    report = {}
+    for name, query in PROJECT_QUERIES.items():
+        plan = explain(conn, query)
+        report[name] = {
+            'plan': plan,
+            'issues': find_issues(plan),
+            'seconds': measure(conn, query, repeat),
+        }
+    return report
+
+
+def print_report(report, title):
+    print(f"\n{title}")
+    for name, info in report.items():
+        print(f"  {name}: {info['seconds'] * 1000:.1f} ms")
+        for detail in info['plan']:
+            print(f"    | {detail}")
+        for issue in info['issues']:
+            print(f"    ! {issue}")
+
+
+def create_indexes(conn):
+    """
+    Create the recommended indexes no existing index covers, then ANALYZE
+    An index counts as covering when its leading columns match, whatever
+    it is called.
+    """
+    created = []
+    for name in missing_indexes(conn):
+        print(f"Creating index: {index_sql(name)}")
+        conn.execute(index_sql(name))
+        created.append(name)
+    conn.execute('ANALYZE')
+    conn.commit()
+    return created
+
+
+def advise(db_path, create=False, repeat=3):
+    """
+    Report full scans and temp sorts in the project's query plans
+    With create=True also build the covering indexes, re-run ANALYZE and
+    show the query latency before and after.
+    """
+    print(f"Inspecting query plans for: {db_path}")
+    conn = sqlite3.connect(db_path)
+    try:
+        before = inspect_queries(conn, repeat)
+        print_report(before, "Current query plans:")
+
+        missing = missing_indexes(conn)
+        if not create:
+            if missing:
+                print("\nRecommended indexes not present:")
+                for name in missing:
+                    print(f"  {index_sql(name)};")
+                print("Run with --create to build them.")
+            return {'before': before}
+
+        create_indexes(conn)
+        after = inspect_queries(conn, repeat)
+        print_report(after, "Query plans after indexing:")
+
+        print("\nLatency before -> after:")
+        for name in PROJECT_QUERIES:
+            print(f"  {name}: {before[name]['seconds'] * 1000:.1f} ms -> {after[name]['seconds'] * 1000:.1f} ms")
+        return {'before': before, 'after': after}
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Index advisor for the Chinook join path')
+    parser.add_argument('database', nargs='?', default='Chinook_Sqlite.sqlite')
+    parser.add_argument('--create', action='store_true', help='create the recommended covering indexes')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repetitions per query')
+    args = parser.parse_args()
+    advise(args.database, args.create, args.repeat)
@@ -0,0 +1,129 @@
+# instrumentation.py
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # ru_maxrss is KiB on Linux and bytes on macOS; it is a high-water mark
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if platform.system() == 'Darwin' else usage * 1024
+
+
+class JsonEmitter:
+    """Write each event as one JSON line to a stream or file"""
+
+    def __init__(self, target=None):
+        self.path = target if isinstance(target, str) else None
+        self.stream = target if target is not None and self.path is None else sys.stdout
+
+    def emit(self, event):
+        line = json.dumps(event, default=str)
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+        else:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+class Instrumentation:
+    """
+    Per-stage measurements with pluggable pre/post hooks
+    Each stage produces a record dict with wall time, CPU time, RSS delta and
+    rows in/out. Hooks receive the record before and after the stage runs.
+    Optional cProfile and tracemalloc capture add profile and allocation data.
+    """
+
+    def __init__(self, emitter=None, profile=False, profile_dir=None, trace_memory=False, profile_top=10):
+        self.emitter = emitter
+        self.profile = profile or profile_dir is not None
+        self.profile_dir = profile_dir
+        self.profile_top = profile_top
+        self.trace_memory = trace_memory
+        self.pre_hooks = []
+        self.post_hooks = []
+        self.events = []
+
+    def add_pre_hook(self, hook):
+        self.pre_hooks.append(hook)
+
+    def add_post_hook(self, hook):
+        self.post_hooks.append(hook)
+
+    def log(self, message):
+        """Emit a progress message as a structured event"""
+        event = {'event': 'log', 'message': message}
+        if self.emitter:
+            self.emitter.emit(event)
+        else:
+            print(message)
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        record = {'event': 'stage', 'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        for hook in self.pre_hooks:
+            hook(record)
+
+        profiler = cProfile.Profile() if self.profile else None
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+
+        rss_start = current_rss()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+            record['wall_seconds'] = time.perf_counter() - wall_start
+            record['cpu_seconds'] = time.process_time() - cpu_start
+            record['memory_delta_bytes'] = current_rss() - rss_start
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record['traced_delta_bytes'] = current - traced_start
+                record['traced_peak_bytes'] = peak - traced_start
+            if profiler:
+                self._attach_profile(record, profiler)
+
+            for hook in self.post_hooks:
+                hook(record)
+            self.events.append(record)
+            if self.emitter:
+                self.emitter.emit(record)
+
+    def _attach_profile(self, record, profiler):
+        """Store the top functions by cumulative time, and a .prof file if requested"""
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{record['stage']}.prof")
+            profiler.dump_stats(path)
+            record['profile_path'] = path
+
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(self.profile_top)
+        record['profile'] = out.getvalue()
+
+    def summary(self):
+        """Stage records collected so far"""
+        return list(self.events)
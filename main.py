@@ -1,12 +1,25 @@
 # main.py
-from chinook_python_centric import ChinookAnalyzer
-from chinook_simple_sql import simple_sql_solution
-from setup_database import setup_database
+# Heavy modules (pandas, SQLAlchemy, matplotlib, requests) are imported inside
+# the functions that need them so `--help` and SQL-only runs start quickly.
+import argparse
+import contextlib
+import json
 import os
+import sys
+
+
+COMMANDS = ['load', 'join', 'stats', 'export', 'plot', 'verify', 'bench', 'serve']
 
 
 def main():
     """Main analysis runner"""
+    from chinook_python_centric import ChinookAnalyzer
+    from chinook_simple_sql import simple_sql_solution
+    from setup_database import setup_database
+    from config import DatabaseConfig
+    from pipeline_runner import PipelineRunner
+    from result_verifier import compare_digests, digest_frame, print_verification
+
     print("=" * 60)
     print("IS 362 - Project 3: Chinook Database Analysis")
     print("=" * 60)
@@ -35,39 +48,41 @@ def main():
             print("PYTHON-CENTRIC APPROACH")
             print("=" * 50)
             analyzer = ChinookAnalyzer(db_path)
-            result = analyzer.run_complete_analysis()
+            result = analyzer.run_complete_analysis(use_indexes=True)
 
         elif choice == '2':
             print("\n" + "=" * 50)
             print("SIMPLE SQL APPROACH")
             print("=" * 50)
-            result = simple_sql_solution()
+            result = simple_sql_solution(database_path=db_path)
 
         elif choice == '3':
             print("\n" + "=" * 50)
             print("COMPARISON ANALYSIS")
             print("=" * 50)
 
-            # Python approach
-            print("\n--- Python Approach ---")
-            analyzer = ChinookAnalyzer(db_path)
-            python_result = analyzer.run_complete_analysis()
-
-            # SQL approach
-            print("\n--- SQL Approach ---")
-            sql_result = simple_sql_solution()
+            # Both pipelines at once: SQL on a worker thread, Python inline on
+            # the main thread so plotting stays there
+            runner = PipelineRunner(max_workers=2)
+            runner.add_stage('sql', lambda: simple_sql_solution(database_path=db_path))
+            runner.add_stage('python', lambda: ChinookAnalyzer(db_path).run_complete_analysis(use_indexes=True),
+                             executor='inline')
+            results = runner.run()
+            runner.print_report()
+            python_result = results.get('python')
+            sql_result = results.get('sql')
 
             if python_result is not None and sql_result is not None:
                 print("\n" + "=" * 30)
                 print("COMPARISON RESULTS")
                 print("=" * 30)
-                print(f"Python rows: {len(python_result)}")
-                print(f"SQL rows:    {len(sql_result)}")
+                # Row-hash digests: compares contents, not just counts, without a second copy
+                report = compare_digests(digest_frame(python_result), digest_frame(sql_result))
+                print_verification(report)
 
-                if len(python_result) == len(sql_result):
-                    print("Both methods produced identical row counts")
-                else:
-                    print("Different row counts between methods")
+            stats = DatabaseConfig.pool_stats()
+            print(f"Connection pool: {stats['pool_hits']} hits, {stats['pool_misses']} misses; "
+                  f"engine registry: {stats['engine_hits']} hits, {stats['engine_misses']} misses")
 
         else:
             print("Invalid choice. Please run again and choose 1, 2, or 3.")
@@ -81,5 +96,305 @@ def main():
         print(f"\nError during analysis: {e}")
 
 
+class AnalysisSession:
+    """
+    One loaded dataset shared by every command in a batch run
+    Tables, joins and statistics are computed on first use and then reused.
+    """
+
+    def __init__(self, database_path, optimized=False, use_cache=False, use_indexes=True):
+        self.database_path = database_path
+        self.optimized = optimized
+        self.use_cache = use_cache
+        self.use_indexes = use_indexes
+        self.analyzer = None
+        self.merged = {}
+        self.final = {}
+
+    def python_analyzer(self):
+        if self.analyzer is None:
+            from chinook_python_centric import ChinookAnalyzer
+            self.analyzer = ChinookAnalyzer(self.database_path)
+            if not self.analyzer.connect_to_database():
+                raise RuntimeError(f"Cannot open database: {self.database_path}")
+            if not self.analyzer.load_all_tables(optimized=self.optimized, use_cache=self.use_cache):
+                raise RuntimeError("Failed to load tables")
+        return self.analyzer
+
+    def load(self, method):
+        if method == 'python':
+            analyzer = self.python_analyzer()
+            return {name: len(df) for name, df in analyzer.tables.items()}
+
+        from sqlalchemy import text
+        from config import DatabaseConfig
+        with DatabaseConfig(self.database_path).connect() as connection:
+            return {table: connection.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+                    for table in ('Customer', 'Invoice', 'InvoiceLine', 'Track', 'Album')}
+
+    def join(self, method):
+        """Formatted LastName/FirstName/Name/Title result for a method"""
+        if method not in self.final:
+            if method == 'python':
+                analyzer = self.python_analyzer()
+                self.merged[method] = analyzer.merge_data_python(use_indexes=self.use_indexes)
+                self.final[method] = analyzer.clean_and_format_data(self.merged[method])
+            else:
+                import pandas as pd
+                from sqlalchemy import text
+                from chinook_python_centric import OUTPUT_COLUMNS
+                from chinook_simple_sql import SIMPLE_SQL_KEYED_QUERY
+                from config import DatabaseConfig
+                # Keep the key columns so plots group by id like the python method
+                with DatabaseConfig(self.database_path).connect() as connection:
+                    self.merged[method] = pd.read_sql(text(SIMPLE_SQL_KEYED_QUERY), connection)
+                self.final[method] = self.merged[method][OUTPUT_COLUMNS]
+        return self.final[method]
+
+    def compare_joins(self):
+        """Check the indexed join against the pd.merge chain on this session's tables and time both"""
+        from chinook_indexes import compare_join_strategies
+        return compare_join_strategies(self.python_analyzer())
+
+    def stats(self, method, top_n=10, approximate=False):
+        """
+        Customer, track and album statistics, counted by CustomerId, TrackId and AlbumId
+        The python method groups this session's join in pandas; the sql method
+        pushes the same GROUP BYs down to SQLite, so both agree even when names repeat.
+        approximate=True counts track/album popularity with a streaming heavy-hitter pass.
+        """
+        from chinook_backends import run_reports
+        from chinook_topk import approximate_top_items
+        if method == 'python':
+            self.join(method)
+            result = run_reports(self.database_path, backend='pandas', top_n=top_n, merged=self.merged[method])
+        else:
+            result = run_reports(self.database_path, backend='sqlite-pushdown', top_n=top_n)
+        reports = result['reports']
+        tracks, albums = reports['top_tracks'], reports['top_albums']
+        if approximate:
+            tracks, albums = approximate_top_items(self.database_path, top_n)
+        return self.stats_report(reports['customer_stats'], tracks, albums, top_n)
+
+    def backend_stats(self, backend, top_n=10):
+        """
+        Stats through chinook_backends without joining the detail rows first
+        backend='auto' picks the cheapest engine per report; a pandas join
+        already done in this session is reused.
+        """
+        from chinook_backends import run_reports
+        result = run_reports(self.database_path, backend=backend, top_n=top_n, merged=self.merged.get('python'))
+        reports = result['reports']
+        summary = self.stats_report(reports['customer_stats'], reports['top_tracks'], reports['top_albums'], top_n)
+        summary['plan'] = [{'report': step['report'], 'backend': step['backend'], 'seconds': round(step['seconds'], 4)}
+                           for step in result['plan']]
+        return summary
+
+    @staticmethod
+    def stats_report(customer_stats, tracks, albums, top_n):
+        top_customers = customer_stats.nlargest(top_n, 'TotalTracks').reset_index()
+        return {
+            'top_customers': top_customers.astype({'LastName': object, 'FirstName': object}).to_dict('records'),
+            'top_tracks': [{'Name': str(k), 'count': int(v)} for k, v in tracks.head(top_n).items()],
+            'top_albums': [{'Title': str(k), 'count': int(v)} for k, v in albums.head(top_n).items()],
+        }
+
+    def export(self, method, fmt='csv', compression=None):
+        """The python result is written from memory; the sql result streams from a server-side cursor"""
+        from chinook_export import iter_frame_batches, write_batches
+        from chinook_python_centric import OUTPUT_COLUMNS
+        from chinook_simple_sql import iter_sql_solution
+        filename = f'customer_tracks_{method}.csv'
+        if method == 'python':
+            batches = iter_frame_batches(self.join(method))
+        else:
+            batches = iter_sql_solution(self.database_path)
+        path, rows = write_batches(batches, filename, fmt, compression, columns=OUTPUT_COLUMNS)
+        return {'path': path, 'rows': rows}
+
+    def plot(self, method, dpi, fmt):
+        """Headless figure of the top-N reports; rendered again only when they change"""
+        from chinook_aggregates import CustomerAggregates
+        from chinook_plots import plot_data, render_headless
+        final_df = self.join(method)
+        data = plot_data(final_df, aggregates=CustomerAggregates.from_frame(self.merged[method]))
+        from config import OUTPUT_DIR, ensure_output_dir
+        ensure_output_dir()
+        output_path = os.path.join(OUTPUT_DIR, f'customer_tracks_{method}.{fmt}')
+        path, cached = render_headless(data, output_path, dpi=dpi, fmt=fmt)
+        return {'path': path, 'cached': cached}
+
+    def close(self):
+        if self.analyzer:
+            self.analyzer.close_connection()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Chinook database analysis. Run without arguments for the interactive menu.'
+    )
+    parser.add_argument('commands', nargs='+', choices=COMMANDS,
+                        help='reports to run in order against one loaded dataset')
+    parser.add_argument('--method', choices=['python', 'sql', 'both'], default='python')
+    parser.add_argument('--database', help='database file (default: first one found by config)')
+    parser.add_argument('--setup', action='store_true', help='download/verify the database first')
+    parser.add_argument('--full-verify', action='store_true', help='with --setup, run row counts and quick_check')
+    parser.add_argument('--json', action='store_true', help='print one JSON document with all results')
+    parser.add_argument('--optimized', action='store_true', help='projected columns and compact dtypes')
+    parser.add_argument('--cache', action='store_true', help='use the on-disk table cache')
+    parser.add_argument('--no-indexes', dest='use_indexes', action='store_false',
+                        help='join with the pd.merge chain instead of the key indexes')
+    parser.add_argument('--compare-joins', action='store_true',
+                        help='join: check the indexed join against the pd.merge chain and time both')
+    parser.add_argument('--top', type=int, default=10, help='rows in top-N reports')
+    parser.add_argument('--approximate', action='store_true',
+                        help='stats: track/album popularity from a bounded-memory streaming pass')
+    parser.add_argument('--backend', choices=['auto', 'pandas', 'sqlite-pushdown', 'hybrid'],
+                        help='stats: compute the reports on this engine instead of --method')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv', help='export format')
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], help='CSV compression')
+    parser.add_argument('--dpi', type=int, default=100, help='plot resolution')
+    parser.add_argument('--plot-format', choices=['png', 'svg', 'pdf'], default='png', help='plot file format')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10], help='benchmark scales')
+    parser.add_argument('--host', default='127.0.0.1', help='serve: address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='serve: HTTP port')
+    parser.add_argument('--cache-mb', type=float, default=64, help='serve: result cache size limit')
+    return parser
+
+
+def run_batch(args):
+    """Run the requested commands and return the collected results"""
+    if args.setup:
+        from setup_database import setup_database
+        database_path = setup_database(full_verify=args.full_verify)
+    else:
+        from config import get_database_path
+        database_path = args.database or get_database_path()
+    if not database_path:
+        raise RuntimeError("No database found. Run with --setup or pass --database.")
+
+    methods = ['python', 'sql'] if args.method == 'both' else [args.method]
+    session = AnalysisSession(database_path, optimized=args.optimized, use_cache=args.cache,
+                              use_indexes=args.use_indexes)
+    results = {'database': database_path, 'methods': methods, 'commands': {}}
+
+    try:
+        if len(methods) > 1 and set(args.commands) & {'join', 'stats', 'export', 'plot'}:
+            # Build both results concurrently; the commands below reuse them
+            from pipeline_runner import PipelineRunner
+            runner = PipelineRunner(max_workers=len(methods))
+            for method in methods:
+                runner.add_stage(method, lambda method=method: session.join(method))
+            runner.run()
+            results['pipeline'] = runner.report()
+            if runner.failures:
+                raise RuntimeError(f"Pipeline failed: {runner.failures}")
+
+        for command in args.commands:
+            if command == 'bench':
+                from benchmark import run_benchmarks
+                report = run_benchmarks(args.scales)
+                results['commands']['bench'] = report['results']
+                continue
+            if command == 'verify':
+                # Streams both pipelines itself, independent of --method
+                from result_verifier import verify_pipelines
+                report = verify_pipelines(database_path, limit=args.top)
+                if report is None:
+                    raise RuntimeError("Pipeline verification failed")
+                results['commands']['verify'] = report
+                continue
+
+            if command == 'serve':
+                # Loads the data once and answers HTTP queries until interrupted
+                from chinook_service import serve
+                results['commands']['serve'] = serve(database_path, args.host, args.port,
+                                                     int(args.cache_mb * 2 ** 20))
+                continue
+
+            if command == 'stats' and args.backend:
+                results['commands']['stats'] = {f'backend {args.backend}': session.backend_stats(args.backend, args.top)}
+                continue
+
+            by_method = {}
+            for method in methods:
+                if command == 'load':
+                    by_method[method] = session.load(method)
+                elif command == 'join':
+                    df = session.join(method)
+                    by_method[method] = {'rows': len(df), 'preview': df.head(5).astype(str).to_dict('records')}
+                    if args.compare_joins and method == 'python':
+                        by_method[method]['join_check'] = session.compare_joins()
+                elif command == 'stats':
+                    by_method[method] = session.stats(method, args.top, args.approximate)
+                elif command == 'export':
+                    by_method[method] = session.export(method, args.format, args.compression)
+                elif command == 'plot':
+                    by_method[method] = session.plot(method, args.dpi, args.plot_format)
+            results['commands'][command] = by_method
+    finally:
+        session.close()
+    return results
+
+
+def print_results(results):
+    """Human-readable summary of a batch run"""
+    print(f"\nDatabase: {results['database']}")
+    for command, by_method in results['commands'].items():
+        print(f"\n== {command} ==")
+        if command == 'verify':
+            print(f"  match: {by_method['match']} ({by_method['mismatched_total']} mismatching keys)")
+            continue
+        if command == 'bench':
+            for entry in by_method:
+                total = sum(stage['wall_seconds'] for stage in entry['stages'])
+                print(f"  {entry['pipeline']} x{entry['scale']}: {entry['rows']} rows, {total:.3f} s")
+            continue
+        if command == 'serve':
+            cache = by_method['cache']
+            print(f"  reloads: {by_method['reloads']}, cache hits {cache['hits']} / misses {cache['misses']}, "
+                  f"evictions {cache['evictions']}")
+            for endpoint, latency in by_method['latency'].items():
+                print(f"  {endpoint}: {latency['requests']} requests, p50 {latency['p50_ms']} ms, "
+                      f"p99 {latency['p99_ms']} ms")
+            continue
+        for method, value in by_method.items():
+            print(f"  [{method}]")
+            if command == 'stats':
+                for section, rows in value.items():
+                    print(f"    {section}:")
+                    for row in rows:
+                        print(f"      {row}")
+            elif command == 'join':
+                print(f"    rows: {value['rows']}")
+                if 'join_check' in value:
+                    print(f"    indexed join identical: {value['join_check']['identical']}")
+            else:
+                for key, item in value.items():
+                    print(f"    {key}: {item}")
+
+
+def cli(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        main()
+        return 0
+
+    args = build_parser().parse_args(argv)
+    try:
+        if args.json:
+            # Keep stdout clean for the JSON document
+            with contextlib.redirect_stdout(sys.stderr):
+                results = run_batch(args)
+            print(json.dumps(results, indent=2, default=str))
+        else:
+            results = run_batch(args)
+            print_results(results)
+        return 0
+    except Exception as e:
+        print(f"Error during analysis: {e}", file=sys.stderr)
+        return 1
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(cli())
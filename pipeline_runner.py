@@ -0,0 +1,267 @@
+# pipeline_runner.py
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class StageTimeout(TimeoutError):
+    """A pipeline stage ran longer than its timeout"""
+
+
+class Stage:
+    """One node of the pipeline DAG"""
+
+    def __init__(self, name, func, inputs=(), executor='thread', timeout=None):
+        if executor not in ('thread', 'process', 'inline'):
+            raise ValueError(f"Unknown executor: {executor}")
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.executor = executor
+        self.timeout = timeout
+        self.status = 'pending'
+        self.error = None
+        self.start = None
+        self.end = None
+
+    @property
+    def seconds(self):
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+
+class CallerThreadExecutor(Executor):
+    """
+    Executor whose calls run on the thread that calls serve()
+    PipelineRunner.run uses it for 'inline' stages: the event loop moves to a
+    helper thread and the calling (usually main) thread does the inline work,
+    so an inline stage never blocks the scheduling of other stages.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def stop(self):
+        self._queue.put(None)
+
+    def serve(self):
+        """Run submitted calls until stop() is called"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+def _timed_call(func, args):
+    """Run func(*args) and return (result, seconds); module level so process pools can pickle it"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class PipelineRunner:
+    """
+    Small asyncio DAG scheduler for analysis stages
+    Each stage declares the stages whose results it takes as positional
+    arguments. A stage starts as soon as all of its inputs have finished, so
+    independent stages run concurrently on the thread (or process) pool.
+    'inline' stages run on the thread that called run(), for work such as
+    plt.show() that must stay on the main thread; the event loop runs on a
+    helper thread meanwhile, so other stages and timeouts are not held up.
+    Stage times are taken where the stage actually runs, not including time
+    spent waiting for a worker. A stage that fails or exceeds its timeout is
+    recorded and every stage that depends on it is skipped. As with threads,
+    a timed-out inline stage cannot be interrupted and runs to completion.
+    """
+
+    def __init__(self, max_workers=4, default_timeout=None):
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.stages = {}
+        self.results = {}
+        self.elapsed = None
+
+    def add_stage(self, name, func, inputs=(), executor='thread', timeout=None):
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        for dependency in inputs:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        stage = Stage(name, func, inputs, executor, timeout)
+        self.stages[name] = stage
+        return stage
+
+    def run(self):
+        """Run every stage and return {name: result} for the stages that succeeded"""
+        inline = CallerThreadExecutor()
+        outcome = {}
+
+        def run_loop():
+            try:
+                outcome['results'] = asyncio.run(self.run_async(inline))
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                inline.stop()
+
+        loop_thread = threading.Thread(target=run_loop, name='pipeline-loop', daemon=True)
+        loop_thread.start()
+        inline.serve()
+        loop_thread.join()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['results']
+
+    async def run_async(self, inline=None):
+        """
+        Schedule the stages on the running event loop
+        inline is the executor for 'inline' stages; without one (when called
+        from an existing loop) they run on the thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        threads = ThreadPoolExecutor(max_workers=self.max_workers)
+        processes = None
+        if any(stage.executor == 'process' for stage in self.stages.values()):
+            processes = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        origin = time.perf_counter()
+        tasks = {}
+
+        def timed(stage, args):
+            # Runs on the worker, so waiting for a free worker is not counted
+            if stage.status != 'running':
+                # Timed out before a worker picked it up
+                return None
+            stage.start = time.perf_counter() - origin
+            try:
+                return stage.func(*args)
+            finally:
+                if stage.end is None:
+                    stage.end = time.perf_counter() - origin
+
+        async def run_stage(stage):
+            # Stages are added in dependency order, so these tasks already exist
+            for dependency in stage.inputs:
+                await tasks[dependency]
+            failed = [d for d in stage.inputs if self.stages[d].status != 'done']
+            if failed:
+                stage.status = 'skipped'
+                stage.error = f"input failed: {', '.join(failed)}"
+                return
+
+            args = [self.results[d] for d in stage.inputs]
+            timeout = stage.timeout if stage.timeout is not None else self.default_timeout
+            stage.status = 'running'
+            submitted = time.perf_counter() - origin
+            try:
+                if stage.executor == 'process':
+                    future = loop.run_in_executor(processes, _timed_call, stage.func, args)
+                    result, seconds = await asyncio.wait_for(future, timeout)
+                    stage.end = time.perf_counter() - origin
+                    stage.start = stage.end - seconds
+                else:
+                    pool = inline if stage.executor == 'inline' and inline is not None else threads
+                    future = loop.run_in_executor(pool, timed, stage, args)
+                    result = await asyncio.wait_for(future, timeout)
+                self.results[stage.name] = result
+                stage.status = 'done'
+            except asyncio.TimeoutError:
+                stage.status = 'timeout'
+                stage.error = StageTimeout(f"Stage {stage.name} exceeded {timeout} s")
+                if stage.end is None:
+                    stage.end = time.perf_counter() - origin
+            except Exception as e:
+                stage.status = 'failed'
+                stage.error = e
+                if stage.end is None:
+                    stage.start = submitted if stage.start is None else stage.start
+                    stage.end = time.perf_counter() - origin
+
+        try:
+            for stage in self.stages.values():
+                tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+            await asyncio.gather(*tasks.values())
+        finally:
+            # A timed-out thread cannot be interrupted; don't wait for it here
+            threads.shutdown(wait=False, cancel_futures=True)
+            if processes is not None:
+                processes.shutdown(wait=False, cancel_futures=True)
+        self.elapsed = time.perf_counter() - origin
+        return self.results
+
+    @property
+    def failures(self):
+        return {name: stage.error for name, stage in self.stages.items()
+                if stage.status in ('failed', 'timeout', 'skipped')}
+
+    def critical_path(self):
+        """
+        Chain of stages that determined the total run time
+        Walks back from the last stage to finish, each time through the input
+        that finished last. Returns (stage names, seconds on that chain).
+        """
+        finished = [stage for stage in self.stages.values() if stage.end is not None]
+        if not finished:
+            return [], 0.0
+
+        stage = max(finished, key=lambda s: s.end)
+        path = [stage]
+        while stage.inputs:
+            stage = max((self.stages[d] for d in stage.inputs), key=lambda s: s.end or 0.0)
+            path.append(stage)
+        path.reverse()
+        return [s.name for s in path], sum(s.seconds or 0.0 for s in path)
+
+    def report(self):
+        """Per-stage timings plus the critical path, as a dict"""
+        path, path_seconds = self.critical_path()
+        serial_seconds = sum(stage.seconds or 0.0 for stage in self.stages.values())
+        return {
+            'stages': [{
+                'stage': stage.name,
+                'inputs': stage.inputs,
+                'executor': stage.executor,
+                'status': stage.status,
+                'start': stage.start,
+                'seconds': stage.seconds,
+                'error': str(stage.error) if stage.error else None,
+            } for stage in self.stages.values()],
+            'critical_path': path,
+            'critical_path_seconds': path_seconds,
+            'serial_seconds': serial_seconds,
+            'elapsed_seconds': self.elapsed,
+        }
+
+    def print_report(self, log=print):
+        """Print the stage timings; log=ChinookAnalyzer.log sends them to an instrumentation emitter"""
+        report = self.report()
+        log("\n" + "=" * 50)
+        log("PIPELINE STAGES")
+        log("=" * 50)
+        for entry in report['stages']:
+            seconds = f"{entry['seconds']:.3f} s" if entry['seconds'] is not None else '-'
+            start = f"+{entry['start']:.3f}" if entry['start'] is not None else ''
+            line = f"  {entry['stage']:<12} {entry['status']:<8} {seconds:>10} {start}"
+            if entry['error']:
+                line += f"  ({entry['error']})"
+            log(line)
+        log(f"Critical path: {' -> '.join(report['critical_path'])} "
+            f"({report['critical_path_seconds']:.3f} s)")
+        if report['elapsed_seconds']:
+            log(f"Elapsed {report['elapsed_seconds']:.3f} s vs {report['serial_seconds']:.3f} s "
+                f"of stage time run back to back")
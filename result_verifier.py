@@ -0,0 +1,155 @@
+# result_verifier.py
+import argparse
+import numpy as np
+import pandas as pd
+from chinook_export import iter_frame_batches
+from chinook_python_centric import ChinookAnalyzer, OUTPUT_COLUMNS, STREAM_CHUNKSIZE
+from chinook_simple_sql import iter_sql_solution
+
+
+# Mismatches are reported per customer name, the output's sort key
+VERIFY_KEY_COLUMNS = ['LastName', 'FirstName']
+MASK = (1 << 64) - 1
+
+
+class MultisetDigest:
+    """
+    Order-independent digest of DataFrame rows, kept per key
+    Each row is hashed with pd.util.hash_pandas_object. A key's digest is its
+    row count plus the wrapping 64-bit sums of the row hashes and of their
+    squares, so the same multiset of rows gives the same digest in any order
+    and chunking. Memory grows with the number of distinct keys, not rows.
+    """
+
+    def __init__(self, columns=OUTPUT_COLUMNS, key_columns=VERIFY_KEY_COLUMNS):
+        self.columns = list(columns)
+        self.key_columns = list(key_columns)
+        self.rows = 0
+        self.keys = {}
+        self.labels = {}
+
+    def update(self, chunk):
+        if len(chunk) == 0:
+            return
+        row_hashes = pd.util.hash_pandas_object(chunk[self.columns], index=False).to_numpy()
+        key_hashes = pd.util.hash_pandas_object(chunk[self.key_columns], index=False).to_numpy()
+
+        # Sum the row hashes of each key within the chunk
+        order = np.argsort(key_hashes, kind='stable')
+        sorted_keys = key_hashes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        hashes = row_hashes[order]
+        counts = np.diff(np.r_[starts, len(hashes)])
+        sums = np.add.reduceat(hashes, starts)
+        squares = np.add.reduceat(hashes * hashes, starts)
+
+        for key, count, total, square, row in zip(sorted_keys[starts].tolist(), counts.tolist(),
+                                                  sums.tolist(), squares.tolist(), order[starts].tolist()):
+            entry = self.keys.get(key)
+            if entry is None:
+                self.keys[key] = [count, total, square]
+                self.labels[key] = tuple(chunk[column].iloc[row] for column in self.key_columns)
+            else:
+                entry[0] += count
+                entry[1] = (entry[1] + total) & MASK
+                entry[2] = (entry[2] + square) & MASK
+        self.rows += len(chunk)
+
+    def digest(self):
+        """Digest of all rows as a string"""
+        total = square = 0
+        for _, key_total, key_square in self.keys.values():
+            total = (total + key_total) & MASK
+            square = (square + key_square) & MASK
+        return f'{self.rows}:{total:016x}{square:016x}'
+
+    def diff(self, other):
+        """Keys whose rows differ from other, in output (LastName, FirstName) order"""
+        mismatched = []
+        for key in self.keys.keys() | other.keys.keys():
+            mine = self.keys.get(key)
+            theirs = other.keys.get(key)
+            if mine != theirs:
+                mismatched.append({
+                    'key': self.labels.get(key) or other.labels.get(key),
+                    'rows': [mine[0] if mine else 0, theirs[0] if theirs else 0],
+                })
+        mismatched.sort(key=lambda m: tuple((pd.isna(v), '' if pd.isna(v) else str(v)) for v in m['key']))
+        return mismatched
+
+
+def digest_frames(frames, columns=OUTPUT_COLUMNS):
+    """Digest an iterable of DataFrame chunks"""
+    digest = MultisetDigest(columns)
+    for frame in frames:
+        digest.update(frame)
+    return digest
+
+
+def digest_frame(df, chunksize=STREAM_CHUNKSIZE):
+    """Digest an in-memory result in slices, without copying it"""
+    return digest_frames(iter_frame_batches(df, chunksize))
+
+
+def compare_digests(left, right, names=('python', 'sql'), limit=10):
+    """Report whether two digests hold the same rows, and the first keys that differ"""
+    mismatched = left.diff(right)
+    return {
+        'match': not mismatched,
+        'rows': {names[0]: left.rows, names[1]: right.rows},
+        'digest': {names[0]: left.digest(), names[1]: right.digest()},
+        'mismatched_keys': [{'key': [str(v) for v in m['key']], 'rows': dict(zip(names, m['rows']))}
+                            for m in mismatched[:limit]],
+        'mismatched_total': len(mismatched),
+    }
+
+
+def print_verification(report):
+    names = list(report['rows'])
+    for name in names:
+        print(f"{name} rows: {report['rows'][name]}  digest {report['digest'][name]}")
+    if report['match']:
+        print("Results are identical (same rows, any order)")
+        return
+    print(f"Results differ for {report['mismatched_total']} customer name(s); first mismatches:")
+    for entry in report['mismatched_keys']:
+        counts = ', '.join(f"{name} {entry['rows'][name]}" for name in names)
+        print(f"  - {', '.join(entry['key'])}: {counts} rows")
+
+
+def verify_pipelines(database_path='Chinook_Sqlite.sqlite', chunksize=STREAM_CHUNKSIZE, limit=10):
+    """
+    Compare the Python and SQL pipelines on the full data in bounded memory
+    The Python side streams merge_data_python's rows chunk by chunk and the
+    SQL side streams simple_sql_solution's query; neither result is materialized.
+    """
+    print(f"Verifying pipelines on: {database_path}")
+    analyzer = ChinookAnalyzer(database_path)
+    if not analyzer.connect_to_database():
+        return None
+    try:
+        python_digest = digest_frames(analyzer.iter_merged_chunks(chunksize))
+    except Exception as e:
+        print(f"Error streaming Python pipeline: {e}")
+        return None
+    finally:
+        analyzer.close_connection()
+
+    try:
+        sql_digest = digest_frames(iter_sql_solution(database_path, chunksize))
+    except Exception as e:
+        print(f"Error streaming SQL pipeline: {e}")
+        return None
+
+    report = compare_digests(python_digest, sql_digest, limit=limit)
+    print_verification(report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that the Python and SQL pipelines return the same rows')
+    parser.add_argument('database', nargs='?', default='Chinook_Sqlite.sqlite')
+    parser.add_argument('--chunksize', type=int, default=STREAM_CHUNKSIZE)
+    parser.add_argument('--limit', type=int, default=10, help='mismatching keys to report')
+    args = parser.parse_args()
+    verify_pipelines(args.database, args.chunksize, args.limit)
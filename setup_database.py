@@ -1,53 +1,91 @@
 # setup_database.py
+import argparse
+import json
 import sqlite3
-import requests
 import os
+from pathlib import Path
+from config import DatabaseConfig
+from chinook_download import download_file
 
 
-def download_chinook_database():
-    """Download Chinook database directly from GitHub"""
-    print("Downloading Chinook database...")
+REQUIRED_TABLES = ['Customer', 'Invoice', 'InvoiceLine', 'Track', 'Album']
+VERIFY_SIDECAR_SUFFIX = '.verified.json'
+CHINOOK_URL = "https://github.com/lerocha/chinook-database/raw/master/ChinookDatabase/DataSources/Chinook_Sqlite.sqlite"
+
 
-    # Direct link to the Chinook SQLite database
-    chinook_url = "https://github.com/lerocha/chinook-database/raw/master/ChinookDatabase/DataSources/Chinook_Sqlite.sqlite"
+def download_chinook_database(url=CHINOOK_URL, sha256=None, segments=1):
+    """
+    Download the Chinook database, resuming an interrupted download if one is left
+    url may also be a file:// URL or a local mirror path.
+    """
+    print("Downloading Chinook database...")
     local_db_path = "Chinook_Sqlite.sqlite"
 
     try:
-        # Download the SQLite file directly
-        response = requests.get(chinook_url, stream=True, timeout=60)
-        response.raise_for_status()
-
-        # Get total file size for progress tracking
-        total_size = int(response.headers.get('content-length', 0))
-
-        with open(local_db_path, 'wb') as f:
-            if total_size == 0:
-                # No content length header
-                f.write(response.content)
-            else:
-                # Show progress for larger download
-                downloaded = 0
-                for chunk in response.iter_content(chunk_size=8192):
-                    downloaded += len(chunk)
-                    f.write(chunk)
-                    # Show progress
-                    done = int(50 * downloaded / total_size)
-                    print(f"\r[{'=' * done}{' ' * (50 - done)}] {downloaded}/{total_size} bytes", end='', flush=True)
-
-        print(f"\nDownload completed: {local_db_path}")
+        download_file(url, local_db_path, sha256=sha256, segments=segments)
+        print(f"Download completed: {local_db_path}")
         return local_db_path
 
     except Exception as e:
         print(f"\nError downloading database: {e}")
+        if os.path.exists(local_db_path + '.part'):
+            print("Partial download kept; run setup again to resume")
+        return None
+
+
+def verification_fingerprint(db_path, conn):
+    """
+    Cheap identity of the database: file size, mtime, schema version and the
+    row estimates kept in sqlite_stat1 (empty if ANALYZE has never run)
+    """
+    stat = os.stat(db_path)
+    schema_version = conn.execute('PRAGMA schema_version').fetchone()[0]
+
+    row_estimates = {}
+    has_stats = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'"
+    ).fetchone()[0]
+    if has_stats:
+        for tbl, stat_line in conn.execute('SELECT tbl, stat FROM sqlite_stat1'):
+            estimate = int(stat_line.split()[0])
+            row_estimates[tbl] = max(estimate, row_estimates.get(tbl, 0))
+
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'schema_version': schema_version,
+        'row_estimates': row_estimates,
+    }
+
+
+def load_verified_fingerprint(db_path):
+    """Fingerprint recorded by the last successful verification, or None"""
+    try:
+        with open(db_path + VERIFY_SIDECAR_SUFFIX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return None
 
 
-def verify_chinook_database(db_path):
-    """Verify that the database contains Chinook tables and data"""
+def save_verified_fingerprint(db_path, fingerprint):
+    try:
+        with open(db_path + VERIFY_SIDECAR_SUFFIX, 'w') as f:
+            json.dump(fingerprint, f, indent=2)
+    except OSError as e:
+        print(f"Could not record verification fingerprint: {e}")
+
+
+def verify_chinook_database(db_path, full=False):
+    """
+    Verify that the database contains Chinook tables and data
+    If the file is unchanged since the last successful check (same fingerprint
+    in the sidecar file) the row counts are skipped. full=True always runs the
+    row counts plus PRAGMA quick_check.
+    """
     print(f"Verifying database: {db_path}")
 
     try:
-        conn = sqlite3.connect(db_path)
+        conn = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
         cursor = conn.cursor()
 
         # Check for essential Chinook tables
@@ -62,22 +100,38 @@ def verify_chinook_database(db_path):
         print("Found tables:", ", ".join(table_names))
 
         # Verify we have the core tables needed for our analysis
-        required_tables = ['Customer', 'Invoice', 'InvoiceLine', 'Track', 'Album']
-        missing_tables = [table for table in required_tables if table not in table_names]
+        missing_tables = [table for table in REQUIRED_TABLES if table not in table_names]
 
         if missing_tables:
             print(f"Missing required tables: {missing_tables}")
             conn.close()
             return False
 
+        fingerprint = verification_fingerprint(db_path, conn)
+        if not full and load_verified_fingerprint(db_path) == fingerprint:
+            conn.close()
+            print("Database unchanged since last verification (use --full-verify to re-check)")
+            return True
+
+        if full:
+            result = cursor.execute('PRAGMA quick_check').fetchall()
+            if [row[0] for row in result] != ['ok']:
+                print("Integrity check failed:")
+                for row in result[:10]:
+                    print(f"  - {row[0]}")
+                conn.close()
+                return False
+            print("Integrity check: ok")
+
         # Check if tables have data
         print("Checking table row counts:")
-        for table in required_tables:
+        for table in REQUIRED_TABLES:
             cursor.execute(f"SELECT COUNT(*) FROM {table}")
             count = cursor.fetchone()[0]
             print(f"  - {table}: {count} rows")
 
         conn.close()
+        save_verified_fingerprint(db_path, fingerprint)
         print("Database verification successful!")
         return True
 
@@ -86,7 +140,7 @@ def verify_chinook_database(db_path):
         return False
 
 
-def setup_database():
+def setup_database(full_verify=False, url=CHINOOK_URL, sha256=None, segments=1):
     """Main setup function"""
     print("=" * 60)
     print("CHINOOK DATABASE SETUP")
@@ -97,20 +151,24 @@ def setup_database():
     # Check if we already have a valid Chinook database
     if os.path.exists(db_path):
         print(f"Found existing database: {db_path}")
-        if verify_chinook_database(db_path):
+        if verify_chinook_database(db_path, full=full_verify):
             print("Using existing Chinook database")
             return db_path
         else:
             print("Existing database is invalid. Downloading fresh copy...")
+            # Drop pooled connections to the file before replacing it
+            DatabaseConfig.dispose_all()
             os.remove(db_path)
+            if os.path.exists(db_path + VERIFY_SIDECAR_SUFFIX):
+                os.remove(db_path + VERIFY_SIDECAR_SUFFIX)
 
     # Download fresh database
     print("Downloading Chinook database from:")
-    print("https://github.com/lerocha/chinook-database/raw/master/ChinookDatabase/DataSources/Chinook_Sqlite.sqlite")
+    print(url)
 
-    db_path = download_chinook_database()
+    db_path = download_chinook_database(url, sha256, segments)
 
-    if db_path and verify_chinook_database(db_path):
+    if db_path and verify_chinook_database(db_path, full=True):
         print("Chinook database setup completed successfully!")
         return db_path
     else:
@@ -123,11 +181,21 @@ def setup_database():
 
 
 if __name__ == "__main__":
-    result = setup_database()
+    parser = argparse.ArgumentParser(description='Download and verify the Chinook database')
+    parser.add_argument('--full-verify', '--full', dest='full', action='store_true',
+                        help='always run row counts and PRAGMA quick_check')
+    parser.add_argument('--url', default=CHINOOK_URL, help='download URL, file:// URL or local mirror path')
+    parser.add_argument('--sha256', help='expected SHA-256 of the downloaded file')
+    parser.add_argument('--segments', type=int, default=1, help='parallel byte-range downloads')
+    args = parser.parse_args()
+
+    result = setup_database(full_verify=args.full, url=args.url, sha256=args.sha256, segments=args.segments)
     if result:
         print(f"\nSUCCESS: Database ready at '{result}'")
         print("\nYou can now run:")
         print("  python chinook_python_centric.py")
         print("  python main.py")
+        print("  python index_advisor.py --create   (optional: index the join path)")
+        print("  python summary_tables.py refresh   (optional: precompute purchase summaries)")
     else:
         print("\nFAILED: Database setup unsuccessful")
\ No newline at end of file
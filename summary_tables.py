@@ -0,0 +1,184 @@
+# summary_tables.py
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+
+SUMMARY_TABLES = ['CustomerTrackStats', 'CustomerAlbumPurchases', 'TrackPurchaseCounts',
+                  'AlbumPurchaseCounts', 'SummaryMeta']
+SUMMARY_TRIGGER = 'trg_InvoiceLine_Summaries'
+
+# Purchased lines with every join partner present, as in the analysis join
+PURCHASES = """
+    FROM InvoiceLine il
+    JOIN Invoice i ON i.InvoiceId = il.InvoiceId
+    JOIN Customer c ON c.CustomerId = i.CustomerId
+    JOIN Track t ON t.TrackId = il.TrackId
+    JOIN Album a ON a.AlbumId = t.AlbumId
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS CustomerTrackStats (
+    CustomerId INTEGER PRIMARY KEY,
+    TotalTracks INTEGER NOT NULL,
+    UniqueAlbums INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS CustomerAlbumPurchases (
+    CustomerId INTEGER NOT NULL,
+    AlbumId INTEGER NOT NULL,
+    Purchases INTEGER NOT NULL,
+    PRIMARY KEY (CustomerId, AlbumId)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS TrackPurchaseCounts (
+    TrackId INTEGER PRIMARY KEY,
+    Purchases INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS AlbumPurchaseCounts (
+    AlbumId INTEGER PRIMARY KEY,
+    Purchases INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS SummaryMeta (
+    Name TEXT PRIMARY KEY,
+    Value TEXT
+);
+CREATE INDEX IF NOT EXISTS IX_TrackPurchaseCounts_Purchases ON TrackPurchaseCounts (Purchases);
+CREATE INDEX IF NOT EXISTS IX_AlbumPurchaseCounts_Purchases ON AlbumPurchaseCounts (Purchases);
+CREATE INDEX IF NOT EXISTS IX_CustomerTrackStats_TotalTracks ON CustomerTrackStats (TotalTracks);
+"""
+
+# Keeps the summaries in step with new invoice lines
+TRIGGER = f"""
+CREATE TRIGGER IF NOT EXISTS {SUMMARY_TRIGGER} AFTER INSERT ON InvoiceLine
+BEGIN
+    INSERT INTO TrackPurchaseCounts (TrackId, Purchases)
+        SELECT t.TrackId, 1
+        FROM Invoice i
+        JOIN Customer c ON c.CustomerId = i.CustomerId
+        JOIN Track t ON t.TrackId = NEW.TrackId
+        JOIN Album a ON a.AlbumId = t.AlbumId
+        WHERE i.InvoiceId = NEW.InvoiceId
+        ON CONFLICT (TrackId) DO UPDATE SET Purchases = Purchases + 1;
+
+    INSERT INTO AlbumPurchaseCounts (AlbumId, Purchases)
+        SELECT a.AlbumId, 1
+        FROM Invoice i
+        JOIN Customer c ON c.CustomerId = i.CustomerId
+        JOIN Track t ON t.TrackId = NEW.TrackId
+        JOIN Album a ON a.AlbumId = t.AlbumId
+        WHERE i.InvoiceId = NEW.InvoiceId
+        ON CONFLICT (AlbumId) DO UPDATE SET Purchases = Purchases + 1;
+
+    INSERT INTO CustomerAlbumPurchases (CustomerId, AlbumId, Purchases)
+        SELECT c.CustomerId, a.AlbumId, 1
+        FROM Invoice i
+        JOIN Customer c ON c.CustomerId = i.CustomerId
+        JOIN Track t ON t.TrackId = NEW.TrackId
+        JOIN Album a ON a.AlbumId = t.AlbumId
+        WHERE i.InvoiceId = NEW.InvoiceId
+        ON CONFLICT (CustomerId, AlbumId) DO UPDATE SET Purchases = Purchases + 1;
+
+    INSERT INTO CustomerTrackStats (CustomerId, TotalTracks, UniqueAlbums)
+        SELECT c.CustomerId, 1, 1
+        FROM Invoice i
+        JOIN Customer c ON c.CustomerId = i.CustomerId
+        JOIN Track t ON t.TrackId = NEW.TrackId
+        JOIN Album a ON a.AlbumId = t.AlbumId
+        WHERE i.InvoiceId = NEW.InvoiceId
+        ON CONFLICT (CustomerId) DO UPDATE SET
+            TotalTracks = TotalTracks + 1,
+            UniqueAlbums = (SELECT COUNT(*) FROM CustomerAlbumPurchases p
+                            WHERE p.CustomerId = excluded.CustomerId);
+END;
+"""
+
+
+def summaries_exist(conn):
+    """True if the summary tables have been built in this database"""
+    row = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name='SummaryMeta'"
+    ).fetchone()
+    return row[0] > 0
+
+
+def refresh_summaries(db_path):
+    """Rebuild all summary tables from InvoiceLine and install the insert trigger"""
+    print(f"Refreshing summary tables in: {db_path}")
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA)
+        with conn:
+            for table in SUMMARY_TABLES:
+                conn.execute(f'DELETE FROM {table}')
+
+            conn.execute(f"""
+                INSERT INTO CustomerAlbumPurchases (CustomerId, AlbumId, Purchases)
+                SELECT c.CustomerId, a.AlbumId, COUNT(*) {PURCHASES}
+                GROUP BY c.CustomerId, a.AlbumId
+            """)
+            conn.execute("""
+                INSERT INTO CustomerTrackStats (CustomerId, TotalTracks, UniqueAlbums)
+                SELECT CustomerId, SUM(Purchases), COUNT(*)
+                FROM CustomerAlbumPurchases GROUP BY CustomerId
+            """)
+            conn.execute(f"""
+                INSERT INTO TrackPurchaseCounts (TrackId, Purchases)
+                SELECT t.TrackId, COUNT(*) {PURCHASES} GROUP BY t.TrackId
+            """)
+            conn.execute("""
+                INSERT INTO AlbumPurchaseCounts (AlbumId, Purchases)
+                SELECT AlbumId, SUM(Purchases) FROM CustomerAlbumPurchases GROUP BY AlbumId
+            """)
+            conn.execute("INSERT INTO SummaryMeta VALUES ('refreshed_at', datetime('now'))")
+
+        conn.executescript(TRIGGER)
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Summary tables refreshed in {time.perf_counter() - start:.2f} s")
+
+
+def drop_summaries(db_path):
+    """Remove the summary tables and trigger"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f'DROP TRIGGER IF EXISTS {SUMMARY_TRIGGER}')
+        for table in SUMMARY_TABLES:
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+        conn.commit()
+    finally:
+        conn.close()
+    print("Summary tables dropped")
+
+
+def summary_status(db_path):
+    """Print row counts of the summary tables and when they were last refreshed"""
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        if not summaries_exist(conn):
+            print("Summary tables have not been built. Run: python summary_tables.py refresh")
+            return False
+        refreshed = conn.execute("SELECT Value FROM SummaryMeta WHERE Name = 'refreshed_at'").fetchone()
+        print(f"Last full refresh: {refreshed[0] if refreshed else 'unknown'} (kept current by trigger)")
+        for table in SUMMARY_TABLES[:-1]:
+            count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            print(f"  - {table}: {count} rows")
+        return True
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Materialized purchase summaries for the Chinook database')
+    parser.add_argument('command', choices=['refresh', 'drop', 'status'])
+    parser.add_argument('database', nargs='?', default='Chinook_Sqlite.sqlite')
+    args = parser.parse_args()
+
+    if args.command == 'refresh':
+        refresh_summaries(args.database)
+    elif args.command == 'drop':
+        drop_summaries(args.database)
+    else:
+        summary_status(args.database)
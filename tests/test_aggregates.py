@@ -0,0 +1,22 @@
+import pandas as pd
+
+from chinook_aggregates import CustomerAggregates
+
+
+def test_ties_go_to_the_lower_id():
+    # Rows arrive with the higher ids first; every count ties
+    merged = pd.DataFrame({
+        'CustomerId': [3, 2, 1],
+        'LastName': ['C', 'B', 'A'],
+        'FirstName': ['c', 'b', 'a'],
+        'TrackId': [30, 20, 10],
+        'Name': ['t30', 't20', 't10'],
+        'AlbumId': [300, 200, 100],
+        'Title': ['a300', 'a200', 'a100'],
+    })
+    aggregates = CustomerAggregates(merged)
+
+    assert aggregates.top_tracks(2).index.tolist() == ['t10', 't20']
+    assert aggregates.top_albums(2).index.tolist() == ['a100', 'a200']
+    assert aggregates.top_customers(2).index.get_level_values('LastName').tolist() == ['A', 'B']
+    assert aggregates.customer_stats().index.get_level_values('LastName').tolist() == ['A', 'B', 'C']
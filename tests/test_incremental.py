@@ -0,0 +1,44 @@
+import sqlite3
+
+from benchmark import generate_chinook_database
+from chinook_backends import run_reports
+from chinook_incremental import IncrementalAnalyzer
+
+
+def _add_lines(path, track_ids):
+    """One purchase per track, spread over the invoices in turn"""
+    conn = sqlite3.connect(path)
+    invoices = [row[0] for row in conn.execute('SELECT InvoiceId FROM Invoice ORDER BY InvoiceId')]
+    start = conn.execute('SELECT COALESCE(MAX(InvoiceLineId), 0) FROM InvoiceLine').fetchone()[0]
+    conn.executemany('INSERT INTO InvoiceLine VALUES (?, ?, ?, 0.99, 1)',
+                     [(start + i + 1, invoices[(start + i) % len(invoices)], track_id)
+                      for i, track_id in enumerate(track_ids)])
+    conn.commit()
+    conn.close()
+
+
+def test_incremental_reports_match_full_recompute_on_ties(tmp_path):
+    path = str(tmp_path / 'ties.sqlite')
+    generate_chinook_database(path, scale=1, seed=0)
+    conn = sqlite3.connect(path)
+    conn.execute('DELETE FROM InvoiceLine')
+    track_ids = [row[0] for row in conn.execute('SELECT TrackId FROM Track ORDER BY TrackId')]
+    conn.commit()
+    conn.close()
+
+    # Every track is bought once, so every track count ties; the first run sees
+    # the high ids, the second the low ones
+    half = len(track_ids) // 2
+    _add_lines(path, track_ids[:half - 1:-1])
+    incremental = IncrementalAnalyzer(path, state_dir=str(tmp_path / 'state'), csv_path=str(tmp_path / 'inc.csv'))
+    assert incremental.run() is not None
+    _add_lines(path, track_ids[half - 1::-1])
+    customers, tracks, albums = incremental.run()
+
+    full = IncrementalAnalyzer(path, state_dir=str(tmp_path / 'full'), csv_path=str(tmp_path / 'full.csv')).run()
+    reference = run_reports(path, backend='sqlite-pushdown')['reports']
+
+    for result in (full, (customers, tracks, albums)):
+        assert result[0].equals(reference['customer_stats'])
+        assert result[1].equals(reference['top_tracks'])
+        assert result[2].equals(reference['top_albums'])
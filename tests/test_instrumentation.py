@@ -0,0 +1,21 @@
+import json
+
+from benchmark import generate_chinook_database
+from chinook_python_centric import ChinookAnalyzer
+from instrumentation import Instrumentation, JsonEmitter
+
+
+def test_json_emitter_output_is_only_json(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / 'chinook.sqlite')
+    generate_chinook_database(path, scale=1, seed=0)
+    monkeypatch.chdir(tmp_path)
+    capsys.readouterr()
+
+    analyzer = ChinookAnalyzer(path)
+    result = analyzer.run_complete_analysis(instrumentation=Instrumentation(emitter=JsonEmitter()),
+                                            concurrent=True, headless=True)
+    assert result is not None
+
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert {event['event'] for event in events} == {'log', 'stage'}
+    assert any(event['event'] == 'log' and event['message'] == 'PIPELINE STAGES' for event in events)
@@ -0,0 +1,43 @@
+import threading
+import time
+
+from pipeline_runner import PipelineRunner
+
+
+def test_inline_stage_does_not_delay_thread_stages():
+    runner = PipelineRunner(max_workers=2)
+    threads = {}
+
+    def slow_inline():
+        threads['inline'] = threading.current_thread()
+        time.sleep(1.0)
+        return 'inline'
+
+    runner.add_stage('inline', slow_inline, executor='inline')
+    runner.add_stage('fast', lambda: time.sleep(0.1) or 'fast')
+    runner.add_stage('stuck', lambda: time.sleep(2.0), timeout=0.5)
+    results = runner.run()
+
+    assert results == {'inline': 'inline', 'fast': 'fast'}
+    assert threads['inline'] is threading.main_thread()
+
+    fast = runner.stages['fast']
+    assert fast.status == 'done'
+    assert 0.1 <= fast.seconds < 0.3
+
+    stuck = runner.stages['stuck']
+    assert stuck.status == 'timeout'
+    assert stuck.end < 0.8
+
+    assert runner.stages['inline'].seconds >= 1.0
+
+
+def test_stage_time_excludes_waiting_for_a_worker():
+    runner = PipelineRunner(max_workers=1)
+    runner.add_stage('first', lambda: time.sleep(0.3))
+    runner.add_stage('second', lambda: time.sleep(0.1))
+    runner.run()
+
+    second = runner.stages['second']
+    assert second.start >= 0.3
+    assert second.seconds < 0.2